@@ -0,0 +1,378 @@
+"""
+Benchmarks of the dataset_fixer functions on synthetic datasets.
+
+    $ python benchmark.py --files 5000 --workers 8 --json results.json
+
+A reproducible dataset (a hierarchy of folders with images of different
+formats and color models, text files, archives, binary files and corrupted
+images) is generated in a temporary folder, then every function is run on
+it in every execution mode (sequentially, with a thread pool and, where
+the function supports it, with a process pool). Every run happens in a new
+process and its time, throughput, number of system calls and peak memory
+are reported. Save the results with --json to compare them between
+releases.
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+from PIL import Image
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import dataset_fixer
+
+
+# Share of each kind of files in a generated dataset.
+MIME_MIX = {'jpeg': 0.4, 'png': 0.3, 'gif': 0.05, 'text': 0.1,
+            'zip': 0.05, 'binary': 0.1}
+
+# Color models of the generated images.
+COLOR_MODES = ('RGB', 'L', 'RGBA', 'P', 'CMYK', 'LA', '1')
+
+# Formats of the images and the color models they can store.
+_IMAGE_FORMATS = {'jpeg': ('JPEG', ('RGB', 'L', 'CMYK')),
+                  'png': ('PNG', ('RGB', 'L', 'RGBA', 'P', 'LA', '1')),
+                  'gif': ('GIF', ('P', 'L'))}
+
+# Extensions of the generated files.
+_EXTENSIONS = {'jpeg': '.jpg', 'png': '.png', 'gif': '.gif', 'text': '.txt',
+               'zip': '.zip', 'binary': '.bin'}
+
+
+def generate(root, files=1000, depth=2, branching=3, sizes=(1024, 262144),
+             mix=None, modes=COLOR_MODES, corrupt=0.01, seed=0):
+    """
+    Generates a synthetic dataset. The same arguments always give the same
+    dataset.
+
+    Args:
+
+        root (str): The folder to create the dataset in.
+
+        files (int): Optional, defaults to 1000. The number of files.
+
+        depth (int): Optional, defaults to 2. The depth of the hierarchy of
+        folders, 0 means that all files are in root.
+
+        branching (int): Optional, defaults to 3. The number of subfolders
+        in every folder above the last level.
+
+        sizes (tuple): Optional, defaults to (1024, 262144). The minimum and
+        the maximum size of a file in bytes; the sizes are distributed
+        log-uniformly between them. The sizes of images are approximate.
+
+        mix (dict): Optional, defaults to None. The share of each kind of
+        files ('jpeg', 'png', 'gif', 'text', 'zip', 'binary'); if you don't
+        select it, MIME_MIX is used.
+
+        modes (tuple or list): Optional, defaults to COLOR_MODES. The color
+        models of the images; each image gets one of those that its format
+        can store.
+
+        corrupt (float): Optional, defaults to 0.01. The share of images that
+        are truncated.
+
+    Returns a (number of files, total size in bytes) pair.
+    """
+
+    generator = random.Random(seed)
+    mix = mix or MIME_MIX
+    kinds = sorted(mix)
+    weights = [mix[kind] for kind in kinds]
+
+    # Creating the folders.
+    folders = [root]
+    level = [root]
+    for _ in range(depth):
+        level = [os.path.join(folder, "dir{0}".format(i))
+                 for folder in level for i in range(branching)]
+        folders.extend(level)
+    for folder in folders:
+        os.makedirs(folder, exist_ok=True)
+
+    total = 0
+    for i in range(files):
+        kind = generator.choices(kinds, weights)[0]
+        size = int(math.exp(generator.uniform(math.log(sizes[0]),
+                                              math.log(sizes[1]))))
+        path = os.path.join(generator.choice(folders),
+                            "file{0:07d}{1}".format(i, _EXTENSIONS[kind]))
+        if kind in _IMAGE_FORMATS:
+            image_format, supported = _IMAGE_FORMATS[kind]
+            mode = generator.choice([mode for mode in modes
+                                     if mode in supported] or ['L'])
+            _image(generator, size).convert(mode).save(path, image_format)
+            if generator.random() < corrupt:
+                with open(path, 'r+b') as file:
+                    file.truncate(os.path.getsize(path) // 2)
+        elif kind == 'text':
+            with open(path, 'w') as file:
+                while file.tell() < size:
+                    file.write("line {0}\n".format(generator.random()))
+        elif kind == 'zip':
+            with zipfile.ZipFile(path, 'w') as archive:
+                archive.writestr("data.bin", generator.randbytes(size))
+        else:
+            with open(path, 'wb') as file:
+                file.write(generator.randbytes(size))
+        total += os.path.getsize(path)
+    return files, total
+
+
+def _image(generator, size):
+    """
+    Returns an RGB image that takes about size bytes in a compressed
+    format: random blocks of pixels, smoothly scaled up.
+    """
+
+    side = max(8, min(2048, int(math.sqrt(size))))
+    small = (max(1, side // 8), max(1, side // 8))
+    data = generator.randbytes(small[0] * small[1] * 3)
+    image = Image.frombytes('RGB', small, data)
+    return image.resize((side, side), Image.Resampling.BILINEAR)
+
+
+# Benchmarked calls: name -> (dataset, whether the dataset is modified,
+# whether the function supports processes, function(source, destination,
+# workers, processes)). 'tree' is the generated hierarchy of folders,
+# 'flat' is the same files in a single folder.
+CASES = {
+    'folder_unpacker': ('tree', False, True,
+                        lambda src, dst, workers, processes:
+                        dataset_fixer.folder_unpacker(
+                            src, dst, 'image/jpeg', workers=workers,
+                            processes=processes)),
+    'sorter': ('tree', False, True,
+               lambda src, dst, workers, processes:
+               dataset_fixer.sorter(src, dst, workers=workers,
+                                    processes=processes)),
+    'splitter': ('flat', False, False,
+                 lambda src, dst, workers, processes:
+                 dataset_fixer.splitter(src, dst, (0.8, 0.1, 0.1),
+                                        'percentage', workers=workers,
+                                        seed=0)),
+    'shuffler': ('flat', False, False,
+                 lambda src, dst, workers, processes:
+                 dataset_fixer.shuffler(src, dst, seed=0, workers=workers)),
+    'cleaner': ('tree', True, False,
+                lambda src, dst, workers, processes:
+                dataset_fixer.cleaner(src, 'image/png', workers=workers)),
+    'cutter': ('flat', True, False,
+               lambda src, dst, workers, processes:
+               dataset_fixer.cutter(src, fraction=0.5, seed=0,
+                                    workers=workers)),
+    'color_type_detector': ('tree', False, True,
+                            lambda src, dst, workers, processes:
+                            dataset_fixer.color_type_detector(
+                                src, dst, 'RGB', workers=workers,
+                                processes=processes)),
+    # Only the perceptual hashes are computed by processes.
+    'dedupe': ('tree', False, False,
+               lambda src, dst, workers, processes:
+               dataset_fixer.dedupe(src, workers=workers)),
+    'dedupe_perceptual': ('tree', False, True,
+                          lambda src, dst, workers, processes:
+                          dataset_fixer.dedupe(src, workers=workers,
+                                               processes=processes,
+                                               perceptual=True)),
+    'inspect_images': ('tree', False, True,
+                       lambda src, dst, workers, processes:
+                       list(dataset_fixer.inspect_images(
+                           src, workers=workers, processes=processes))),
+    'converter': ('tree', False, True,
+                  lambda src, dst, workers, processes:
+                  dataset_fixer.converter(src, dst, max_side=64,
+                                          workers=workers,
+                                          processes=processes)),
+}
+
+
+def _syscalls():
+    """
+    Returns the number of read and write system calls made by this process
+    so far or None if the system doesn't report it (only Linux does).
+    """
+
+    try:
+        with open("/proc/self/io") as file:
+            fields = dict(line.split(": ") for line in file.read().split("\n")
+                          if line)
+    except OSError:
+        return None
+    return int(fields['syscr']) + int(fields['syscw'])
+
+
+def _peak_rss():
+    """
+    Returns the peak memory of this process and its children in bytes or
+    None if the system doesn't report it.
+    """
+
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # macOS reports bytes, other systems report kilobytes.
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _measure(name, source, destination, workers, processes, connection):
+    """Runs one case in a new process and sends its measurements back."""
+
+    # Progress bars and messages are not a part of the report.
+    dataset_fixer.quiet()
+    function = CASES[name][3]
+    syscalls = _syscalls()
+    start = time.perf_counter()
+    function(source, destination, workers, processes)
+    seconds = time.perf_counter() - start
+    if syscalls is not None:
+        syscalls = _syscalls() - syscalls
+    connection.send((seconds, syscalls, _peak_rss()))
+    connection.close()
+
+
+def run(root, names=None, workers=4, files=1000, depth=2, seed=0):
+    """
+    Generates the datasets in root and runs the cases. Returns a list of
+    the results, a dict for every run.
+
+    Args:
+
+        root (str): An empty folder for the datasets and the outputs.
+
+        names (list): Optional, defaults to None. The names of the cases to
+        run, all of CASES if you don't select them.
+
+        workers (int): Optional, defaults to 4. The number of workers in
+        the parallel execution modes.
+
+        files (int): Optional, defaults to 1000. The number of files in
+        the datasets.
+
+        depth (int): Optional, defaults to 2. The depth of the hierarchy of
+        folders of the 'tree' dataset.
+    """
+
+    datasets = {'tree': generate(os.path.join(root, 'tree'), files, depth,
+                                 seed=seed),
+                'flat': generate(os.path.join(root, 'flat'), files, 0,
+                                 seed=seed)}
+    results = list()
+    for name in names or sorted(CASES):
+        dataset, modifies, supports_processes, _ = CASES[name]
+        execution_modes = [('sequential', 1, False),
+                           ('threads', workers, False)]
+        if supports_processes:
+            execution_modes.append(('processes', workers, True))
+        for execution, count, processes in execution_modes:
+            source = os.path.join(root, dataset)
+            destination = os.path.join(root, 'output')
+            # Functions deleting files get a copy of the dataset.
+            if modifies:
+                shutil.copytree(source, os.path.join(root, 'work'))
+                source = os.path.join(root, 'work')
+
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=_measure, args=(name, source, destination, count,
+                                       processes, sender))
+            process.start()
+            sender.close()
+            try:
+                seconds, syscalls, peak = receiver.recv()
+            except EOFError:
+                seconds = syscalls = peak = None
+            process.join()
+
+            number, size = datasets[dataset]
+            result = {'function': name, 'execution': execution,
+                      'workers': count, 'files': number, 'bytes': size,
+                      'seconds': seconds, 'syscalls': syscalls,
+                      'peak_rss': peak, 'failed': process.exitcode != 0}
+            if seconds:
+                result['files_per_second'] = number / seconds
+                result['mb_per_second'] = size / seconds / 2 ** 20
+            results.append(result)
+
+            for folder in ('work', 'output'):
+                shutil.rmtree(os.path.join(root, folder), ignore_errors=True)
+    return results
+
+
+def _report(results):
+    """Prints the results as a table."""
+
+    header = "{0:<20} {1:<11} {2:>9} {3:>10} {4:>8} {5:>10} {6:>9}".format(
+        "function", "execution", "seconds", "files/s", "MB/s", "syscalls",
+        "RSS, MB")
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        if result['failed']:
+            print("{0:<20} {1:<11} failed".format(result['function'],
+                                                  result['execution']))
+            continue
+        syscalls = result['syscalls']
+        print("{0:<20} {1:<11} {2:>9.3f} {3:>10.1f} {4:>8.2f} {5:>10} "
+              "{6:>9.1f}".format(result['function'], result['execution'],
+                                 result['seconds'],
+                                 result['files_per_second'],
+                                 result['mb_per_second'],
+                                 "-" if syscalls is None else syscalls,
+                                 (result['peak_rss'] or 0) / 2 ** 20))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--files", type=int, default=1000,
+                        help="number of files in the datasets")
+    parser.add_argument("--depth", type=int, default=2,
+                        help="depth of the hierarchy of folders")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="number of workers in the parallel modes")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="random-seed of the datasets")
+    parser.add_argument("--only", default=None,
+                        help="comma-separated names of the functions")
+    parser.add_argument("--json", default=None,
+                        help="file to save the results to")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else None
+    for name in names or ():
+        if name not in CASES:
+            parser.error("unknown function: {0}".format(name))
+    root = tempfile.mkdtemp(prefix="dataset_fixer_benchmark-")
+    try:
+        results = run(root, names, args.workers, args.files, args.depth,
+                      args.seed)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    _report(results)
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'cpus': os.cpu_count(),
+                       'arguments': vars(args),
+                       'results': results}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
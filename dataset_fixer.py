@@ -1,43 +1,4934 @@
 # Dataset-fixer
 
+import contextlib
+import errno
+import hashlib
+import importlib
+import io
+import json
+import mmap
 import shutil
 import os
-import filetype
 import random
-import PIL
-from PIL import Image
-from tqdm import tqdm
+import sys
+import threading
+import time
+from array import array
+from collections import deque, namedtuple, OrderedDict
 
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, reflinks fall back to copying there.
+    fcntl = None
 
-def folder_unpacker(current_root, new_root, target_type=None):
+
+class _LazyModule:
+    """
+    Stands for a module until one of its attributes is used for the first
+    time, and only then imports it. The libraries that take a while to
+    import are loaded this way, so the command line interface (see main)
+    starts quickly and only loads what the command needs.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attribute):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attribute)
+
+
+ast = _LazyModule('ast')
+asyncio = _LazyModule('asyncio')
+futures = _LazyModule('concurrent.futures')
+filetype = _LazyModule('filetype')
+sqlite3 = _LazyModule('sqlite3')
+tarfile = _LazyModule('tarfile')
+tqdm = _LazyModule('tqdm')
+zipfile = _LazyModule('zipfile')
+PIL = _LazyModule('PIL')
+Image = _LazyModule('PIL.Image')
+ImageOps = _LazyModule('PIL.ImageOps')
+
+
+# How many tasks per worker may be submitted to the executor before the
+# oldest one has to be collected. Keeps memory bounded on huge datasets.
+_PENDING_PER_WORKER = 4
+
+# Name of the detection cache file created in the dataset root.
+CACHE_NAME = ".dataset_fixer_cache.sqlite"
+
+# Name of the journal file of resumable operations.
+JOURNAL_NAME = ".dataset_fixer_journal"
+
+# Name of the snapshot file of incremental operations.
+SNAPSHOT_NAME = ".dataset_fixer_snapshot.sqlite"
+
+# Prefix of the temporary files, which are renamed to the output files
+# once they are written completely.
+_TEMP_PREFIX = ".dataset_fixer_tmp-"
+
+# Name of the folder in the dataset root where cleaner and cutter move
+# the files with trash=True, see restore_trash and purge_trash.
+TRASH_NAME = ".dataset_fixer_trash"
+
+# Files of this module that are never treated as a part of a dataset.
+_SERVICE_NAMES = (CACHE_NAME, JOURNAL_NAME, SNAPSHOT_NAME, _TEMP_PREFIX,
+                  TRASH_NAME)
+
+# The number of files of a folder deleted by a worker at once, see _Deleter.
+_DELETE_BATCH = 256
+
+# Whether files can be deleted relative to a descriptor of their folder.
+_DIR_FD = os.unlink in os.supports_dir_fd
+
+# filetype never looks further than this many bytes from the beginning
+# of a file.
+_MIME_HEADER_SIZE = 262
+
+# The number of bytes read at once when opening an image. This is enough for
+# the headers of almost all images, including JPEG with large EXIF data.
+_IMAGE_HEADER_SIZE = 65536
+
+# The number of files sent to a worker process at once.
+_PROCESS_CHUNK = 64
+
+# EXIF tag of the image orientation.
+_ORIENTATION_TAG = 0x0112
+
+# Typecodes of the arrays for the kinds of the numpy dtypes: signed and
+# unsigned integers and floats.
+_NPY_TYPECODES = {'i': 'bhilq', 'u': 'BHILQ', 'f': 'fd'}
+
+# Per-thread buffers reused by _read_header and _file_digest.
+_buffers = threading.local()
+
+# Files are hashed by blocks of this size.
+_DIGEST_BLOCK = 1 << 20
+
+# Candidate duplicates are first compared by the hash of this many bytes
+# from the beginning and from the end of the file.
+_PARTIAL_BLOCK = 1 << 16
+
+# Side of the grayscale thumbnail used for perceptual hashes.
+_PHASH_SIZE = 8
+
+# Ways to put a file into the new folder, see _materialize.
+MODES = ('copy', 'hardlink', 'symlink', 'reflink', 'move')
+
+# What to do when a file with the same name is already in the new folder,
+# see _Output.
+CONFLICTS = ('overwrite', 'skip', 'suffix', 'hash', 'path')
+
+# ioctl request cloning a file on Linux (Btrfs, XFS, OCFS2...).
+_FICLONE = 0x40049409
+
+# Errors meaning that a link or a clone can't be created for this pair of
+# files, so they have to be copied instead.
+_FALLBACK_ERRORS = (errno.EXDEV, errno.EPERM, errno.EINVAL, errno.ENOTTY,
+                    errno.EOPNOTSUPP, errno.ENOSYS)
+
+
+# Something that happened during an operation, passed to the sinks (see
+# add_sink). kind is one of:
+# 'begin' - a stage of the operation has started, size is the number of
+# files it will process (None if unknown);
+# 'progress' - the stage has processed one more file;
+# 'end' - the stage is over;
+# 'file' - the file at path went through the stage in seconds, size is its
+# size in bytes if it's known;
+# 'error' - the stage failed for the file at path, message tells why;
+# 'message' - a message for the user.
+# stage is 'scan', 'detect', 'copy', 'convert', 'delete' or another stage
+# of the operation.
+Event = namedtuple('Event', ['kind', 'stage', 'path', 'size', 'seconds',
+                             'message'], defaults=(None,) * 4)
+
+# Kinds of the events.
+_EVENT_KINDS = ('begin', 'progress', 'end', 'file', 'error', 'message')
+
+
+class ProgressBar:
+    """
+    Sink showing progress bars (made with tqdm) and the messages of
+    the operations on stderr. One is added by default, see quiet.
+    """
+
+    events = ('begin', 'progress', 'end', 'error', 'message')
+
+    def __init__(self):
+        self._bars = dict()
+
+    def __call__(self, event):
+        if event.kind == 'begin':
+            self._bars[event.stage] = tqdm.tqdm(total=event.size)
+        elif event.kind == 'progress':
+            bar = self._bars.get(event.stage)
+            if bar is not None:
+                bar.update()
+        elif event.kind == 'end':
+            bar = self._bars.pop(event.stage, None)
+            if bar is not None:
+                bar.close()
+        elif event.kind == 'error':
+            tqdm.tqdm.write("{0} failed for {1}: {2}".format(
+                event.stage, event.path, event.message), file=sys.stderr)
+        else:
+            tqdm.tqdm.write(event.message, file=sys.stderr)
+
+
+class Metrics:
+    """
+    Sink counting the files, bytes and errors of every stage and the time
+    spent in it (summed over all the workers).
+
+    Attributes:
+
+        files (dict): The number of files processed by every stage.
+
+        bytes (dict): Their total size in bytes, where it's known.
+
+        errors (dict): The number of errors of every stage.
+
+        seconds (dict): The time spent in every stage.
+
+    Stages run in a process pool are counted, but not timed.
+    """
+
+    events = ('file', 'error')
+
+    def __init__(self):
+        self.files = dict()
+        self.bytes = dict()
+        self.errors = dict()
+        self.seconds = dict()
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        stage = event.stage
+        with self._lock:
+            if event.kind == 'error':
+                self.errors[stage] = self.errors.get(stage, 0) + 1
+                return
+            self.files[stage] = self.files.get(stage, 0) + 1
+            if event.size is not None:
+                self.bytes[stage] = self.bytes.get(stage, 0) + event.size
+            if event.seconds is not None:
+                self.seconds[stage] = (self.seconds.get(stage, 0) +
+                                       event.seconds)
+
+    def prometheus(self):
+        """Returns the metrics in the Prometheus text format."""
+
+        lines = list()
+        with self._lock:
+            for name, kind, values in (
+                    ('files_total', 'counter', self.files),
+                    ('bytes_total', 'counter', self.bytes),
+                    ('errors_total', 'counter', self.errors),
+                    ('stage_seconds_total', 'counter', self.seconds)):
+                lines.append("# TYPE dataset_fixer_{0} {1}".format(name,
+                                                                   kind))
+                for stage in sorted(values):
+                    lines.append('dataset_fixer_{0}{{stage="{1}"}} {2}'.format(
+                        name, stage, values[stage]))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """
+        Writes the metrics in the Prometheus text format to the file (for
+        example, for the textfile collector of the node exporter). The file
+        is replaced atomically.
+        """
+
+        temporary = _temporary(path)
+        with open(temporary, 'w') as file:
+            file.write(self.prometheus())
+        os.replace(temporary, path)
+
+
+class JsonLines:
+    """
+    Sink appending every event except 'progress' to the file as a line of
+    JSON with the time of the event added.
+
+    Args:
+
+        path (str): The file to write to.
+    """
+
+    events = ('begin', 'end', 'file', 'error', 'message')
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a')
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        line = dict(event._asdict(), time=time.time())
+        line = json.dumps(line) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+# The sinks receiving the events, the default progress bar and the sinks
+# subscribed to each kind of the events. Sinks listen to the kinds in
+# their events attribute or to all the kinds if there is none.
+_sinks = list()
+_progress_bar = ProgressBar()
+_subscribers = dict.fromkeys(_EVENT_KINDS, ())
+
+
+def _subscribe():
+    """Updates the subscribers after the sinks change."""
+
+    global _subscribers
+    sinks = list(_sinks)
+    if _progress_bar is not None:
+        sinks.insert(0, _progress_bar)
+    _subscribers = {kind: tuple(sink for sink in sinks
+                                if kind in getattr(sink, 'events',
+                                                   _EVENT_KINDS))
+                    for kind in _EVENT_KINDS}
+
+
+_subscribe()
+
+
+def add_sink(sink):
+    """
+    Starts sending the events of all the operations (see Event) to the sink,
+    a callable taking an Event. It may have an events attribute listing
+    the kinds of the events it needs; the events nobody listens to aren't
+    even created. The sink is called from several threads if the operation
+    has several workers.
+    """
+
+    if not callable(sink):
+        msg = "sink must be callable, not {0}.".format(type(sink))
+        raise ValueError(msg)
+    _sinks.append(sink)
+    _subscribe()
+
+
+def remove_sink(sink):
+    """Stops sending the events to the sink."""
+
+    _sinks.remove(sink)
+    _subscribe()
+
+
+def quiet(enabled=True):
+    """
+    Turns off (or back on, if enabled is False) the progress bars and
+    the messages. With no other sinks, the operations then spend no time at
+    all on reporting their progress.
+    """
+
+    global _progress_bar
+    _progress_bar = None if enabled else ProgressBar()
+    _subscribe()
+
+
+def _silence():
+    """Stops the events in a worker process, its parent reports them."""
+
+    global _subscribers
+    _subscribers = dict.fromkeys(_EVENT_KINDS, ())
+
+
+def _process_pool(workers):
+    """
+    Returns a pool of worker processes. The workers don't report events,
+    see _silence. Multiprocessing is imported only when it's needed.
+    """
+
+    return futures.ProcessPoolExecutor(max_workers=workers,
+                                       initializer=_silence)
+
+
+def _emit(kind, stage, path=None, size=None, seconds=None, message=None):
+    """Sends the event to the sinks subscribed to its kind."""
+
+    sinks = _subscribers[kind]
+    if sinks:
+        event = Event(kind, stage, path, size, seconds, message)
+        for sink in sinks:
+            sink(event)
+
+
+def _observed():
+    """
+    Returns the current time if somebody listens to the 'file' events,
+    otherwise None. Pass it to _done.
+    """
+
+    if _subscribers['file']:
+        return time.perf_counter()
+    return None
+
+
+def _done(stage, path, start, size=None):
+    """
+    Sends the 'file' event of a file that went through the stage, start is
+    what _observed returned before it (nothing is sent if it's None).
+    """
+
+    if start is not None:
+        _emit('file', stage, path, size, time.perf_counter() - start)
+
+
+def _size(source):
+    """Returns the size of the file (its path or a _Member) or None."""
+
+    if isinstance(source, _Member):
+        return len(source.data)
+    try:
+        return os.lstat(source).st_size
+    except OSError:
+        return None
+
+
+class _Progress:
+    """
+    Progress of a stage reported to the sinks: a 'begin' event, a 'progress'
+    event for every file and an 'end' event.
+    """
+
+    def __init__(self, stage, total=None, enabled=True):
+        self.stage = stage
+        self.enabled = enabled
+        if enabled:
+            _emit('begin', stage, size=total)
+
+    def update(self):
+        if self.enabled and _subscribers['progress']:
+            _emit('progress', self.stage)
+
+    def close(self):
+        if self.enabled:
+            _emit('end', self.stage)
+
+
+def _map_chunk(func, chunk):
+    """Applies func to every item of the chunk in a worker."""
+
+    return [func(item) for item in chunk]
+
+
+def _chunks(items, size):
+    """Groups the items into lists of at most size items."""
+
+    chunk = list()
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = list()
+    if chunk:
+        yield chunk
+
+
+def _parallel_map(func, items, workers=1, processes=False, progress=True,
+                  total=None, chunksize=1, stage='process'):
+    """
+    Applies func to every item and yields the results in the input order.
+
+    With workers > 1 the calls are executed by a thread pool (or by a process
+    pool if processes is True, in that case func and items must be
+    picklable). At most workers * _PENDING_PER_WORKER tasks are in flight at
+    the same time. If a call raises, the exception is re-raised when its
+    result is reached, so errors are reported in the input order and the
+    remaining tasks are cancelled. All items share a single progress bar
+    (see _Progress) of the stage; failures are reported as 'error' events.
+
+    With chunksize > 1 every task is a batch of up to chunksize items, which
+    saves on the interprocess communication when func is cheap.
+    """
+
+    bar = _Progress(stage, total, progress)
+    try:
+        # Sequential execution without any executor overhead.
+        if workers <= 1:
+            for item in items:
+                yield func(item)
+                bar.update()
+            return
+
+        if processes:
+            executor = _process_pool(workers)
+        else:
+            executor = futures.ThreadPoolExecutor(max_workers=workers)
+        if chunksize > 1:
+            items = _chunks(items, chunksize)
+
+        def submit(item):
+            if chunksize > 1:
+                return executor.submit(_map_chunk, func, item)
+            return executor.submit(func, item)
+
+        def results(future):
+            if chunksize > 1:
+                chunk = future.result()
+            else:
+                chunk = (future.result(),)
+            for result in chunk:
+                yield result
+                bar.update()
+
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(submit(item))
+                if len(pending) >= workers * _PENDING_PER_WORKER:
+                    yield from results(pending.popleft())
+            while pending:
+                yield from results(pending.popleft())
+        finally:
+            # Cancelling everything that has not started yet
+            # if the caller stopped early or a task failed.
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+    except Exception as error:
+        _emit('error', stage, getattr(error, 'filename', None),
+              message=str(error))
+        raise
+    finally:
+        bar.close()
+
+
+# A file found by scan. stat is the os.stat_result of the file if it was
+# requested, otherwise None; is_dir and is_file come for free from
+# the directory listing on most platforms.
+FileRecord = namedtuple('FileRecord', ['path', 'stat', 'is_dir', 'is_file'])
+
+
+def _scan_folder(folder, stat):
+    """
+    Lists one folder. Returns a list of FileRecords for its entries and
+    a list of subfolders to descend into (symlinks to folders are reported,
+    but not followed, like in os.walk).
+    """
+
+    start = _observed()
+    records = list()
+    subfolders = list()
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            # The detection cache and the journal are not a part of
+            # the dataset.
+            if entry.name.startswith(_SERVICE_NAMES):
+                continue
+            is_dir = entry.is_dir()
+            records.append(FileRecord(entry.path,
+                                      entry.stat() if stat else None,
+                                      is_dir, not is_dir and entry.is_file()))
+            if is_dir and not entry.is_symlink():
+                subfolders.append(entry.path)
+    _done('scan', folder, start)
+    return records, subfolders
+
+
+# Lists of the files to work on instead of whole folders (see main): scan
+# yields the records of the paths listed for root instead of listing it.
+_listings = dict()
+
+
+def _listed(root, paths, stat):
+    """Yields the FileRecords of the listed files, which must be in root."""
+
+    for path in paths:
+        relative = os.path.relpath(path, root)
+        if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+            _emit('error', 'scan', path, message="not in {0}".format(root))
+            continue
+        try:
+            info = os.stat(path) if stat else None
+        except OSError as error:
+            _emit('error', 'scan', path, message=str(error))
+            continue
+        yield FileRecord(path, info, False, True)
+
+
+def scan(root, recursive=True, stat=False, workers=1):
+    """
+    Lists the dataset, yielding a FileRecord for every entry exactly once.
+
+    Args:
+
+        root (str): Source folder with the dataset.
+
+        recursive (bool): Optional, defaults to True. If True, the whole
+        hierarchy of folders is scanned and only files are yielded;
+        otherwise only the entries of the root folder (including
+        subfolders) are yielded.
+
+        stat (bool): Optional, defaults to False. If True, every record
+        carries the os.stat_result of its file. This is the only stat call
+        made for a file, without it the scan needs no stat calls at all on
+        most platforms.
+
+        workers (int): Optional, defaults to 1. The number of folders listed
+        at the same time. With several workers the files are yielded in
+        the order the folders are listed, not in the os.walk order.
+
+    The scan skips the detection cache (see DetectionCache) and the journals
+    of interrupted operations.
+    """
+
+    if recursive and root in _listings:
+        yield from _listed(root, _listings[root], stat)
+        return
+    if not recursive:
+        records, subfolders = _scan_folder(root, stat)
+        yield from records
+        return
+
+    # Depth-first traversal in the os.walk order.
+    if workers <= 1:
+        stack = [root]
+        while stack:
+            records, subfolders = _scan_folder(stack.pop(), stat)
+            for record in records:
+                if not record.is_dir:
+                    yield record
+            stack.extend(reversed(subfolders))
+        return
+
+    # Listing several folders at the same time.
+    with futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(_scan_folder, root, stat)}
+        try:
+            while pending:
+                done, pending = futures.wait(
+                    pending, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    records, subfolders = future.result()
+                    for folder in subfolders:
+                        pending.add(executor.submit(_scan_folder, folder,
+                                                    stat))
+                    for record in records:
+                        if not record.is_dir:
+                            yield record
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _list_files(root):
+    """
+    Returns paths of the files (not folders) in the root folder sorted by
+    name, so that the result doesn't depend on the file system.
+    """
+
+    return sorted(record.path for record in scan(root, recursive=False)
+                  if record.is_file)
+
+
+# A regular file read from a tar or zip archive: its name inside
+# the archive and its contents.
+_Member = namedtuple('_Member', ['path', 'data'])
+
+
+def _is_archive(path):
+    """Checks whether the path is a tar (possibly compressed) or zip file."""
+
+    return os.path.isfile(path) and (zipfile.is_zipfile(path) or
+                                     tarfile.is_tarfile(path))
+
+
+def _archive_members(path, shard=None):
+    """
+    Yields a _Member for every regular file in the tar or zip archive (only
+    for the files of the shard if it's given, see _shard_of). Tar archives
+    are read as a stream, so compressed ones are decompressed only once and
+    nothing is extracted to the disk.
+    """
+
+    def selected(name):
+        return shard is None or _shard_of(name, shard[0]) == shard[1]
+
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and selected(info.filename):
+                    yield _Member(info.filename, archive.read(info))
+        return
+    with tarfile.open(path, 'r|*') as archive:
+        for member in archive:
+            if member.isfile() and selected(member.name):
+                yield _Member(member.name,
+                              archive.extractfile(member).read())
+
+
+def _archive_names(path):
+    """Returns the names of the regular files in the archive, sorted."""
+
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            return sorted(info.filename for info in archive.infolist()
+                          if not info.is_dir())
+    with tarfile.open(path, 'r:*') as archive:
+        return sorted(member.name for member in archive if member.isfile())
+
+
+def _list_sources(root):
+    """
+    Returns the sorted paths of the files in the root folder or the names
+    of the files in the archive.
+    """
+
+    if _is_archive(root):
+        return _archive_names(root)
+    return _list_files(root)
+
+
+def _records(root, stat=False, shard=None):
+    """
+    Yields the files of the dataset: FileRecords from scan if root is
+    a folder or _Members if it is an archive. With a shard, only its files
+    are yielded.
+    """
+
+    if _is_archive(root):
+        return _archive_members(root, shard)
+    return _shard_records(scan(root, stat=stat), root, shard)
+
+
+def _shard_of(name, num_shards):
+    """
+    Returns the shard of the file with the relative path name: a stable
+    hash of the path, the same on every machine and in every run.
+    """
+
+    name = name.replace(os.sep, '/').encode('utf-8', 'surrogateescape')
+    digest = hashlib.blake2b(name, digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % num_shards
+
+
+def _shard_records(records, root, shard=None):
+    """
+    Filters the FileRecords of the files in root, leaving only those of
+    the shard, a (num_shards, shard_index) pair (all of them if it's None).
+    """
+
+    if shard is None:
+        return records
+    num_shards, shard_index = shard
+    start = len(root)
+    return (record for record in records
+            if _shard_of(record.path[start:].lstrip(os.sep),
+                         num_shards) == shard_index)
+
+
+def _sharding(num_shards, shard_index):
+    """
+    Checks the num_shards and shard_index arguments, returns the shard
+    (see _shard_records) or None if the files are not split.
+    """
+
+    if type(num_shards) != int:
+        msg = "num_shards must be int, not {0}.".format(type(num_shards))
+        raise ValueError(msg)
+    if type(shard_index) != int:
+        msg = "shard_index must be int, not {0}.".format(type(shard_index))
+        raise ValueError(msg)
+    assert num_shards > 0, "num_shards must be a positive number."
+    assert_message = "shard_index must be from 0 to num_shards - 1."
+    assert 0 <= shard_index < num_shards, assert_message
+    if num_shards == 1:
+        return None
+    return num_shards, shard_index
+
+
+def _shard_suffix(shard=None):
+    """
+    Returns the suffix of the names of the journal, the snapshot, the cache
+    and the tar shards of the shard, so that shards never share a file.
+    """
+
+    if shard is None:
+        return ""
+    return "-{1}-of-{0}".format(*shard)
+
+
+def _read_header(path, size=_MIME_HEADER_SIZE):
+    """
+    Reads at most size bytes from the beginning of the file with a single
+    positioned read into a reusable per-thread buffer. The file is closed
+    before returning.
+    """
+
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        if not hasattr(os, 'preadv'):
+            return bytearray(os.read(fd, size))
+        buffer = getattr(_buffers, 'header', None)
+        if buffer is None or len(buffer) < size:
+            buffer = _buffers.header = bytearray(size)
+        length = os.preadv(fd, [memoryview(buffer)[:size]], 0)
+        return buffer[:length]
+    finally:
+        os.close(fd)
+
+
+def _guess_mime(source):
+    """
+    Returns the MIME type of the file or None if it is unknown. source is
+    the path of the file or its contents.
+    """
+
+    if isinstance(source, str):
+        source = _read_header(source)
+    file_type = filetype.guess(source[:_MIME_HEADER_SIZE])
+    # Fighting with NoneType objects.
+    if file_type:
+        return file_type.mime
+    return None
+
+
+def _inspect_image(source):
+    """
+    Returns (mode, width, height) of the image or None if it isn't one.
+    source is the path of the file or its contents. Only the header is read
+    (usually with a single read call, thanks to the large file buffer),
+    the pixels are not decoded.
+    """
+
+    try:
+        if isinstance(source, str):
+            file = open(source, 'rb', buffering=_IMAGE_HEADER_SIZE)
+        else:
+            file = io.BytesIO(source)
+        with file, Image.open(file) as image:
+            return (image.mode,) + image.size
+    # Images with broken headers are skipped too.
+    except (PIL.UnidentifiedImageError, OSError):
+        return None
+
+
+# Properties of an image found by inspect_images. format is the PIL image
+# format, orientation is the EXIF orientation (1 if there is none).
+# The properties read before the image turned out to be corrupt are kept,
+# the rest are None.
+ImageInfo = namedtuple('ImageInfo', ['path', 'format', 'mode', 'width',
+                                     'height', 'orientation', 'corrupt'])
+
+
+def _image_info(path, source, verify=False):
+    """
+    Returns the ImageInfo of the image or None if it isn't one. source is
+    the path of the file or its contents. Like _inspect_image, only
+    the header is read, unless verify is True: then the whole file is
+    checked for consistency (still without decoding the pixels).
+    """
+
+    info = [path, None, None, None, None, None, False]
+    try:
+        if isinstance(source, str):
+            file = open(source, 'rb', buffering=_IMAGE_HEADER_SIZE)
+        else:
+            file = io.BytesIO(source)
+        with file, Image.open(file) as image:
+            info[1:5] = (image.format, image.mode) + image.size
+            # Reading the EXIF of other formats (like PNG without it in
+            # the header) would decode the image.
+            orientation = 1
+            if 'exif' in image.info or image.format == 'TIFF':
+                orientation = image.getexif().get(_ORIENTATION_TAG, 1)
+            info[5] = orientation
+            if verify:
+                image.verify()
+    except (PIL.UnidentifiedImageError, PermissionError):
+        return None
+    except Exception:
+        # PIL reports broken files with all kinds of exceptions.
+        info[6] = True
+    return ImageInfo(*info)
+
+
+def _info_task(task):
+    """
+    Runs _image_info in a worker, task is a (record, verify) pair where
+    record is a FileRecord or a _Member.
+    """
+
+    record, verify = task
+    if isinstance(record, _Member):
+        return _image_info(record.path, record.data, verify)
+    return _image_info(record.path, record.path, verify)
+
+
+# Functions used to detect each kind of file properties.
+_DETECTORS = {'mime': _guess_mime, 'image': _inspect_image}
+
+
+class DetectionCache:
+    """
+    Persistent cache of the detected MIME types and image properties.
+
+    The cache is an SQLite database mapping a file path to its size,
+    modification time and inode together with the detected MIME type,
+    PIL color mode, width and height. An entry is valid only as long as
+    the size, the modification time and the inode of the file stay the same,
+    so repeated runs only need to detect the files that have changed.
+    The most recently used entries are also kept in memory.
+
+    Args:
+
+        root (str): The dataset root. Paths are stored relative to it.
+
+        path (str): Optional, defaults to None. The database file; if you
+        don't select it, CACHE_NAME in the root folder is used.
+
+        memory_size (int): Optional, defaults to 65536. The maximum number of
+        entries kept in memory.
+
+    The cache is safe to use from several threads. New entries are written
+    in batches, call close (or use the cache as a context manager) to make
+    sure all of them are saved.
+    """
+
+    # Bits of the 'probed' column.
+    _KINDS = {'mime': 1, 'image': 2}
+
+    # The number of new entries collected before writing them to the disk.
+    _BATCH_SIZE = 1024
+
+    def __init__(self, root, path=None, memory_size=65536):
+        self.root = os.path.abspath(root)
+        self.path = path or os.path.join(self.root, CACHE_NAME)
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._dirty = dict()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path,
+                                           check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+            "inode INTEGER, probed INTEGER, mime TEXT, mode TEXT, "
+            "width INTEGER, height INTEGER)")
+        self._connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _key(self, path):
+        path = os.path.abspath(path)
+        if path.startswith(self.root + os.sep):
+            return path[len(self.root) + 1:]
+        return path
+
+    def _row(self, key):
+        """Returns the row of the path (without the path itself) or None."""
+
+        row = self._memory.get(key)
+        if row is not None:
+            self._memory.move_to_end(key)
+            return row
+        row = self._connection.execute(
+            "SELECT size, mtime_ns, inode, probed, mime, mode, width, height "
+            "FROM files WHERE path = ?", (key,)).fetchone()
+        if row is not None:
+            self._remember(key, row)
+        return row
+
+    def _remember(self, key, row):
+        self._memory[key] = row
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, path, kind, stat=None):
+        """
+        Returns a (found, value) pair, where value is the cached result of
+        the 'mime' or 'image' detection of the file. stat is the result of
+        os.stat for the file, it is requested if not given.
+        """
+
+        stat = stat or os.stat(path)
+        with self._lock:
+            row = self._row(self._key(path))
+        if row is None or row[:3] != (stat.st_size, stat.st_mtime_ns,
+                                      stat.st_ino):
+            return False, None
+        if not row[3] & self._KINDS[kind]:
+            return False, None
+        if kind == 'mime':
+            return True, row[4]
+        if row[5] is None:
+            return True, None
+        return True, tuple(row[5:])
+
+    def set(self, path, kind, value, stat=None):
+        """Saves the result of the 'mime' or 'image' detection of the file."""
+
+        stat = stat or os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        key = self._key(path)
+        with self._lock:
+            row = self._row(key)
+            # The file has changed, forgetting everything known about it.
+            if row is None or row[:3] != signature:
+                row = signature + (0, None, None, None, None)
+            if kind == 'mime':
+                row = row[:3] + (row[3] | 1, value) + row[5:]
+            else:
+                row = row[:3] + (row[3] | 2, row[4]) + (value or (None,) * 3)
+            self._remember(key, row)
+            self._dirty[key] = row
+            if len(self._dirty) >= self._BATCH_SIZE:
+                self._flush()
+
+    def _flush(self):
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(key,) + row for key, row in self._dirty.items()])
+        self._connection.commit()
+        self._dirty.clear()
+
+    def flush(self):
+        """Writes all new entries to the disk."""
+
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """Writes all new entries to the disk and closes the database."""
+
+        with self._lock:
+            self._flush()
+            self._connection.close()
+
+
+def _open_cache(cache, root, shard=None):
+    """
+    Turns the cache argument of the public functions into a pair of
+    a DetectionCache (or None) and a flag telling whether to close it.
+    Archives are never cached. Every shard has its own cache file.
+    """
+
+    # Files inside archives have nothing to be cached by.
+    if not cache or os.path.isfile(root):
+        return None, False
+    if cache is True:
+        path = os.path.join(root, CACHE_NAME + _shard_suffix(shard))
+        return DetectionCache(root, path), True
+    if not isinstance(cache, DetectionCache):
+        msg = "cache must be bool or DetectionCache, "
+        msg += "not {0}.".format(type(cache))
+        raise ValueError(msg)
+    return cache, False
+
+
+class _InventoryCache:
+    """
+    Read-only cache of the detected values taken from an Inventory of
+    a folder, for the functions taking an inventory. The files added or
+    changed since the inventory was made are looked up in the cache (or
+    detected) as usual.
+
+    Args:
+
+        inventory (Inventory): The inventory.
+
+        cache (DetectionCache): Optional, defaults to None. The cache of
+        the rest of the files.
+    """
+
+    def __init__(self, inventory, cache=None):
+        self.inventory = inventory
+        self.cache = cache
+
+    def get(self, path, kind, stat=None):
+        values = self.inventory._values(FileRecord(path, stat, False, True))
+        if kind in values:
+            return True, values[kind]
+        if self.cache is None:
+            return False, None
+        return self.cache.get(path, kind, stat)
+
+    def set(self, path, kind, value, stat=None):
+        if self.cache is not None:
+            self.cache.set(path, kind, value, stat)
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+
+
+def _detect(kind, path, cache=None, stat=None):
+    """
+    Runs the detection of the given kind, consulting the cache. stat is
+    the os.stat_result of the file if it is already known.
+    """
+
+    start = _observed()
+    if cache is None:
+        value = _DETECTORS[kind](path)
+    else:
+        stat = stat or os.stat(path)
+        found, value = cache.get(path, kind, stat)
+        if not found:
+            value = _DETECTORS[kind](path)
+            cache.set(path, kind, value, stat)
+    _done('detect', path, start)
+    return value
+
+
+def _reflink(source, destination):
+    """
+    Clones the file with FICLONE, falling back to copy_file_range (which
+    lets the file system share the blocks or copy them in the kernel) and
+    to a regular copy.
+    """
+
+    # Never writing through an existing file, it may be a link to
+    # the source itself.
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+    try:
+        fd = os.open(destination, flags, 0o666)
+    except FileExistsError:
+        os.remove(destination)
+        fd = os.open(destination, flags, 0o666)
+    with open(source, 'rb') as src, open(fd, 'wb') as dst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+                return
+            except OSError as error:
+                if error.errno not in _FALLBACK_ERRORS:
+                    raise
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while os.copy_file_range(src.fileno(), dst.fileno(),
+                                         1 << 30):
+                    pass
+                return
+            except OSError as error:
+                if error.errno not in _FALLBACK_ERRORS:
+                    raise
+                src.seek(0)
+                dst.seek(0)
+                dst.truncate()
+        shutil.copyfileobj(src, dst)
+
+
+def _temporary(path):
+    """
+    Returns a new temporary name in the folder of path for writing the file
+    before it's renamed to path. Every write gets its own name, so that
+    the files written to the same path at once don't mix.
+    """
+
+    return os.path.join(os.path.dirname(path) or os.curdir,
+                        "{0}{1}-{2}".format(_TEMP_PREFIX, os.urandom(6).hex(),
+                                            os.path.basename(path)))
+
+
+def _copy_atomic(source, destination):
+    """
+    Copies the file with its metadata, like shutil.copy2, through
+    a temporary file renamed to destination.
+    """
+
+    temporary = _temporary(destination)
+    try:
+        shutil.copy2(source, temporary)
+        os.replace(temporary, destination)
+    except BaseException:
+        if os.path.lexists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def _materialize(source, destination, mode='copy'):
+    """
+    Puts the file at the destination path in one of the MODES. Existing
+    files are replaced, like shutil.copy does. 'hardlink' and 'reflink' fall
+    back to copying when the folder is on another file system or the links
+    are not supported.
+
+    The file (or the link) is made under a temporary name in the same folder
+    and then renamed to destination, so an interrupted run never leaves
+    a partly written file there and an existing file is replaced
+    atomically.
+    """
+
+    if mode == 'move':
+        # Renaming when possible, copying and deleting otherwise.
+        shutil.move(source, destination, copy_function=_copy_atomic)
+        return
+    temporary = _temporary(destination)
+    try:
+        if mode == 'copy':
+            shutil.copy(source, temporary)
+        elif mode == 'reflink':
+            _reflink(source, temporary)
+            shutil.copymode(source, temporary)
+        else:
+            if mode == 'hardlink':
+                link = os.link
+                target = source
+            else:
+                link = os.symlink
+                target = os.path.abspath(source)
+            try:
+                link(target, temporary)
+            except FileExistsError:
+                os.remove(temporary)
+                link(target, temporary)
+            except OSError as error:
+                if mode == 'symlink' or error.errno not in _FALLBACK_ERRORS:
+                    raise
+                shutil.copy(source, temporary)
+        os.replace(temporary, destination)
+        # Renaming a hard link over another link to the same file does
+        # nothing.
+        if mode == 'hardlink' and os.path.lexists(temporary):
+            os.remove(temporary)
+    except BaseException:
+        if os.path.lexists(temporary):
+            os.remove(temporary)
+        raise
+
+
+class _Journal:
+    """
+    Append-only list of the completed items of an operation, one per line.
+
+    The journal is flushed and fsynced every _BATCH_SIZE items, so after
+    a crash at most the last batch is done once again. If resume is True,
+    the items of the existing journal are loaded, otherwise it is cleared.
+    A journal opened for a Plan is only read and never written.
+    Safe to use from several threads.
+    """
+
+    _BATCH_SIZE = 1000
+
+    def __init__(self, path, resume=False, read_only=False):
+        self.path = path
+        self._done = set()
+        if resume and os.path.exists(path):
+            with open(path, 'rb') as journal:
+                for line in journal:
+                    # The last line may be torn by the crash.
+                    if line.endswith(b'\n'):
+                        self._done.add(os.fsdecode(line[:-1]))
+        self._file = None
+        if not read_only:
+            self._file = open(path, 'ab' if resume else 'wb')
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, item):
+        return item in self._done
+
+    def __len__(self):
+        return len(self._done)
+
+    def __iter__(self):
+        return iter(self._done)
+
+    def add(self, item):
+        """Marks the item (a path or a name) as completed."""
+
+        with self._lock:
+            self._done.add(item)
+            if self._file is None:
+                return
+            self._file.write(os.fsencode(item) + b'\n')
+            self._pending += 1
+            if self._pending >= self._BATCH_SIZE:
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self, remove=False):
+        """
+        Closes the journal. remove=True means the operation is complete,
+        so the journal is deleted.
+        """
+
+        if self._file is None:
+            return
+        with self._lock:
+            self._sync()
+            self._file.close()
+        if remove:
+            os.remove(self.path)
+
+
+def _open_snapshot(folder, incremental, checksum, plan=None, shard=None):
+    """
+    Opens the snapshot of an incremental operation (of the shard) writing to
+    the folder. With a plan, there is no snapshot if the operation has never
+    run.
+    """
+
+    if not incremental:
+        return None
+    path = os.path.join(folder, SNAPSHOT_NAME + _shard_suffix(shard))
+    if plan is not None and not os.path.exists(path):
+        return None
+    return _Snapshot(path, checksum, plan)
+
+
+def _open_journal(folder, resume, plan=None, shard=None):
+    """
+    Opens the journal of an operation (of the shard) writing to the folder,
+    read-only with a plan.
+    """
+
+    return _Journal(os.path.join(folder, JOURNAL_NAME + _shard_suffix(shard)),
+                    resume, read_only=plan is not None)
+
+
+class _ShardWriter:
+    """
+    Writes files to the tar shards shard-000000.tar, shard-000001.tar...
+    in a folder, starting a new shard when the current one would grow
+    beyond shard_size bytes (a single bigger file gets its own shard).
+
+    With a journal, the files of a shard are marked as completed only after
+    the shard is finished and synced to the disk. When resuming, shards left
+    unfinished by the previous run are deleted and the numbering continues
+    after the finished ones.
+
+    The shards of a sharded operation (see _shard_records) are named after
+    it, for example shard-1-of-4-000000.tar, so that several of them can
+    write to the same folder.
+    """
+
+    def __init__(self, folder, shard_size, journal=None, prefix="shard-"):
+        self.folder = folder
+        self.shard_size = shard_size
+        self.journal = journal
+        self.prefix = prefix
+        self._number = 0
+        self._tar = None
+        self._path = None
+        self._items = list()
+        if journal is not None:
+            start = len(prefix)
+            for name in os.listdir(folder):
+                if not (name.startswith(prefix) and name.endswith(".tar") and
+                        name[start:-4].isdigit()):
+                    continue
+                path = os.path.join(folder, name)
+                if path in journal:
+                    self._number = max(self._number,
+                                       int(name[start:-4]) + 1)
+                else:
+                    os.remove(path)
+
+    def add(self, source):
+        """Adds a file, source is its path or a _Member."""
+
+        if isinstance(source, _Member):
+            info = tarfile.TarInfo(os.path.basename(source.path))
+            info.size = len(source.data)
+            # Whole seconds, fractional ones would need a PAX header.
+            info.mtime = int(time.time())
+            file = io.BytesIO(source.data)
+            item = source.path
+        else:
+            stat = os.stat(source)
+            info = tarfile.TarInfo(os.path.basename(source))
+            info.size = stat.st_size
+            info.mtime = int(stat.st_mtime)
+            info.mode = stat.st_mode & 0o7777
+            file = open(source, 'rb')
+            item = source
+
+        # The header and the padding take at most 1024 bytes.
+        if (self._tar is not None and self._tar.offset and
+                self._tar.offset + info.size + 1024 > self.shard_size):
+            self._finish()
+        if self._tar is None:
+            name = "{0}{1:06d}.tar".format(self.prefix, self._number)
+            # Journaled as this path rather than self._tar.name, which
+            # tarfile makes absolute, so that resume finds it.
+            self._path = os.path.join(self.folder, name)
+            self._tar = tarfile.open(self._path, 'w')
+            self._number += 1
+        with file:
+            self._tar.addfile(info, file)
+        self._items.append(item)
+
+    def _finish(self):
+        """Closes the current shard and journals its files."""
+
+        self._tar.close()
+        if self.journal is not None:
+            with open(self._path, 'rb') as shard:
+                os.fsync(shard.fileno())
+            for item in self._items:
+                self.journal.add(item)
+            self.journal.add(self._path)
+        self._tar = None
+        self._items = list()
+
+    def close(self):
+        if self._tar is not None:
+            self._finish()
+
+
+def _file_digest(path, partial=False):
+    """
+    Returns the BLAKE2 hash of the contents of the file, read into
+    a reusable per-thread buffer. If partial is True, only the first and
+    the last _PARTIAL_BLOCK bytes are hashed; files of up to two blocks are
+    hashed whole then, so their partial hash is the full one.
+    """
+
+    buffer = getattr(_buffers, 'digest', None)
+    if buffer is None:
+        buffer = _buffers.digest = memoryview(bytearray(_DIGEST_BLOCK))
+    digest = hashlib.blake2b()
+    with open(path, 'rb', buffering=0) as file:
+        if partial:
+            length = file.readinto(buffer[:_PARTIAL_BLOCK])
+            digest.update(buffer[:length])
+            size = os.fstat(file.fileno()).st_size
+            if size > 2 * _PARTIAL_BLOCK:
+                file.seek(size - _PARTIAL_BLOCK)
+            # The last block or the rest of a small file.
+            length = file.readinto(buffer[:_PARTIAL_BLOCK])
+            while length:
+                digest.update(buffer[:length])
+                length = file.readinto(buffer[:_PARTIAL_BLOCK])
+            return digest.digest()
+        length = file.readinto(buffer)
+        while length:
+            digest.update(buffer[:length])
+            length = file.readinto(buffer)
+    return digest.digest()
+
+
+def _remove_output(path):
+    """Deletes a copy made by a previous run if it is still there."""
+
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class _Snapshot:
+    """
+    The state of the source folder after the previous run of an incremental
+    operation: an SQLite database with the size, modification time, inode
+    (and, with checksum, the hash) of every source file and the path of
+    the file it was copied to, if any.
+
+    Every run has a new generation number. Files that are unchanged or
+    processed again get the current generation, so the ones left with
+    an older generation at the end of the run have been deleted from
+    the source folder and their copies are deleted too.
+
+    With a plan, the snapshot is only read and the copies that would be
+    deleted are added to the plan.
+    """
+
+    _BATCH_SIZE = 1000
+
+    def __init__(self, path, checksum=False, plan=None):
+        self.path = path
+        self.checksum = checksum
+        self.plan = plan
+        # The files seen by a planned run.
+        self._seen = set()
+        if plan is not None:
+            self._connection = sqlite3.connect(
+                "file:{0}?mode=ro".format(path), uri=True,
+                check_same_thread=False)
+        else:
+            self._connection = sqlite3.connect(path,
+                                               check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+                "inode INTEGER, digest BLOB, output TEXT, "
+                "generation INTEGER)")
+        generation = self._connection.execute(
+            "SELECT MAX(generation) FROM files").fetchone()[0]
+        self.generation = (generation or 0) + 1
+        self._touched = list()
+        self._updated = list()
+        self._lock = threading.Lock()
+
+    def _unchanged(self, record, row):
+        size, mtime_ns, inode, digest = row
+        if record.stat.st_size != size:
+            return False
+        if self.checksum:
+            return digest == _file_digest(record.path)
+        return ((record.stat.st_mtime_ns, record.stat.st_ino) ==
+                (mtime_ns, inode))
+
+    def changed(self, records, remove=_remove_output):
+        """
+        Yields the records (with stat) of the files added or changed since
+        the previous run. The old copies of the changed files are deleted
+        with remove.
+        """
+
+        for record in records:
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT size, mtime_ns, inode, digest, output FROM files "
+                    "WHERE path = ?", (record.path,)).fetchone()
+            if self.plan is not None:
+                self._seen.add(record.path)
+                if row is not None and self._unchanged(record, row[:4]):
+                    continue
+                if row is not None and row[4] is not None:
+                    self.plan.add('delete', row[4])
+                yield record
+                continue
+            if row is not None and self._unchanged(record, row[:4]):
+                with self._lock:
+                    self._touched.append((self.generation, record.path))
+                    if len(self._touched) >= self._BATCH_SIZE:
+                        self._flush()
+                continue
+            if row is not None and row[4] is not None:
+                remove(row[4])
+            yield record
+
+    def update(self, record, output):
+        """Saves the state of a processed file and the path of its copy."""
+
+        if self.plan is not None:
+            return
+        digest = _file_digest(record.path) if self.checksum else None
+        with self._lock:
+            self._updated.append((record.path, record.stat.st_size,
+                                  record.stat.st_mtime_ns, record.stat.st_ino,
+                                  digest, output, self.generation))
+            if len(self._updated) >= self._BATCH_SIZE:
+                self._flush()
+
+    def _flush(self):
+        self._connection.executemany(
+            "UPDATE files SET generation = ? WHERE path = ?", self._touched)
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+            self._updated)
+        self._connection.commit()
+        self._touched = list()
+        self._updated = list()
+
+    def finish(self, remove=_remove_output):
+        """
+        Deletes the copies of the files deleted from the source folder with
+        remove.
+        """
+
+        if self.plan is not None:
+            with self._lock:
+                rows = self._connection.execute(
+                    "SELECT path, output FROM files").fetchall()
+            for path, output in rows:
+                if path not in self._seen and output is not None:
+                    self.plan.add('delete', output)
+            return
+        with self._lock:
+            self._flush()
+            rows = self._connection.execute(
+                "SELECT output FROM files WHERE generation < ?",
+                (self.generation,))
+            for output, in rows:
+                if output is not None:
+                    remove(output)
+            self._connection.execute(
+                "DELETE FROM files WHERE generation < ?", (self.generation,))
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            if self.plan is None:
+                self._flush()
+            self._connection.close()
+
+
+def _delete(path, folder=False):
+    """
+    Deletes the file (or the folder with all its contents) of the dataset and
+    reports it with a 'file' event.
+    """
+
+    start = _observed()
+    size = _size(path) if start is not None else None
+    if folder:
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+    _done('delete', path, start, size)
+
+
+def _trash_folder(root):
+    """Returns a new folder in the trash of root for the files of a run."""
+
+    name = "{0}-{1}".format(time.strftime("%Y%m%d-%H%M%S"),
+                            os.urandom(4).hex())
+    return os.path.join(root, TRASH_NAME, name)
+
+
+class _Deleter:
+    """
+    Deletes files and folders of root in bulk. Consecutive paths in the same
+    folder are grouped into batches of up to _DELETE_BATCH names, and every
+    batch is deleted by one of the worker threads with unlink calls relative
+    to a descriptor of the folder, so the path of the folder is resolved once
+    per batch rather than once per file (which counts on network file
+    systems). Every path is added to the journal once it's deleted.
+
+    With trash (a folder made by _trash_folder), the files and folders are
+    renamed into it instead, keeping their paths relative to root. That's
+    a single rename per file, and restore_trash can undo it.
+    """
+
+    def __init__(self, root, workers=1, journal=None, trash=None):
+        self.root = root
+        self.workers = workers
+        self.journal = journal
+        self.trash = trash
+        self._folder = None
+        self._batch = list()
+        self._futures = deque()
+        self._executor = None
+        self._created = set()
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        if kind is None:
+            self.close()
+        else:
+            self.close(complete=False)
+
+    def add(self, path, is_dir=False):
+        """Deletes the file (or the folder with all its contents) soon."""
+
+        folder, name = os.path.split(path)
+        if folder != self._folder and self._batch:
+            self._submit()
+        self._folder = folder
+        self._batch.append((name, is_dir))
+        if len(self._batch) >= _DELETE_BATCH:
+            self._submit()
+
+    def _submit(self):
+        folder, batch = self._folder, self._batch
+        self._batch = list()
+        if self.workers <= 1:
+            self._delete(folder, batch)
+            return
+        if self._executor is None:
+            self._executor = futures.ThreadPoolExecutor(
+                max_workers=self.workers)
+        self._futures.append(self._executor.submit(self._delete, folder,
+                                                   batch))
+        # Bounding the number of batches in flight.
+        while len(self._futures) > self.workers * _PENDING_PER_WORKER:
+            self._futures.popleft().result()
+
+    def _delete(self, folder, batch):
+        """Deletes (or moves to the trash) a batch of names in the folder."""
+
+        if self.trash is not None:
+            return self._move(folder, batch)
+        descriptor = None
+        if _DIR_FD:
+            descriptor = os.open(folder or os.curdir,
+                                 os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+        try:
+            for name, is_dir in batch:
+                path = os.path.join(folder, name)
+                start = _observed()
+                size = _size(path) if start is not None else None
+                try:
+                    if is_dir:
+                        shutil.rmtree(path)
+                    elif descriptor is not None:
+                        os.unlink(name, dir_fd=descriptor)
+                    else:
+                        os.remove(path)
+                # Already deleted by somebody else.
+                except FileNotFoundError:
+                    pass
+                _done('delete', path, start, size)
+                if self.journal is not None:
+                    self.journal.add(path)
+        finally:
+            if descriptor is not None:
+                os.close(descriptor)
+
+    def _move(self, folder, batch):
+        target = os.path.normpath(os.path.join(
+            self.trash, os.path.relpath(folder, self.root)))
+        with self._lock:
+            if target not in self._created:
+                os.makedirs(target, exist_ok=True)
+                self._created.add(target)
+        for name, is_dir in batch:
+            path = os.path.join(folder, name)
+            start = _observed()
+            try:
+                os.rename(path, os.path.join(target, name))
+            except FileNotFoundError:
+                pass
+            except OSError as error:
+                if error.errno != errno.EXDEV:
+                    raise
+                # A mount point inside the dataset, copying.
+                shutil.move(path, os.path.join(target, name))
+            _done('delete', path, start)
+            if self.journal is not None:
+                self.journal.add(path)
+
+    def close(self, complete=True):
+        """
+        Deletes the rest of the files and waits for all the batches,
+        re-raising the first error. If the operation is not complete,
+        the batches that have not started are dropped instead.
+        """
+
+        try:
+            if complete and self._batch:
+                self._submit()
+            while complete and self._futures:
+                self._futures.popleft().result()
+        finally:
+            for future in self._futures:
+                future.cancel()
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+class Plan:
+    """
+    What an operation would do. The functions of this module return a plan
+    instead of doing anything when they are called with dry_run=True.
+
+    Args:
+
+        destination (str): Optional, defaults to None. The folder
+        the operation writes to, if any.
+
+    Attributes:
+
+        actions (list): (action, source, destination) tuples in the order
+        the operation would perform them. action is one of MODES, 'shard'
+        (the file would be added to a tar shard), 'convert', 'manifest'
+        (the file would be listed in a manifest), 'hardlink', 'delete' or
+        'trash' (the file would be moved to the trash; then destination is
+        None).
+
+        files (int): The number of files in the actions.
+
+        bytes (int): The total size of these files.
+
+        required (int): The number of bytes that would be written to
+        destination. Links and files moved within a file system take no
+        space, and converted images are counted at their original size.
+
+        counts (dict): The number of files of every extension ('' for files
+        without one).
+
+        free (int): The free space on the file system of destination (or of
+        the folder it would be created in), None if there is no destination.
+
+    Plans are made from the file sizes (and the file headers, if the files
+    are filtered by their type or color model); no files are copied or
+    deleted. The journal of an interrupted run is taken into account if
+    resume is True and so is the snapshot of an incremental operation.
+    """
+
+    def __init__(self, destination=None):
+        self.destination = destination
+        self.actions = list()
+        self.files = 0
+        self.bytes = 0
+        self.required = 0
+        self.counts = dict()
+        self.free = None
+        self._device = None
+        self._lock = threading.Lock()
+        if destination is not None:
+            # The nearest existing folder.
+            folder = os.path.abspath(destination)
+            while not os.path.exists(folder):
+                folder = os.path.dirname(folder)
+            self.free = shutil.disk_usage(folder).free
+            self._device = os.stat(folder).st_dev
+
+    @property
+    def fits(self):
+        """Whether there is enough free space in destination."""
+
+        return self.free is None or self.required <= self.free
+
+    def add(self, action, source, destination=None):
+        """Adds the action on the file (its path or a _Member) to the plan."""
+
+        if isinstance(source, _Member):
+            path = source.path
+            size = len(source.data)
+            # Files from archives are always written.
+            required = size if action not in ('delete', 'manifest') else 0
+        else:
+            path = source
+            try:
+                stat = os.stat(source)
+                size = stat.st_size
+                device = stat.st_dev
+            except FileNotFoundError:
+                size = 0
+                device = None
+            required = 0
+            if action in ('copy', 'reflink', 'shard', 'convert'):
+                required = size
+            # Linking and moving fall back to copying between file systems.
+            elif (action in ('hardlink', 'move') and destination is not None
+                  and device != self._device):
+                required = size
+        extension = os.path.splitext(path)[1].lower()
+        with self._lock:
+            self.actions.append((action, path, destination))
+            self.files += 1
+            self.bytes += size
+            self.required += required
+            self.counts[extension] = self.counts.get(extension, 0) + 1
+
+    # Plans are sent back by the processes of run_sharded.
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return ("Plan({0} files, {1} bytes, {2} bytes required, "
+                "{3} bytes free)".format(self.files, self.bytes,
+                                         self.required, self.free))
+
+
+def _relative_path(path, root, relative_paths=False):
+    """
+    Returns the path of the file relative to root, or its name if it isn't
+    in root. relative_paths tells that path is relative already, like
+    the paths of the members of archives.
+    """
+
+    if relative_paths:
+        relative = os.path.normpath(path)
+    else:
+        relative = os.path.relpath(path, root)
+    if relative.startswith(os.pardir) or os.path.isabs(relative):
+        return os.path.basename(path)
+    return relative
+
+
+class _Output:
+    """
+    Puts files into the destination folders: as loose files in one of
+    the MODES or, if shard_size is given, as tar shards of at most about
+    shard_size bytes in each folder. Completed files are marked in
+    the journal and in the snapshot of an incremental operation if they
+    are given. With a plan, the files are only added to it. The tar shards
+    of a sharded operation are named after its shard.
+    Safe to use from several threads.
+
+    A loose file gets the name of the source file unless it's taken, then
+    the conflict policy (one of CONFLICTS) decides: 'overwrite' - the file
+    is replaced; 'skip' - the new file is skipped; 'suffix' - the new file
+    is named name_1.ext, name_2.ext and so on; 'hash' - every file is named
+    after the hash of its path relative to root (a1b2c3d4_name.ext), so its
+    name never depends on the other files, even those of other shards;
+    'path' - the path of every file relative to root is kept. The names
+    taken in every folder are listed only once and then kept in memory, and
+    every folder is created the first time a file is put into it.
+    """
+
+    def __init__(self, mode='copy', shard_size=None, journal=None,
+                 snapshot=None, plan=None, shard=None, conflict='overwrite',
+                 root=None):
+        self.mode = mode
+        self.shard_size = shard_size
+        self.journal = journal
+        self.snapshot = snapshot
+        self.plan = plan
+        self.conflict = conflict
+        self.root = root
+        # Members of archives have relative paths already.
+        self._relative_paths = root is None or not os.path.isdir(root)
+        self.prefix = "shard{0}-".format(_shard_suffix(shard))
+        self._shards = dict()
+        # The names taken in every folder used and the last suffixes.
+        self._names = dict()
+        self._suffixes = dict()
+        self._lock = threading.Lock()
+
+    def _relative(self, path):
+        """Returns the path of the file relative to root."""
+
+        return _relative_path(path, self.root, self._relative_paths)
+
+    def _folder(self, folder):
+        """
+        Returns the set of the names taken in the folder, creating it if it
+        doesn't exist. Must be called with the lock held.
+        """
+
+        names = self._names.get(folder)
+        if names is None:
+            names = set()
+            if self.plan is None:
+                os.makedirs(folder, exist_ok=True)
+            # Only the policies checking the names need them listed.
+            if self.conflict in ('skip', 'suffix') and os.path.isdir(folder):
+                names.update(os.listdir(folder))
+            self._names[folder] = names
+        return names
+
+    def _remove(self, path):
+        """
+        Deletes a copy made by a previous run, so that its name is free
+        again.
+        """
+
+        _remove_output(path)
+        with self._lock:
+            names = self._names.get(os.path.dirname(path))
+            if names is not None:
+                names.discard(os.path.basename(path))
+
+    def _destination(self, path, folder):
+        """
+        Returns the path the file gets in the folder under the conflict
+        policy or None if it's skipped.
+        """
+
+        name = os.path.basename(path)
+        if self.conflict == 'hash':
+            relative = self._relative(path).replace(os.sep, '/')
+            digest = hashlib.blake2b(relative.encode('utf-8',
+                                                     'surrogateescape'),
+                                     digest_size=4).hexdigest()
+            name = "{0}_{1}".format(digest, name)
+        elif self.conflict == 'path':
+            relative = self._relative(path)
+            folder = os.path.join(folder, os.path.dirname(relative))
+        with self._lock:
+            names = self._folder(folder)
+            if name in names and self.conflict == 'skip':
+                return None
+            if name in names and self.conflict == 'suffix':
+                stem, extension = os.path.splitext(name)
+                number = self._suffixes.get((folder, name), 0)
+                candidate = name
+                while candidate in names:
+                    number += 1
+                    candidate = "{0}_{1}{2}".format(stem, number, extension)
+                self._suffixes[(folder, name)] = number
+                name = candidate
+            names.add(name)
+        return os.path.join(folder, name)
+
+    def put(self, source, folder):
+        """
+        Puts the file (its path or a _Member) into the folder. Returns
+        the path it got there (None if it was skipped).
+        """
+
+        path = source.path if isinstance(source, _Member) else source
+        if self.shard_size is not None:
+            with self._lock:
+                self._folder(folder)
+            destination = os.path.join(folder, os.path.basename(path))
+        else:
+            destination = self._destination(path, folder)
+            if destination is None:
+                if self.plan is None:
+                    self.done(path)
+                return None
+        if self.plan is not None:
+            action = self.mode if self.shard_size is None else 'shard'
+            self.plan.add(action, source, destination)
+            return destination
+        start = _observed()
+        size = _size(source) if start is not None else None
+        if self.shard_size is not None:
+            with self._lock:
+                shards = self._shards.get(folder)
+                if shards is None:
+                    shards = _ShardWriter(folder, self.shard_size,
+                                          self.journal, self.prefix)
+                    self._shards[folder] = shards
+                shards.add(source)
+        else:
+            if isinstance(source, _Member):
+                temporary = _temporary(destination)
+                try:
+                    with open(temporary, 'wb') as file:
+                        file.write(source.data)
+                    os.replace(temporary, destination)
+                except BaseException:
+                    if os.path.exists(temporary):
+                        os.remove(temporary)
+                    raise
+            else:
+                _materialize(source, destination, self.mode)
+            self.done(path)
+        _done('copy', path, start, size)
+        return destination
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, value, traceback):
+        self.close(complete=kind is None)
+
+    def done(self, item):
+        """Marks a file that needs no output as completed."""
+
+        if self.journal is not None:
+            self.journal.add(item)
+
+    def track(self, record, destination):
+        """
+        Saves the path the file got (see put, None if it was skipped) in
+        the snapshot of an incremental operation.
+        """
+
+        if self.snapshot is not None:
+            self.snapshot.update(record, destination)
+
+    def pending(self, records):
+        """
+        Skips the records completed by the previous run or, for
+        an incremental operation, the ones unchanged since then.
+        The snapshot makes the journal unnecessary in this case.
+        """
+
+        if self.snapshot is not None:
+            return self.snapshot.changed(records, self._remove)
+        if self.journal is None:
+            return records
+        return (record for record in records
+                if record.path not in self.journal)
+
+    def close(self, complete=True):
+        """
+        Finishes all the shards and closes the journal, deleting it if
+        the operation is complete. The copies of the deleted source files
+        are deleted only if the incremental operation is complete.
+        """
+
+        for shards in self._shards.values():
+            shards.close()
+        if self.journal is not None:
+            self.journal.close(remove=complete)
+        if self.snapshot is not None:
+            if complete:
+                self.snapshot.finish(self._remove)
+            self.snapshot.close()
+
+
+def _source(record):
+    """Returns what _Output.put expects for a FileRecord or a _Member."""
+
+    if isinstance(record, _Member):
+        return record
+    return record.path
+
+
+def _detect_record(kind, record, cache=None):
+    """Runs the detection for a FileRecord or a _Member."""
+
+    if isinstance(record, _Member):
+        start = _observed()
+        value = _DETECTORS[kind](record.data)
+        _done('detect', record.path, start, len(record.data))
+        return value
+    return _detect(kind, record.path, cache, record.stat)
+
+
+def _detect_task(task):
+    """
+    Runs the detection in a worker process, task is a (kind, record, found,
+    value) tuple; the detection is skipped if the value was found in
+    the cache.
+    """
+
+    kind, record, found, value = task
+    if not found:
+        value = _detect_record(kind, record)
+    return kind, record, found, value
+
+
+def _copy_record(record, kind, destination, output, cache=None, pool=None):
+    """
+    Detects the kind of properties of the file (nothing is detected if kind
+    is None) and puts it with output into the folder returned by
+    destination(path, detected) unless it returns None. If pool is given,
+    the detection is done by one of its worker processes. Returns
+    the detected value and the folder.
+    """
+
+    value = None
+    if kind is not None and pool is None:
+        value = _detect_record(kind, record, cache)
+    elif kind is not None:
+        found = False
+        if cache is not None and isinstance(record, FileRecord):
+            found, value = cache.get(record.path, kind, record.stat)
+        if not found:
+            task = (kind, record, found, value)
+            value = pool.submit(_detect_task, task).result()[3]
+            if cache is not None and isinstance(record, FileRecord):
+                cache.set(record.path, kind, value, record.stat)
+        # The worker processes don't report anything.
+        _emit('file', 'detect', record.path)
+    folder = destination(record.path, value)
+    path = None
+    if folder is not None:
+        path = output.put(_source(record), folder)
+    else:
+        output.done(record.path)
+    output.track(record, path)
+    return value, folder
+
+
+def _detect_and_copy(records, kind, destination, output, workers=1,
+                     processes=False, total=None, cache=None):
+    """
+    Detects the 'mime' or 'image' properties of every file (records come
+    from _records) and puts the file with output into the folder returned
+    by destination(path, detected) unless it returns None. The files
+    completed by the previous run (see _Output.pending) are skipped. If
+    kind is None, nothing is detected and destination gets None.
+
+    If processes is True, the detection is done by a process pool and
+    the copying by a thread pool of the same size. Otherwise every file is
+    detected and copied by the same worker thread, so destination must be
+    thread-safe.
+    """
+
+    records = output.pending(records)
+    if processes and workers > 1 and kind is not None:
+        def tasks():
+            for record in records:
+                found, value = False, None
+                if cache is not None and isinstance(record, FileRecord):
+                    found, value = cache.get(record.path, kind, record.stat)
+                yield kind, record, found, value
+
+        def copies(detected):
+            for _, record, found, value in detected:
+                # The worker processes don't report anything.
+                _emit('file', 'detect', record.path)
+                if (cache is not None and not found and
+                        isinstance(record, FileRecord)):
+                    cache.set(record.path, kind, value, record.stat)
+                folder = destination(record.path, value)
+                if folder is not None:
+                    yield record, folder
+                else:
+                    output.done(record.path)
+                    output.track(record, None)
+
+        def copy(task):
+            record, folder = task
+            output.track(record, output.put(_source(record), folder))
+
+        detected = _parallel_map(_detect_task, tasks(), workers,
+                                 processes=True, total=total,
+                                 chunksize=_PROCESS_CHUNK, stage='detect')
+        for _ in _parallel_map(copy, copies(detected), workers,
+                               progress=False):
+            pass
+    else:
+        def process(record):
+            _copy_record(record, kind, destination, output, cache)
+
+        stage = 'copy' if kind is None else 'detect'
+        for _ in _parallel_map(process, records, workers, total=total,
+                               stage=stage):
+            pass
+
+
+def write_manifest(path, files):
+    """
+    Writes a list of files to a manifest.
+
+    Args:
+
+        path (str): The manifest file. The paths are written to it one per
+        line; the byte offsets of the lines are written to path + '.idx'
+        as native 64-bit unsigned integers, so that the manifest can be
+        memory-mapped by load_manifest without reading it entirely.
+
+        files (iterable of str): Paths of the files.
+
+    Paths containing line breaks can't be written to a manifest.
+    """
+
+    offsets = array('Q', [0])
+    with open(path, 'wb') as manifest:
+        for file in files:
+            line = os.fsencode(file)
+            if b'\n' in line:
+                msg = "{0} can't be written to a manifest.".format(file)
+                raise ValueError(msg)
+            manifest.write(line + b'\n')
+            offsets.append(offsets[-1] + len(line) + 1)
+    with open(path + '.idx', 'wb') as index:
+        offsets.tofile(index)
+
+
+class Manifest:
+    """
+    Read-only sequence of the paths written by write_manifest.
+
+    Both the manifest and its index are memory-mapped, so opening even
+    a huge manifest is instant and only the accessed paths are read.
+    Use load_manifest to open a manifest.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = self._map(path)
+        self._index = self._map(path + '.idx')
+        self._offsets = memoryview(self._index).cast('Q')
+
+    @staticmethod
+    def _map(path):
+        with open(path, 'rb') as file:
+            # Empty files can't be memory-mapped.
+            if not os.fstat(file.fileno()).st_size:
+                return b''
+            return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return max(len(self._offsets) - 1, 0)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("manifest index out of range")
+        start, end = self._offsets[item], self._offsets[item + 1] - 1
+        return os.fsdecode(self._data[start:end])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def close(self):
+        """Unmaps the manifest."""
+
+        self._offsets.release()
+        for mapping in (self._data, self._index):
+            if isinstance(mapping, mmap.mmap):
+                mapping.close()
+
+
+def load_manifest(path):
+    """
+    Opens a manifest written by write_manifest (for example, by splitter or
+    shuffler with manifest=True).
+
+    Args:
+
+        path (str): The manifest file.
+
+    Returns a Manifest, a memory-mapped sequence of paths supporting len,
+    indexing and iteration.
+    """
+
+    return Manifest(path)
+
+
+def _check_copy_arguments(current_root, new_root, target_type, workers, mode,
+                          shard_size, resume, incremental, checksum,
+                          dry_run=False, num_shards=1, shard_index=0,
+                          conflict=None, inventory=None):
+    """
+    Checks the arguments shared by folder_unpacker and sorter, returns
+    the shard (see _sharding) and the conflict policy: 'overwrite' by
+    default or, for a sharded run, 'hash'.
+    """
+
+    # Checking types of the arguments.
+    if type(current_root) != str:
+        msg = "current_root must be str, not {0}.".format(type(current_root))
+        raise ValueError(msg)
+    if type(new_root) != str:
+        msg = "new_root must be str, not {0}.".format(type(new_root))
+        raise ValueError(msg)
+    if target_type and (type(target_type) not in (str, tuple, list)):
+        msg = "target_type must be str, "
+        msg += "list or tuple, not {0}.".format(type(target_type))
+        raise ValueError(msg)
+    if type(workers) != int:
+        msg = "workers must be int, not {0}.".format(type(workers))
+        raise ValueError(msg)
+    if shard_size is not None and type(shard_size) != int:
+        msg = "shard_size must be int, not {0}.".format(type(shard_size))
+        raise ValueError(msg)
+    if type(resume) != bool:
+        msg = "resume must be bool, not {0}.".format(type(resume))
+        raise ValueError(msg)
+    if type(incremental) != bool:
+        msg = "incremental must be bool, not {0}.".format(type(incremental))
+        raise ValueError(msg)
+    if type(checksum) != bool:
+        msg = "checksum must be bool, not {0}.".format(type(checksum))
+        raise ValueError(msg)
+    if type(dry_run) != bool:
+        msg = "dry_run must be bool, not {0}.".format(type(dry_run))
+        raise ValueError(msg)
+    if inventory is not None and type(inventory) not in (Inventory, str):
+        msg = "inventory must be Inventory or str, "
+        msg += "not {0}.".format(type(inventory))
+        raise ValueError(msg)
+    assert workers > 0, "workers must be a positive number."
+    assert mode in MODES, "mode must be one of {0}.".format(MODES)
+    assert_message = "conflict must be one of {0}.".format(CONFLICTS)
+    assert conflict is None or conflict in CONFLICTS, assert_message
+    assert_message = "shard_size must be a positive number."
+    assert shard_size is None or shard_size > 0, assert_message
+    if incremental:
+        assert_message = "incremental can't be used with archives, "
+        assert_message += "shard_size or mode='move'."
+        assert (os.path.isdir(current_root) and shard_size is None and
+                mode != 'move'), assert_message
+    shard = _sharding(num_shards, shard_index)
+
+    # Shards only know the names they have taken themselves.
+    if shard is not None and conflict in ('skip', 'suffix'):
+        msg = "conflict can't be '{0}' with num_shards > 1, ".format(conflict)
+        msg += "the shards would overwrite each other's files; "
+        msg += "use 'hash' or 'path'."
+        raise ValueError(msg)
+    if conflict is None:
+        conflict = 'overwrite' if shard is None else 'hash'
+    return shard, conflict
+
+
+def _type_flag(target_type):
+    """
+    Returns a function telling if a detected type is one of the target
+    types (a str, a tuple or a list); any type matches if there are none.
+    """
+
+    # Sorting all files that are not folders.
+    if not target_type:
+        return bool
+
+    # Working with multiple file types.
+    if type(target_type) is not str:
+        return lambda file_type: file_type in target_type
+
+    # Working with a single file type.
+    return lambda file_type: file_type == target_type
+
+
+def _unpacker_destination(new_root, target_type):
+    """
+    Returns the destination function (see _detect_and_copy) of
+    folder_unpacker: every file of the target types goes to new_root.
+    """
+
+    # Extracting all files that are not folders. Subfolders don't
+    # need any special treatment, scan visits all of them.
+    if not target_type:
+        return lambda path, file_type: new_root
+
+    # Extracting only certain types.
+    flag = _type_flag(target_type)
+
+    def destination(path, file_type):
+        # Fighting with NoneType objects.
+        if not file_type:
+            _emit('error', 'detect', path,
+                  message="unknown type of the file")
+        if flag(file_type):
+            return new_root
+        return None
+    return destination
+
+
+def _sorter_destination(new_root, target_type):
+    """
+    Returns the destination function (see _detect_and_copy) of sorter:
+    every file of the target types goes to the folder of its type
+    (_Output creates it).
+    """
+
+    flag = _type_flag(target_type)
+
+    def destination(path, file_type):
+        # This flag checks that the file_type variable is not
+        # 'NoneType', which helps avoid TypeError. It sometimes
+        # happens that filetype defines the type of a normal file
+        # (for example, a jpg image) as None.
+        if file_type and flag(file_type):
+            # The folder has a name containing the type of files
+            # inside it. Next, I use a little formatting, replacing the
+            # '\'characters with '_'characters to avoid a path error.
+            return os.path.join(new_root, file_type.replace('/', '_'))
+        return None
+    return destination
+
+
+@contextlib.contextmanager
+def _copy_job(current_root, new_root, mode='copy', shard_size=None,
+              resume=False, incremental=False, checksum=False, cache=False,
+              plan=None, shard=None, conflict='overwrite', inventory=None):
+    """
+    Prepares copying the files of current_root (only those of the shard, if
+    it's given) to new_root: creates new_root and opens the journal,
+    the snapshot and the detection cache (see sorter for the arguments).
+    Yields the _Output, the records of the files (see _records) and
+    the cache (an _InventoryCache if the inventory is given), then closes
+    everything.
+    """
+
+    # Creating new folder if it doesn't exist (other shards may be
+    # creating it right now).
+    if plan is None and not os.path.exists(new_root):
+        try:
+            os.mkdir(new_root)
+        except FileExistsError:
+            pass
+    journal = _open_journal(new_root, resume, plan, shard)
+    snapshot = _open_snapshot(new_root, incremental, checksum, plan, shard)
+    cache, close_cache = _open_cache(cache, current_root, shard)
+    if type(inventory) == str:
+        inventory = load_inventory(inventory)
+    if inventory is not None and not os.path.isfile(current_root):
+        cache = _InventoryCache(inventory, cache)
+    try:
+        with _Output(mode, shard_size, journal, snapshot, plan, shard,
+                     conflict, current_root) as output:
+            records = _records(current_root,
+                               stat=cache is not None or incremental,
+                               shard=shard)
+            yield output, records, cache
+    finally:
+        if close_cache:
+            cache.close()
+
+
+def folder_unpacker(current_root, new_root, target_type=None, workers=1,
+                    processes=False, cache=False, mode='copy',
+                    shard_size=None, resume=False, incremental=False,
+                    checksum=False, dry_run=False, num_shards=1,
+                    shard_index=0, conflict=None, inventory=None):
+    """
+    Extracts all files of the desired type from a hierarchy of folders of
+    indeterminate size.
+
+    Args:
+
+        current_root (str): The source folder from which files are extracted,
+        at the top of the hierarchy.
+        It can also be a tar (possibly compressed) or zip archive; its files
+        are read as a stream without extracting them to the disk.
+
+        new_root (str): The folder to which the extracted files will be copied.
+
+        target_type (str or tuple or list):
+        Optional, defaults to None. The type of the target files.
+        (Example: jpg, pdf, png; without a dot at the beginning);
+        if you want to extract files of the diffrent type at the same way,
+        pass their types as a tuple or a list;
+        if you don't select the type, all files will be extracted.
+        To determine the file type, I used the filetype
+        package, in particular the 'guess' function with 'mime'.
+        To select the file type you need, see how the above function denotes
+        types and pass them to the already given function as an argument.
+        List of possible types here:
+        "https://pypi.org/project/filetype/"
+        Or here:
+        "https://github.com/t0efL/Dataset-Fixer/blob/master/file_types.txt"
+
+        workers (int): Optional, defaults to 1. The number of files processed
+        at the same time. Copying is limited by the storage latency rather
+        than by the CPU, so on network or NVMe storage values much greater
+        than the number of cores make sense.
+
+        processes (bool): Optional, defaults to False. If True, file types
+        are detected by a pool of processes instead of threads.
+
+        cache (bool or DetectionCache): Optional, defaults to False.
+        If True, the detected types are saved in the CACHE_NAME file in
+        current_root and reused by the next runs for the files that have not
+        changed since then. You can also pass your own DetectionCache.
+
+        mode (str): Optional, defaults to 'copy'. How the files get into
+        the new folder: 'copy' - regular copies; 'hardlink' - hard links to
+        the original files, taking no extra space; 'symlink' - symbolic links
+        to the original files; 'reflink' - copy-on-write clones on the file
+        systems supporting them (Btrfs, XFS...); 'move' - the files are moved.
+        'hardlink' and 'reflink' fall back to copying when it's impossible,
+        for example when new_root is on another file system.
+
+        shard_size (int): Optional, defaults to None. If given, the files are
+        written to new_root as tar shards (shard-000000.tar, shard-000001.tar
+        and so on) of at most about shard_size bytes instead of loose files.
+
+        resume (bool): Optional, defaults to False. While running, the
+        function keeps a journal of the processed files (JOURNAL_NAME in
+        new_root), which is deleted when it finishes. Pass True to continue
+        a run that was interrupted, skipping the files it has already
+        processed.
+
+        incremental (bool): Optional, defaults to False. If True, the state
+        of current_root is saved between runs (SNAPSHOT_NAME in new_root) and
+        only the files added or changed since the previous run are
+        processed; the copies of the files deleted or changed since then are
+        deleted from new_root. Can't be used with archives, shard_size or
+        mode='move'.
+
+        checksum (bool): Optional, defaults to False. With incremental=True,
+        files are compared by the hash of their contents instead of their
+        modification times and inodes.
+
+        dry_run (bool): Optional, defaults to False. If True, nothing is
+        copied, the function returns a Plan of what it would do instead.
+
+        num_shards (int): Optional, defaults to 1. The number of shards
+        the files are split into by a stable hash of their paths relative to
+        current_root, so that the operation can be run on several machines
+        (or processes, see run_sharded) at once without any coordination.
+
+        shard_index (int): Optional, defaults to 0. The shard processed by
+        this run, from 0 to num_shards - 1. Every shard has its own
+        journal, snapshot, cache and tar shards (named with a
+        "-<shard_index>-of-<num_shards>" suffix).
+
+        conflict (str): Optional, defaults to None, which means 'overwrite'
+        or, with num_shards > 1, 'hash'. What to do when a file with
+        the same name is already in the target folder (for example, when
+        files from different subfolders have the same name): 'overwrite' -
+        replace it; 'skip' - skip the new file; 'suffix' - name the new file
+        name_1.ext, name_2.ext and so on; 'hash' - prefix the name of every
+        file with the hash of its relative path (a1b2c3d4_name.ext), which
+        also keeps the shards of a sharded run apart; 'path' - keep
+        the relative path of every file, subfolders included. 'skip' and
+        'suffix' can't be used with num_shards > 1: every shard only knows
+        the names it has taken itself. Files are written under temporary
+        names and renamed when they are complete, so the target folder
+        never contains partly written files.
+
+        inventory (Inventory or str): Optional, defaults to None.
+        An inventory of current_root (or the file it was saved to, see
+        inventory). The types of the files are taken from it instead of
+        reading the files, except for the files added or changed since it
+        was made.
+
+    The function does not perform any conversions to the original folder,
+    files are not deleted after copying to a new folder (unless mode='move').
+    """
+
+    shard, conflict = _check_copy_arguments(
+        current_root, new_root, target_type, workers, mode, shard_size,
+        resume, incremental, checksum, dry_run, num_shards, shard_index,
+        conflict, inventory)
+    plan = Plan(new_root) if dry_run else None
+    destination = _unpacker_destination(new_root, target_type)
+    kind = 'mime' if target_type else None
+    job = _copy_job(current_root, new_root, mode, shard_size, resume,
+                    incremental, checksum, cache, plan, shard,
+                    conflict, inventory)
+    with job as (output, records, cache):
+        _detect_and_copy(records, kind, destination, output, workers,
+                         processes, cache=cache)
+    return plan
+
+
+def sorter(current_root, new_root, target_type=None, workers=1,
+           processes=False, cache=False, mode='copy', shard_size=None,
+           resume=False, incremental=False, checksum=False,
+           dry_run=False, num_shards=1, shard_index=0,
+           conflict=None, inventory=None):
+    """
+    Sorts files by their types.
+
+    This function extracts all files from the source folder and sorts them in
+    the target folder. The sorting process consists of creating several
+    new folders in the target folder with names of different file types
+    and then copying the corresponding files there.
+
+    The function ignores other folders with files inside the source folder.
+    If you also need to sort them, use the folder_unpacker function from
+    the same module to extract files from them in advance.
+
+    Args:
+
+        current_root (str): Source folder with unsorted files.
+        It can also be a tar (possibly compressed) or zip archive; its files
+        are read as a stream without extracting them to the disk.
+
+        new_root (str): The target folder where the sorted files will be
+        located.
+
+        target_type (str or tuple or list):
+        Optional, defaults to None. The type of the target files;
+        if you want to sort files of the diffrent type at the same way,
+        pass their types as a tuple or a list;
+        if you don't select the type, all files will be sorted.
+        To determine the file type, I used the filetype
+        package, in particular the 'guess' function with 'mime'.
+        To select the file type you need, see how the above function denotes
+        types and pass them to the already given function as an argument.
+        List of possible types here:
+        "https://pypi.org/project/filetype/"
+        Or here:
+        "https://github.com/t0efL/Dataset-Fixer/blob/master/file_types.txt"
+
+        workers (int): Optional, defaults to 1. The number of files processed
+        at the same time.
+
+        processes (bool): Optional, defaults to False. If True, file types
+        are detected by a pool of processes instead of threads.
+
+        cache (bool or DetectionCache): Optional, defaults to False.
+        If True, the detected types are saved in the CACHE_NAME file in
+        current_root and reused by the next runs for the files that have not
+        changed since then. You can also pass your own DetectionCache.
+
+        mode (str): Optional, defaults to 'copy'. How the files get into
+        the new folder: 'copy' - regular copies; 'hardlink' - hard links to
+        the original files, taking no extra space; 'symlink' - symbolic links
+        to the original files; 'reflink' - copy-on-write clones on the file
+        systems supporting them (Btrfs, XFS...); 'move' - the files are moved.
+        'hardlink' and 'reflink' fall back to copying when it's impossible,
+        for example when new_root is on another file system.
+
+        shard_size (int): Optional, defaults to None. If given, the files are
+        written to the folders of the types as tar shards (shard-000000.tar,
+        shard-000001.tar and so on) of at most about shard_size bytes instead
+        of loose files.
+
+        resume (bool): Optional, defaults to False. While running, the
+        function keeps a journal of the processed files (JOURNAL_NAME in
+        new_root), which is deleted when it finishes. Pass True to continue
+        a run that was interrupted, skipping the files it has already
+        processed.
+
+        incremental (bool): Optional, defaults to False. If True, the state
+        of current_root is saved between runs (SNAPSHOT_NAME in new_root) and
+        only the files added or changed since the previous run are
+        processed; the copies of the files deleted or changed since then are
+        deleted from new_root. Can't be used with archives, shard_size or
+        mode='move'.
+
+        checksum (bool): Optional, defaults to False. With incremental=True,
+        files are compared by the hash of their contents instead of their
+        modification times and inodes.
+
+        dry_run (bool): Optional, defaults to False. If True, nothing is
+        copied, the function returns a Plan of what it would do instead.
+
+        num_shards (int): Optional, defaults to 1. The number of shards
+        the files are split into by a stable hash of their paths relative to
+        current_root, so that the operation can be run on several machines
+        (or processes, see run_sharded) at once without any coordination.
+
+        shard_index (int): Optional, defaults to 0. The shard processed by
+        this run, from 0 to num_shards - 1. Every shard has its own
+        journal, snapshot, cache and tar shards (named with a
+        "-<shard_index>-of-<num_shards>" suffix).
+
+        conflict (str): Optional, defaults to None, which means 'overwrite'
+        or, with num_shards > 1, 'hash'. What to do when a file with
+        the same name is already in the target folder (for example, when
+        files from different subfolders have the same name): 'overwrite' -
+        replace it; 'skip' - skip the new file; 'suffix' - name the new file
+        name_1.ext, name_2.ext and so on; 'hash' - prefix the name of every
+        file with the hash of its relative path (a1b2c3d4_name.ext), which
+        also keeps the shards of a sharded run apart; 'path' - keep
+        the relative path of every file, subfolders included. 'skip' and
+        'suffix' can't be used with num_shards > 1: every shard only knows
+        the names it has taken itself. Files are written under temporary
+        names and renamed when they are complete, so the target folder
+        never contains partly written files.
+
+        inventory (Inventory or str): Optional, defaults to None.
+        An inventory of current_root (or the file it was saved to, see
+        inventory). The types of the files are taken from it instead of
+        reading the files, except for the files added or changed since it
+        was made.
+
+    The function does not perform any conversions to the original folder,
+    files are not deleted after copying to a new folder (unless mode='move').
+    """
+
+    shard, conflict = _check_copy_arguments(
+        current_root, new_root, target_type, workers, mode, shard_size,
+        resume, incremental, checksum, dry_run, num_shards, shard_index,
+        conflict, inventory)
+    plan = Plan(new_root) if dry_run else None
+    destination = _sorter_destination(new_root, target_type)
+    job = _copy_job(current_root, new_root, mode, shard_size, resume,
+                    incremental, checksum, cache, plan, shard,
+                    conflict, inventory)
+    with job as (output, records, cache):
+        _detect_and_copy(records, 'mime', destination, output, workers,
+                         processes, cache=cache)
+    return plan
+
+
+# What an async operation did with a file: the type detected for it (None if
+# nothing was detected) and the folder it was put into (None if it was
+# skipped).
+FileResult = namedtuple('FileResult', ['path', 'type', 'folder'])
+
+
+def _next_chunk(records):
+    """Returns the next _PROCESS_CHUNK records of the iterator."""
+
+    chunk = list()
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= _PROCESS_CHUNK:
+            break
+    return chunk
+
+
+def _finish_async(job, entered, threads, pool, error):
+    """
+    Waits for the files being processed by the executors and exits the job,
+    which keeps the journal for resume if the operation was interrupted.
+    """
+
+    threads.shutdown(wait=True, cancel_futures=True)
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+    if not entered:
+        return
+    if error is None:
+        job.__exit__(None, None, None)
+    else:
+        job.__exit__(type(error), error, error.__traceback__)
+
+
+async def _async_copy(job, kind, destination, workers=1, processes=False):
+    """
+    Asynchronous _detect_and_copy: runs _copy_record for the files of the job
+    (see _copy_job) in an internal thread pool, and the detection in
+    a process pool if processes is True. A semaphore keeps at most workers
+    files in flight, so the files are read from the disk only as fast as
+    they are processed. Yields a FileResult for every file as soon as it's
+    done, in the order of completion.
+
+    The event loop never blocks: scanning the source, opening and closing
+    the job are done in the default executor too. If the iteration is
+    cancelled or stopped early, the files that have not started are
+    dropped, the ones being copied are finished and the journal is kept,
+    so the operation can be resumed.
+    """
+
+    loop = asyncio.get_running_loop()
+    threads = futures.ThreadPoolExecutor(max_workers=workers)
+    pool = None
+    if processes and workers > 1 and kind is not None:
+        pool = _process_pool(workers)
+    semaphore = asyncio.Semaphore(workers)
+    bar = _Progress('copy' if kind is None else 'detect')
+    entered = False
+    error = None
+    pending = set()
+
+    def release(future):
+        semaphore.release()
+
+    def result(future):
+        path, (value, folder) = future.result()
+        bar.update()
+        return FileResult(path, value, folder)
+
+    try:
+        output, records, cache = await loop.run_in_executor(None,
+                                                            job.__enter__)
+        entered = True
+        records = iter(output.pending(records))
+
+        def copy(record):
+            return record.path, _copy_record(record, kind, destination,
+                                             output, cache, pool)
+
+        while True:
+            chunk = await loop.run_in_executor(None, _next_chunk, records)
+            if not chunk:
+                break
+            for record in chunk:
+                await semaphore.acquire()
+                future = loop.run_in_executor(threads, copy, record)
+                future.add_done_callback(release)
+                pending.add(future)
+                for finished in [item for item in pending if item.done()]:
+                    pending.discard(finished)
+                    yield result(finished)
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                yield result(future)
+    except BaseException as exception:
+        error = exception
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
+        await loop.run_in_executor(None, _finish_async, job, entered,
+                                   threads, pool, error)
+        bar.close()
+
+
+def async_folder_unpacker(current_root, new_root, target_type=None,
+                          workers=1, processes=False, cache=False,
+                          mode='copy', shard_size=None, resume=False,
+                          incremental=False, checksum=False, num_shards=1,
+                          shard_index=0, conflict=None, inventory=None):
+    """
+    Asynchronous version of folder_unpacker for asyncio applications.
+
+    Returns an async iterator yielding a FileResult for every file of
+    current_root as soon as it's processed:
+
+        async for result in async_folder_unpacker(root, new_root, workers=8):
+            ...
+
+    The files are processed by an internal executor, at most workers of
+    them at a time, so the event loop is never blocked. Cancelling the task
+    iterating it (or leaving the loop early) stops the operation cleanly:
+    the files being copied are finished and the journal is kept, so
+    the operation can be continued with resume=True (wrap the iterator in
+    contextlib.aclosing to have it closed right away). The arguments are
+    the same as those of folder_unpacker (there is no dry_run, use
+    folder_unpacker for plans) and are checked right away.
+    """
+
+    shard, conflict = _check_copy_arguments(
+        current_root, new_root, target_type, workers, mode, shard_size,
+        resume, incremental, checksum, False, num_shards, shard_index,
+        conflict, inventory)
+    destination = _unpacker_destination(new_root, target_type)
+    kind = 'mime' if target_type else None
+    job = _copy_job(current_root, new_root, mode, shard_size, resume,
+                    incremental, checksum, cache, shard=shard,
+                    conflict=conflict, inventory=inventory)
+    return _async_copy(job, kind, destination, workers, processes)
+
+
+def async_sorter(current_root, new_root, target_type=None, workers=1,
+                 processes=False, cache=False, mode='copy', shard_size=None,
+                 resume=False, incremental=False, checksum=False,
+                 num_shards=1, shard_index=0, conflict=None,
+                 inventory=None):
+    """
+    Asynchronous version of sorter for asyncio applications.
+
+    Returns an async iterator yielding a FileResult for every file of
+    current_root as soon as it's processed; its type is the detected type
+    and its folder is the folder of this type (None if the file was
+    skipped):
+
+        async for result in async_sorter(root, new_root, workers=8):
+            ...
+
+    The files are processed by an internal executor, at most workers of
+    them at a time, so the event loop is never blocked. Cancelling the task
+    iterating it (or leaving the loop early) stops the operation cleanly:
+    the files being copied are finished and the journal is kept, so
+    the operation can be continued with resume=True (wrap the iterator in
+    contextlib.aclosing to have it closed right away). The arguments are
+    the same as those of sorter (there is no dry_run, use sorter for plans)
+    and are checked right away.
+    """
+
+    shard, conflict = _check_copy_arguments(
+        current_root, new_root, target_type, workers, mode, shard_size,
+        resume, incremental, checksum, False, num_shards, shard_index,
+        conflict, inventory)
+    destination = _sorter_destination(new_root, target_type)
+    job = _copy_job(current_root, new_root, mode, shard_size, resume,
+                    incremental, checksum, cache, shard=shard,
+                    conflict=conflict, inventory=inventory)
+    return _async_copy(job, 'mime', destination, workers, processes)
+
+
+def run_sharded(function, num_shards, *args, **kwargs):
+    """
+    Runs the operation split into shards on this machine: function
+    (folder_unpacker, sorter or cleaner) is called with the arguments in
+    num_shards processes at once, each with its own shard_index. This is
+    what several machines sharing the file system do, so it's useful for
+    testing a sharded setup (and for using several cores when detecting
+    the types is the bottleneck).
+
+    Args:
+
+        function (function): The operation, it must accept num_shards and
+        shard_index.
+
+        num_shards (int): The number of shards and processes.
+
+        The rest of the arguments are passed to function.
+
+    Returns the list of the results of the shards (their Plans with
+    dry_run=True) in the order of shard_index. The processes don't show
+    any progress bars. If a shard fails, its exception is raised after all
+    the shards have finished; the other shards' work is kept and a rerun
+    with resume=True continues the failed one. The shards don't see each
+    other's names, so files with the same name are kept apart by
+    conflict='hash' (the default of sharded runs) or 'path'.
+    """
+
+    if not callable(function):
+        msg = "function must be callable, not {0}.".format(type(function))
+        raise ValueError(msg)
+    _sharding(num_shards, 0)
+
+    with _process_pool(num_shards) as executor:
+        shards = [executor.submit(function, *args, num_shards=num_shards,
+                                  shard_index=shard_index, **kwargs)
+                  for shard_index in range(num_shards)]
+        futures.wait(shards)
+    return [shard.result() for shard in shards]
+
+
+def _label(root, path):
+    """
+    Returns the label of the file for stratified splitting: the name of
+    the subfolder of root it is in, '' for the files in root itself.
+    path is the path of the file or its name in the root archive.
+    """
+
+    if not _is_archive(root):
+        root = os.path.join(root, '')
+        if path.startswith(root):
+            path = path[len(root):]
+    # Archives may name their files like './folder/file'.
+    parts = [part for part in path.replace(os.sep, '/').split('/')
+             if part not in ('', '.')]
+    return parts[0] if len(parts) > 1 else ''
+
+
+def _moved_files(new_root, mode='copy', resume=False):
+    """
+    Returns the paths of the files that the interrupted run of splitter
+    with mode='move' has already moved to new_root (they are listed in its
+    journal), otherwise an empty tuple.
+    """
+
+    if mode != 'move' or not resume:
+        return ()
+    return list(_Journal(os.path.join(new_root, JOURNAL_NAME), resume,
+                         read_only=True))
+
+
+def _split_index(root, stratify=False, moved=()):
+    """
+    Lists the dataset for splitting once. Returns the sorted paths of
+    the files and, if stratify is True, their labels (see _label),
+    otherwise None. Without stratify only the files in root are listed.
+    The moved files (see _moved_files) are added to the listed ones, so
+    that a resumed run splits the dataset just as the interrupted one did.
+    """
+
+    if not stratify:
+        files = _list_sources(root)
+    elif _is_archive(root):
+        files = _archive_names(root)
+    else:
+        files = sorted(record.path for record in scan(root)
+                       if record.is_file)
+    if moved:
+        files = sorted(set(files).union(moved))
+    if not stratify:
+        return files, None
+    return files, [_label(root, file) for file in files]
+
+
+def _largest_remainder(shares, total):
+    """
+    Divides total items in proportion to shares. Every part gets the whole
+    part of its quota and the items left are given to the parts with the
+    largest remainders, so the numbers always add up to total.
+    """
+
+    quotas = [share * total / sum(shares) for share in shares]
+    numbers = [int(quota) for quota in quotas]
+    remainders = sorted(range(len(shares)),
+                        key=lambda i: numbers[i] - quotas[i])
+    for i in remainders[:total - sum(numbers)]:
+        numbers[i] += 1
+    return numbers
+
+
+def _stratified_numbers(relation, sizes):
+    """
+    Divides the files of every label between the parts of the split, sizes
+    holds the numbers of files of the labels. Returns the numbers of files
+    of every label in every part.
+
+    The share of a label in a part (relation[i] * size / total) is rounded
+    down or up, so every label is split in the ratio of relation to within
+    a file, and the parts get exactly the numbers in relation. The shares
+    with the largest remainders are rounded up first, like in
+    _largest_remainder, and then the rounding is fixed along augmenting
+    paths until the numbers add up. Such a rounding always exists because
+    the shares of a part add up to a whole number of files.
+    """
+
+    total = sum(relation)
+    labels = range(len(sizes))
+    parts = range(len(relation))
+    numbers = [[relation[i] * sizes[j] // total for i in parts]
+               for j in labels]
+    remainders = [[relation[i] * sizes[j] % total for i in parts]
+                  for j in labels]
+    label_needs = [sizes[j] - sum(numbers[j]) for j in labels]
+    part_needs = [relation[i] - sum(numbers[j][i] for j in labels)
+                  for i in parts]
+    rounded_up = [[False for _ in parts] for _ in labels]
+
+    cells = sorted(((j, i) for j in labels for i in parts
+                    if remainders[j][i]),
+                   key=lambda cell: -remainders[cell[0]][cell[1]])
+    for j, i in cells:
+        if label_needs[j] and part_needs[i]:
+            rounded_up[j][i] = True
+            label_needs[j] -= 1
+            part_needs[i] -= 1
+
+    # Every path goes from a label that needs a file to a part that needs
+    # one, through shares that can be rounded up (label to part) and ones
+    # that are (part to label), and swaps the rounding along it.
+    for start in labels:
+        while label_needs[start]:
+            previous = {('label', start): None}
+            queue = deque([('label', start)])
+            end = None
+            while end is None:
+                kind, index = queue.popleft()
+                if kind == 'label':
+                    steps = [('part', i) for i in parts
+                             if remainders[index][i] and
+                             not rounded_up[index][i]]
+                else:
+                    steps = [('label', j) for j in labels
+                             if rounded_up[j][index]]
+                for step in steps:
+                    if step in previous:
+                        continue
+                    previous[step] = (kind, index)
+                    if step[0] == 'part' and part_needs[step[1]]:
+                        end = step
+                        break
+                    queue.append(step)
+            step = end
+            while previous[step] is not None:
+                before = previous[step]
+                if step[0] == 'part':
+                    rounded_up[before[1]][step[1]] = True
+                else:
+                    rounded_up[step[1]][before[1]] = False
+                step = before
+            label_needs[start] -= 1
+            part_needs[end[1]] -= 1
+
+    return [[numbers[j][i] + rounded_up[j][i] for i in parts]
+            for j in labels]
+
+
+def _assign_parts(relation, labels, seed=None):
+    """
+    Returns the indexes of the files in each part of the split. relation
+    holds the numbers of files in the parts.
+
+    If seed is not None, the files are shuffled with it first. Without
+    labels the parts are consecutive slices of the files. Otherwise
+    the files of every label are divided between the parts by
+    _stratified_numbers, so every label is split in the same ratio (to
+    within a file) and the parts still get exactly the requested numbers
+    of files.
+    """
+
+    total = sum(relation)
+    order = list(range(total))
+    if seed is not None:
+        random.Random(seed).shuffle(order)
+
+    parts = list()
+    if labels is None:
+        iter_point = 0
+        for part in relation:
+            parts.append(order[iter_point:(iter_point + part)])
+            iter_point += part
+        return parts
+
+    # Grouping by label, the shuffled order is kept inside the groups.
+    groups = dict()
+    for idx in order:
+        groups.setdefault(labels[idx], list()).append(idx)
+
+    parts = [list() for _ in relation]
+    names = sorted(groups)
+    numbers = _stratified_numbers(relation,
+                                  [len(groups[name]) for name in names])
+    for name, row in zip(names, numbers):
+        start = 0
+        for part, number in zip(parts, row):
+            part.extend(groups[name][start:start + number])
+            start += number
+    return parts
+
+
+def splitter_numerical(current_root, new_root, relation, workers=1,
+                       mode='copy', manifest=False, shard_size=None,
+                       resume=False, seed=None, stratify=False, files=None,
+                       labels=None, dry_run=False):
+    """
+    Splitter function with relation_type='numerical'. files and labels are
+    the result of _split_index if the dataset is already listed.
+    """
+
+    # Checking the validity of the split.
+    if files is None:
+        files, labels = _split_index(current_root, stratify,
+                                     _moved_files(new_root, mode, resume))
+    assert_message = "The number of files in the separated parts of the "
+    assert_message += "dataset does not match the original number of files:"
+    assert_message += " {0} != {1}.".format(sum(relation), len(files))
+    assert sum(relation) == len(files), assert_message
+
+    # Checking for the absence of fractional values.
+    for number in relation:
+        assert_message = "the relation argument "
+        assert_message += "can only contain integer values."
+        assert type(number) == int, assert_message
+
+    # Allocating the files to the parts.
+    parts = _assign_parts(relation, labels, seed)
+
+    # Writing a manifest for each part of the dataset instead of copying.
+    plan = Plan(new_root) if dry_run else None
+    if manifest:
+        for i, part in enumerate(parts):
+            path = os.path.join(new_root, (str(i+1) + "_part.txt"))
+            if plan is None:
+                write_manifest(path, (files[idx] for idx in part))
+                continue
+            for idx in part:
+                plan.add('manifest', files[idx], path)
+        return plan
+
+    # Creating a new folder for each part of the dataset (they are already
+    # there when resuming) and a subfolder for each label inside it.
+    for i in range(len(relation) if plan is None else 0):
+        folder = os.path.join(new_root, (str(i+1) + "_part"))
+        os.makedirs(folder, exist_ok=resume)
+        for label in set(labels or ()):
+            os.makedirs(os.path.join(folder, label), exist_ok=True)
+
+    # Splitting. All parts are copied as one batch.
+    def tasks():
+        for i, part in enumerate(parts):
+            folder = os.path.join(new_root, (str(i+1) + "_part"))
+            for idx in part:
+                if labels:
+                    yield files[idx], os.path.join(folder, labels[idx])
+                else:
+                    yield files[idx], folder
+
+    def copy(task):
+        output.put(*task)
+
+    journal = _open_journal(new_root, resume, plan)
+    with _Output(mode, shard_size, journal, plan=plan) as output:
+        # Archives are read as a stream, so their files come in the order
+        # they are stored rather than in the order of the parts.
+        if _is_archive(current_root):
+            folders = dict(tasks())
+            members = output.pending(_archive_members(current_root))
+            copies = ((member, folders[member.path]) for member in members
+                      if member.path in folders)
+        else:
+            copies = (task for task in tasks()
+                      if task[0] not in journal)
+        for _ in _parallel_map(copy, copies, workers, total=len(files),
+                               stage='copy'):
+            pass
+    return plan
+
+
+def splitter_percentage(current_root, new_root, relation, workers=1,
+                        mode='copy', manifest=False, shard_size=None,
+                        resume=False, seed=None, stratify=False, files=None,
+                        labels=None, dry_run=False):
+    """
+    Splitter function with relation_type='percentage'. files and labels are
+    the result of _split_index if the dataset is already listed.
+    """
+
+    # The sum of floats may differ from 1 in the last digits.
+    assert_message = "The sum of the parts as a percentage must be equal to 1:"
+    assert_message += " {0} != 1.".format(sum(relation))
+    assert abs(sum(relation) - 1) < 1e-9, assert_message
+
+    # Reducing the ratio to a numerical form
+    # and pass it to the corresponding function.
+    if files is None:
+        files, labels = _split_index(current_root, stratify,
+                                     _moved_files(new_root, mode, resume))
+    numerical = _largest_remainder(relation, len(files))
+
+    return splitter_numerical(current_root, new_root, numerical,
+                              workers=workers, mode=mode, manifest=manifest,
+                              shard_size=shard_size, resume=resume,
+                              seed=seed, files=files, labels=labels,
+                              dry_run=dry_run)
+
+
+def splitter_mutual(current_root, new_root, relation, workers=1,
+                    mode='copy', manifest=False, shard_size=None,
+                    resume=False, seed=None, stratify=False, files=None,
+                    labels=None, dry_run=False):
+    """
+    Splitter function with relation_type='mutual'. files and labels are
+    the result of _split_index if the dataset is already listed.
+    """
+
+    # Reducing the ratio to a percentage form
+    # and pass it to the corresponding function.
+    percentage = list()
+    for item in relation:
+        item = item/sum(relation)
+        percentage.append(item)
+
+    return splitter_percentage(current_root, new_root, percentage,
+                               workers=workers, mode=mode, manifest=manifest,
+                               shard_size=shard_size, resume=resume,
+                               seed=seed, stratify=stratify, files=files,
+                               labels=labels, dry_run=dry_run)
+
+
+def splitter(current_root, new_root, relation, relation_type='numerical',
+             workers=1, mode='copy', manifest=False, shard_size=None,
+             resume=False, seed=None, stratify=False, dry_run=False):
+    """
+    Splits the existing dataset into several parts in the ratio specified
+    by the user.
+
+    Args:
+
+        current_root (str): Source folder with the dataset.
+        It can also be a tar (possibly compressed) or zip archive; its files
+        are read as a stream without extracting them to the disk.
+
+        new_root (str): The target folder where the split dataset will appear.
+
+        relation (tuple or list): The ratio of parts that the
+        dataset is divided into. The split ratio can be passed in different ways
+        (in all cases, it is a tuple or list containing all the values inside):
+        1) Numerical (int) -  A list or tuple containing the number of files
+        in each part of the split dataset. For example, (1000, 2000, 3000) if
+        there are 6000 files in total in current_root.
+        If the sum of files in different parts of the dataset does not match the
+        number of files in the source folder, you will get an error.
+        2) Mutual relation (float) - A list or tuple containing the ratio of the
+        number of files in different parts of a divided dataset to each other.
+        For example, (1, 1.5, 2) means 1 : 1.5 : 2. In this case, if the source
+        dataset has 4500 files, they will be distributed as 1000, 1500, 2000
+        files respectively.
+        3) Percentage ratio (float) - A list or tuple containing the percentage
+        of the number of files in different parts of the split dataset.
+        Instead of percentages, parts of the whole are used here.
+        For example, (0.5, 0.25, 0.25) means 50%, 25%, 25%.
+        In this case, if the source dataset has 1000 files, they will be
+        distributed as 500, 250, 250 respectively. Make sure that the sum of all
+        the numbers in the list or tuple is equal to 1,
+        otherwise you will get an error.
+        To select one of these types, pass the corresponding value of the
+        relation_type argument to the function (read more about this below).
+
+        relation_type (str): The type of ratio that the dataset
+        will be divided by. This parameter is directly related to the relation
+        parameter. Read the description of the latter to understand what this
+        parameter is for. Each type of relationship corresponds to the following
+        value of the relation_type parameter:
+        1) Numerical - relation_type='numerical'
+        2) Mutual relation - relation_type='mutual'
+        3) Percentage ratio - relation_type='percentage'
+
+        workers (int): Optional, defaults to 1. The number of files copied
+        at the same time.
+
+        mode (str): Optional, defaults to 'copy'. How the files get into
+        the new folder: 'copy' - regular copies; 'hardlink' - hard links to
+        the original files, taking no extra space; 'symlink' - symbolic links
+        to the original files; 'reflink' - copy-on-write clones on the file
+        systems supporting them (Btrfs, XFS...); 'move' - the files are moved.
+        'hardlink' and 'reflink' fall back to copying when it's impossible,
+        for example when new_root is on another file system.
+
+        shard_size (int): Optional, defaults to None. If given, the files are
+        written to the folders of the parts as tar shards (shard-000000.tar,
+        shard-000001.tar and so on) of at most about shard_size bytes instead
+        of loose files.
+
+        manifest (bool): Optional, defaults to False. If True, no files are
+        copied, the list of files of each part is written to new_root
+        as a manifest named 1_part.txt, 2_part.txt and so on (see
+        write_manifest and load_manifest).
+
+        resume (bool): Optional, defaults to False. While running, the
+        function keeps a journal of the processed files (JOURNAL_NAME in
+        new_root), which is deleted when it finishes. Pass True to continue
+        a run that was interrupted, skipping the files it has already
+        processed. With mode='move', the files already moved are still
+        counted, so the parts are the same as they would be without
+        the interruption (pass the same seed).
+
+        seed (int): Optional, defaults to None. If given, the files are
+        shuffled with this random-seed before splitting, otherwise they are
+        split in the order of their names.
+
+        stratify (bool): Optional, defaults to False. If True, the files of
+        all the subfolders of current_root are split and the name of the
+        subfolder is the label (class) of a file, for example the type
+        folders made by sorter. Every label is split in the same ratio as
+        the whole dataset and its files are put into a subfolder of the same
+        name in each part.
+
+        dry_run (bool): Optional, defaults to False. If True, nothing is
+        copied, the function returns a Plan of what it would do instead.
+
+    With relation_type='mutual' or 'percentage' the numbers of files that
+    are not whole are rounded so that they still add up to the number of
+    files in the dataset.
+
+    The dataset is listed only once, however many parts there are.
+
+    The function does not perform any conversions to the original folder,
+    files are not deleted after copying to a new folder (unless mode='move').
+    """
+
+    # Checking the types of the arguments.
+    if type(current_root) != str:
+        msg = "current_root must be str, not {0}.".format(type(current_root))
+        raise ValueError(msg)
+    if type(new_root) != str:
+        msg = "new_root must be str, not {0}.".format(type(new_root))
+        raise ValueError(msg)
+    if type(relation) not in (tuple, list):
+        msg = "relation must be "
+        msg += "list or tuple, not {0}.".format(type(relation))
+    if type(relation_type) != str:
+        msg = "relation_type must be str, not {0}.".format(type(relation_type))
+        raise ValueError(msg)
+    if type(workers) != int:
+        msg = "workers must be int, not {0}.".format(type(workers))
+        raise ValueError(msg)
+    if type(manifest) != bool:
+        msg = "manifest must be bool, not {0}.".format(type(manifest))
+        raise ValueError(msg)
+    if shard_size is not None and type(shard_size) != int:
+        msg = "shard_size must be int, not {0}.".format(type(shard_size))
+        raise ValueError(msg)
+    if type(resume) != bool:
+        msg = "resume must be bool, not {0}.".format(type(resume))
+        raise ValueError(msg)
+    if seed is not None and type(seed) != int:
+        msg = "seed must be int, not {0}.".format(type(seed))
+        raise ValueError(msg)
+    if type(stratify) != bool:
+        msg = "stratify must be bool, not {0}.".format(type(stratify))
+        raise ValueError(msg)
+    if type(dry_run) != bool:
+        msg = "dry_run must be bool, not {0}.".format(type(dry_run))
+        raise ValueError(msg)
+    assert workers > 0, "workers must be a positive number."
+    assert mode in MODES, "mode must be one of {0}.".format(MODES)
+    assert_message = "shard_size must be a positive number."
+    assert shard_size is None or shard_size > 0, assert_message
+
+    # Creating new folder if it doesn't exist.
+    if not dry_run and not os.path.exists(new_root):
+        os.mkdir(new_root)
+
+    # Check out the type of relation argument.
+    assert_message = "the relation argument must be a list or tuple."
+    assert type(relation) in (tuple, list), assert_message
+
+    # Making sure that the lenght of relation argument less than the number
+    # files in the source dataset. The folder is listed only once.
+    files, labels = _split_index(current_root, stratify,
+                                 _moved_files(new_root, mode, resume))
+    assert_message = "the length of the relation argument cannot be greater "
+    assert_message += "than the number of files in the source folder."
+    assert len(relation) < len(files), assert_message
+
+    # Checking for the absence of negative values and zeros.
+    for number in relation:
+        assert_message = "the relation argument "
+        assert_message += "can only contain positive values."
+        assert number > 0, assert_message
+
+    # Select the type of relationship interpretations.
+    if relation_type == 'numerical':
+        return splitter_numerical(current_root, new_root, relation,
+                                  workers=workers, mode=mode,
+                                  manifest=manifest, shard_size=shard_size,
+                                  resume=resume, seed=seed, files=files,
+                                  labels=labels, dry_run=dry_run)
+    elif relation_type == 'mutual':
+        return splitter_mutual(current_root, new_root, relation,
+                               workers=workers, mode=mode, manifest=manifest,
+                               shard_size=shard_size, resume=resume,
+                               seed=seed, files=files, labels=labels,
+                               dry_run=dry_run)
+    elif relation_type == 'percentage':
+        return splitter_percentage(current_root, new_root, relation,
+                                   workers=workers, mode=mode,
+                                   manifest=manifest, shard_size=shard_size,
+                                   resume=resume, seed=seed, files=files,
+                                   labels=labels, dry_run=dry_run)
+    else:
+        assert_message = "invalid relation_type value. Choose one of "
+        assert_message += "'numerical'(default), 'mutual', 'percentage'."
+        assert False, assert_message
+
+
+def shuffler(current_root, new_root, seed=None, workers=1, mode='copy',
+             manifest=False, resume=False, dry_run=False):
+    """
+    Shuffles files in the dataset.
+
+    Args:
+
+        current_root (str): Source folder with the dataset.
+
+        new_root (str): The target folder where the shuffled dataset
+        will appear.
+
+        seed (int): random-seed for shuffling.
+
+        workers (int): Optional, defaults to 1. The number of files copied
+        at the same time.
+
+        mode (str): Optional, defaults to 'copy'. How the files get into
+        the new folder: 'copy' - regular copies; 'hardlink' - hard links to
+        the original files, taking no extra space; 'symlink' - symbolic links
+        to the original files; 'reflink' - copy-on-write clones on the file
+        systems supporting them (Btrfs, XFS...); 'move' - the files are moved.
+        'hardlink' and 'reflink' fall back to copying when it's impossible,
+        for example when new_root is on another file system.
+
+        manifest (bool): Optional, defaults to False. If True, no files are
+        copied, the shuffled list of files is written to the 'shuffled.txt'
+        manifest in new_root instead (see write_manifest and load_manifest).
+
+        resume (bool): Optional, defaults to False. While running, the
+        function keeps a journal of the processed files (JOURNAL_NAME in
+        new_root), which is deleted when it finishes. Pass True to continue
+        a run that was interrupted, skipping the files it has already
+        processed.
+
+        dry_run (bool): Optional, defaults to False. If True, nothing is
+        copied, the function returns a Plan of what it would do instead.
+
+    After shuffling all the files and placing them in a new folder, the new
+    folder will most likely be sorted by name by default. Since most files in
+    datasets have similar names, the order may remain the same. In order for
+    the shuffle to take effect, sort the files in the folder by date.
+    Files copied by several workers at the same time may end up with equal
+    or slightly reordered modification dates, so use workers=1 if you rely
+    on this order. Hard links, reflinks and moved files keep the dates of
+    the original files, so only mode='copy' and mode='symlink' (if the links
+    themselves are sorted) produce a shuffled order. The manifest doesn't
+    have this problem.
+
+    The files are shuffled in the order of their names, so the same seed
+    always gives the same result for the same dataset.
+
+    The function does not perform any conversions to the original folder,
+    files are not deleted after copying to a new folder (unless mode='move').
+    """
+
+    # Checking types of the arguments.
+    if type(current_root) != str:
+        msg = "current_root must be str, not {0}.".format(type(current_root))
+        raise ValueError(msg)
+    if type(new_root) != str:
+        msg = "new_root must be str, not {0}.".format(type(new_root))
+        raise ValueError(msg)
+    if seed and (type(seed) != int):
+        msg = "seed must be int, not {0}.".format(type(seed))
+        raise ValueError(msg)
+    if type(workers) != int:
+        msg = "workers must be int, not {0}.".format(type(workers))
+        raise ValueError(msg)
+    if type(manifest) != bool:
+        msg = "manifest must be bool, not {0}.".format(type(manifest))
+        raise ValueError(msg)
+    if type(resume) != bool:
+        msg = "resume must be bool, not {0}.".format(type(resume))
+        raise ValueError(msg)
+    if type(dry_run) != bool:
+        msg = "dry_run must be bool, not {0}.".format(type(dry_run))
+        raise ValueError(msg)
+    assert workers > 0, "workers must be a positive number."
+    assert mode in MODES, "mode must be one of {0}.".format(MODES)
+
+    # Creating new folder if it doesn't exist.
+    plan = Plan(new_root) if dry_run else None
+    if plan is None and not os.path.exists(new_root):
+        os.mkdir(new_root)
+
+    # Set up the seed.
+    generator = random.Random(seed)
+
+    # Shuffling.
+    files = _list_files(current_root)
+    indexes = [i for i in range(len(files))]
+    generator.shuffle(indexes)
+
+    # Writing the manifest instead of copying.
+    if manifest:
+        path = os.path.join(new_root, "shuffled.txt")
+        if plan is None:
+            write_manifest(path, (files[idx] for idx in indexes))
+        else:
+            for idx in indexes:
+                plan.add('manifest', files[idx], path)
+        return plan
+
+    # Copying.
+    journal = _open_journal(new_root, resume, plan)
+    with _Output(mode, journal=journal, plan=plan) as output:
+        def copy(file):
+            output.put(file, new_root)
+
+        tasks = (files[idx] for idx in indexes if files[idx] not in journal)
+        for _ in _parallel_map(copy, tasks, workers, total=len(files),
+                               stage='copy'):
+            pass
+
+    if plan is not None:
+        return plan
+    _emit('message', 'shuffle',
+          message="The shuffle is complete. Make sure that the files "
+                  "in the new folder are sorted by date.")
+
+
+def cleaner(root, target_type, cache=False, workers=1, resume=False,
+            dry_run=False, num_shards=1, shard_index=0, trash=False,
+            inventory=None):
+    """
+    Deletes files of a certain type from the dataset.
+
+    Args:
+
+        root (str): Source folder with the dataset.
+
+        target_type (str or tuple or list):
+        The type of the target files;
+        if you want to delete files of the diffrent type at the same way,
+        pass their types as a tuple or a list;
+        To determine the file type, I used the filetype
+        package, in particular the 'guess' function with 'mime'.
+        To select the file type you need, see how the above function denotes
+        types and pass them to the already given function as an argument.
+        List of possible types here:
+        "https://pypi.org/project/filetype/"
+        Or here:
+        "https://github.com/t0efL/Dataset-Fixer/blob/master/file_types.txt"
+
+        cache (bool or DetectionCache): Optional, defaults to False.
+        If True, the detected types are saved in the CACHE_NAME file in root
+        and reused by the next runs for the files that have not changed
+        since then. You can also pass your own DetectionCache.
+
+        workers (int): Optional, defaults to 1. The number of files whose
+        types are detected at the same time; the headers of the next files
+        are read while the current ones are deleted. The files are deleted
+        by as many threads, in batches of the files of the same folder.
+
+        resume (bool): Optional, defaults to False. While running, the
+        function keeps a journal of the processed files (JOURNAL_NAME in
+        root), which is deleted when it finishes. Pass True to continue
+        a run that was interrupted, skipping the files it has already
+        processed.
+
+        dry_run (bool): Optional, defaults to False. If True, nothing is
+        deleted, the function returns a Plan of the files it would delete
+        instead.
+
+        num_shards (int): Optional, defaults to 1. The number of shards
+        the files are split into by a stable hash of their paths relative to
+        root, so that the operation can be run on several machines
+        (or processes, see run_sharded) at once without any coordination.
+
+        shard_index (int): Optional, defaults to 0. The shard processed by
+        this run, from 0 to num_shards - 1. Every shard has its own
+        journal and cache (named with a "-<shard_index>-of-<num_shards>"
+        suffix).
+
+        trash (bool): Optional, defaults to False. If True, the files are
+        moved to the trash (a folder in TRASH_NAME in root) instead of being
+        deleted, see restore_trash and purge_trash.
+
+        inventory (Inventory or str): Optional, defaults to None.
+        An inventory of root (or the file it was saved to, see inventory).
+        The types of the files are taken from it instead of reading
+        the files, except for the files added or changed since it was made.
+
+    This function irrevocably deletes files without copying them anywhere in
+    advance (unless trash is True). If you still want to save these files to
+    another folder before deleting them from this one, use the
+    folder_unpacker function from the same module.
+    """
+
+    if type(root) != str:
+        msg = "root must be str, not {0}.".format(type(root))
+        raise ValueError(msg)
+    if type(target_type) not in (str, tuple, list):
+        msg = "target_type must be str, "
+        msg += "list or tuple, not {0}.".format(type(target_type))
+        raise ValueError(msg)
+    if type(workers) != int:
+        msg = "workers must be int, not {0}.".format(type(workers))
+        raise ValueError(msg)
+    if type(resume) != bool:
+        msg = "resume must be bool, not {0}.".format(type(resume))
+        raise ValueError(msg)
+    if type(dry_run) != bool:
+        msg = "dry_run must be bool, not {0}.".format(type(dry_run))
+        raise ValueError(msg)
+    if type(trash) != bool:
+        msg = "trash must be bool, not {0}.".format(type(trash))
+        raise ValueError(msg)
+    if inventory is not None and type(inventory) not in (Inventory, str):
+        msg = "inventory must be Inventory or str, "
+        msg += "not {0}.".format(type(inventory))
+        raise ValueError(msg)
+    assert workers > 0, "workers must be a positive number."
+    shard = _sharding(num_shards, shard_index)
+    if type(inventory) == str:
+        inventory = load_inventory(inventory)
+
+    def mime(record):
+        if inventory is not None:
+            values = inventory._values(record)
+            if 'mime' in values:
+                return values['mime']
+        return _detect('mime', record.path, cache, record.stat)
+
+    # Working with multiple file types.
+    if type(target_type) is not str:
+        def flag(x, y):
+            file_type = mime(x)
+            # Fighting with NoneType objects.
+            if not file_type:
+                _emit('error', 'detect', x.path,
+                      message="unknown type of the file")
+            # Flag.
+            for i in y:
+                if file_type == i:
+                    return True
+            return False
+
+    # Working with a single file type.
+    else:
+        def flag(x, y):
+            file_type = mime(x)
+            # Fighting with NoneType objects.
+            if not file_type:
+                _emit('error', 'detect', x.path,
+                      message="unknown type of the file")
+            # Flag.
+            return file_type == y
+
+    # Deleting. scan yields only files, so there are no folders to remove.
+    plan = Plan() if dry_run else None
+    journal = _open_journal(root, resume, plan, shard)
+    cache, close_cache = _open_cache(cache, root, shard)
+    try:
+        def detect(record):
+            return record, flag(record, target_type)
+
+        stat = cache is not None or inventory is not None
+        records = _shard_records(scan(root, stat=stat), root, shard)
+        records = (record for record in records
+                   if record.path not in journal)
+        folder = _trash_folder(root) if trash and plan is None else None
+        with _Deleter(root, workers, journal, folder) as deleter:
+            for record, matched in _parallel_map(detect, records, workers,
+                                                 stage='detect'):
+                if matched and plan is not None:
+                    plan.add('trash' if trash else 'delete', record.path)
+                # The deleter adds the file to the journal.
+                elif matched:
+                    deleter.add(record.path)
+                    continue
+                journal.add(record.path)
+    except BaseException:
+        journal.close()
+        raise
+    else:
+        journal.close(remove=True)
+    finally:
+        if close_cache:
+            cache.close()
+    return plan
+
+
+def _iter_entries(folder):
+    """
+    Yields a FileRecord (without stat) for every entry of the folder while
+    it is being listed, so that huge folders take constant memory.
+    """
+
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.name.startswith(_SERVICE_NAMES):
+                continue
+            is_dir = entry.is_dir()
+            yield FileRecord(entry.path, None, is_dir,
+                             not is_dir and entry.is_file())
+
+
+def _sample(records, total, number=None, fraction=None, seed=None):
+    """
+    Yields a sample of the records in their order, taking constant memory.
+
+    With fraction, every record is taken with this probability (Bernoulli
+    sampling), total isn't used. Otherwise exactly number out of total
+    records are taken: the first ones if seed is None, else a uniformly
+    random sample (Knuth's selection sampling, a record is taken with
+    the probability of the number still needed to the number of records
+    left).
+    """
+
+    if fraction is not None:
+        generator = random.Random(seed)
+        for record in records:
+            if generator.random() < fraction:
+                yield record
+        return
+    if seed is None:
+        generator = None
+    else:
+        generator = random.Random(seed)
+    for record in records:
+        if number <= 0:
+            return
+        if generator is None or generator.random() * total < number:
+            number -= 1
+            yield record
+        total -= 1
+
+
+def cutter(root, number=None, resume=False, keep=None, fraction=None,
+           seed=None, dry_run=False, workers=1, trash=False):
+    """
+    Reduces the dataset by deleting unnecessary files.
+
+    Args:
+
+        root (str): Source folder with the dataset.
+
+        number (int): Optional, defaults to None. Number of files to delete.
+
+        resume (bool): Optional, defaults to False. While running, the
+        function keeps a journal of the processed files (JOURNAL_NAME in
+        root), which is deleted when it finishes. Pass True to continue
+        a run that was interrupted; the files it has already deleted count
+        towards number.
+
+        keep (int): Optional, defaults to None. Number of files to keep,
+        the rest are deleted. Pass it instead of number.
+
+        fraction (float): Optional, defaults to None. Instead of number or
+        keep, the share of the files to delete: every file is deleted with
+        this probability, so the number of deleted files is only about
+        fraction of all the files. It can't be used with resume.
+
+        seed (int): Optional, defaults to None. If given, the files to
+        delete are chosen at random with this random-seed, otherwise the
+        first files in the order of the folder listing are deleted (with
+        fraction the choice is always random).
+
+        dry_run (bool): Optional, defaults to False. If True, nothing is
+        deleted, the function returns a Plan of the files it would delete
+        instead.
+
+        workers (int): Optional, defaults to 1. The number of threads
+        deleting the files, in batches.
+
+        trash (bool): Optional, defaults to False. If True, the files are
+        moved to the trash (a folder in TRASH_NAME in root) instead of being
+        deleted, see restore_trash and purge_trash.
+
+    The folder is read as a stream and the chosen files are deleted while
+    it's being listed, so the memory taken doesn't depend on the number of
+    files in it. With number or keep, the files are counted first.
+
+    This function irrevocably deletes files without copying them anywhere in
+    advance (unless trash is True). If you still want to save these files to
+    another folder before deleting them from this one, use the
+    folder_unpacker function from the same module.
+    """
+
+    if type(root) != str:
+        msg = "root must be str, not {0}.".format(type(root))
+        raise ValueError(msg)
+    if number is not None and type(number) != int:
+        msg = "number must be int, not {0}.".format(type(number))
+        raise ValueError(msg)
+    if type(resume) != bool:
+        msg = "resume must be bool, not {0}.".format(type(resume))
+        raise ValueError(msg)
+    if keep is not None and type(keep) != int:
+        msg = "keep must be int, not {0}.".format(type(keep))
+        raise ValueError(msg)
+    if fraction is not None and type(fraction) not in (int, float):
+        msg = "fraction must be float, not {0}.".format(type(fraction))
+        raise ValueError(msg)
+    if seed is not None and type(seed) != int:
+        msg = "seed must be int, not {0}.".format(type(seed))
+        raise ValueError(msg)
+    if type(dry_run) != bool:
+        msg = "dry_run must be bool, not {0}.".format(type(dry_run))
+        raise ValueError(msg)
+    if type(workers) != int:
+        msg = "workers must be int, not {0}.".format(type(workers))
+        raise ValueError(msg)
+    if type(trash) != bool:
+        msg = "trash must be bool, not {0}.".format(type(trash))
+        raise ValueError(msg)
+    assert workers > 0, "workers must be a positive number."
+    assert_message = "pass exactly one of number, keep and fraction."
+    assert [number, keep, fraction].count(None) == 2, assert_message
+    assert_message = "fraction must be between 0 and 1."
+    assert fraction is None or 0 <= fraction <= 1, assert_message
+    assert_message = "fraction can't be used with resume."
+    assert fraction is None or not resume, assert_message
+
+    # The files deleted by the previous run are already gone.
+    plan = Plan() if dry_run else None
+    journal = _open_journal(root, resume, plan)
+
+    # Counting the files without keeping them in memory.
+    total = None
+    if fraction is None:
+        total = sum(1 for _ in _iter_entries(root))
+        if keep is not None:
+            assert_message = "Number of files to keep can't be negative."
+            assert keep >= 0, assert_message
+            number = max(total - keep, 0)
+        else:
+            number -= len(journal)
+
+    # Checking the validity of the number-argument.
+    if total is not None:
+        assert_message = "Number of files to delete can't be greater than "
+        assert_message += "number of files in the source folder."
+        assert number <= total, assert_message
+
+    # Deleting.
+    records = _sample(_iter_entries(root), total, number, fraction, seed)
+    try:
+        bar = _Progress('delete', number)
+        folder = _trash_folder(root) if trash and plan is None else None
+        with _Deleter(root, workers, journal, folder) as deleter:
+            for record in records:
+                if plan is not None:
+                    plan.add('trash' if trash else 'delete', record.path)
+                    journal.add(record.path)
+                # Deleting folders and files.
+                else:
+                    deleter.add(record.path, record.is_dir)
+                bar.update()
+        bar.close()
+    except BaseException:
+        journal.close()
+        raise
+    journal.close(remove=True)
+    return plan
+
+
+def _restore(source, destination):
+    """
+    Moves the contents of the source folder into the destination folder,
+    whole folders at once where possible. Returns the number of entries
+    left in source because their paths are taken.
+    """
+
+    left = 0
+    with os.scandir(source) as entries:
+        entries = list(entries)
+    for entry in entries:
+        target = os.path.join(destination, entry.name)
+        if not os.path.lexists(target):
+            os.rename(entry.path, target)
+        elif entry.is_dir(follow_symlinks=False) and os.path.isdir(target):
+            left += _restore(entry.path, target)
+        else:
+            _emit('error', 'restore', entry.path,
+                  message="{0} already exists".format(target))
+            left += 1
+    if not left:
+        os.rmdir(source)
+    return left
+
+
+def restore_trash(root, run=None):
+    """
+    Moves the files from the trash (see cleaner and cutter with trash=True)
+    back to their places in the dataset.
+
+    Args:
+
+        root (str): The folder with the dataset.
+
+        run (str): Optional, defaults to None. The name of the folder of
+        one run in the trash (they are named after the time of the run,
+        like 20240101-120000-1a2b3c4d); by default the files of all the
+        runs are restored, the newest ones first.
+
+    Files whose paths have been taken since they were moved to the trash are
+    left there (and reported as errors). Returns the number of them.
+    """
+
+    if type(root) != str:
+        msg = "root must be str, not {0}.".format(type(root))
+        raise ValueError(msg)
+    if run is not None and type(run) != str:
+        msg = "run must be str, not {0}.".format(type(run))
+        raise ValueError(msg)
+
+    trash = os.path.join(root, TRASH_NAME)
+    if not os.path.isdir(trash):
+        return 0
+    runs = [run] if run is not None else sorted(os.listdir(trash),
+                                                reverse=True)
+    left = 0
+    for name in runs:
+        left += _restore(os.path.join(trash, name), root)
+    if not os.listdir(trash):
+        os.rmdir(trash)
+    return left
+
+
+def purge_trash(root, older_than=None, workers=1, dry_run=False):
+    """
+    Deletes the files in the trash (see cleaner and cutter with trash=True)
+    for good.
+
+    Args:
+
+        root (str): The folder with the dataset.
+
+        older_than (float): Optional, defaults to None. If given, only
+        the runs finished more than this many seconds ago are purged.
+
+        workers (int): Optional, defaults to 1. The number of threads
+        deleting the files, in batches.
+
+        dry_run (bool): Optional, defaults to False. If True, nothing is
+        deleted, the function returns a Plan of the files it would delete
+        instead.
+    """
+
+    if type(root) != str:
+        msg = "root must be str, not {0}.".format(type(root))
+        raise ValueError(msg)
+    if older_than is not None and type(older_than) not in (int, float):
+        msg = "older_than must be float, "
+        msg += "not {0}.".format(type(older_than))
+        raise ValueError(msg)
+    if type(workers) != int:
+        msg = "workers must be int, not {0}.".format(type(workers))
+        raise ValueError(msg)
+    if type(dry_run) != bool:
+        msg = "dry_run must be bool, not {0}.".format(type(dry_run))
+        raise ValueError(msg)
+    assert workers > 0, "workers must be a positive number."
+
+    plan = Plan() if dry_run else None
+    trash = os.path.join(root, TRASH_NAME)
+    if not os.path.isdir(trash):
+        return plan
+    for name in sorted(os.listdir(trash)):
+        folder = os.path.join(trash, name)
+        if (older_than is not None and
+                time.time() - os.stat(folder).st_mtime < older_than):
+            continue
+        if plan is not None:
+            for record in scan(folder):
+                plan.add('delete', record.path)
+            continue
+        with _Deleter(folder, workers) as deleter:
+            for record in scan(folder):
+                deleter.add(record.path)
+        # Only the empty folders are left.
+        shutil.rmtree(folder)
+    if plan is None and not os.listdir(trash):
+        os.rmdir(trash)
+    return plan
+
+
+def sampler(current_root, new_root, number=None, fraction=None, seed=None,
+            workers=1, mode='copy', resume=False, dry_run=False):
+    """
+    Copies a random sample of the files in the dataset to a new folder.
+
+    Args:
+
+        current_root (str): Source folder with the dataset.
+
+        new_root (str): The target folder where the sample will appear.
+
+        number (int): Optional, defaults to None. Number of files in
+        the sample.
+
+        fraction (float): Optional, defaults to None. Instead of number,
+        the share of the files in the sample: every file is taken with this
+        probability, so the sample contains only about fraction of all
+        the files.
+
+        seed (int): Optional, defaults to None. random-seed for sampling.
+        Pass it with resume, so that the interrupted run and the resumed one
+        take the same sample.
+
+        workers (int): Optional, defaults to 1. The number of files copied
+        at the same time.
+
+        mode (str): Optional, defaults to 'copy'. How the files get into
+        the new folder: 'copy' - regular copies; 'hardlink' - hard links to
+        the original files, taking no extra space; 'symlink' - symbolic links
+        to the original files; 'reflink' - copy-on-write clones on the file
+        systems supporting them (Btrfs, XFS...); 'move' - the files are moved.
+        'hardlink' and 'reflink' fall back to copying when it's impossible,
+        for example when new_root is on another file system.
+
+        resume (bool): Optional, defaults to False. While running, the
+        function keeps a journal of the processed files (JOURNAL_NAME in
+        new_root), which is deleted when it finishes. Pass True to continue
+        a run that was interrupted, skipping the files it has already
+        processed.
+
+        dry_run (bool): Optional, defaults to False. If True, nothing is
+        copied, the function returns a Plan of what it would do instead.
+
+    Like cutter, the function reads the folder as a stream, so the memory
+    taken doesn't depend on the number of files in it. Only the files in
+    current_root itself (not in its subfolders) are sampled.
+
+    The function does not perform any conversions to the original folder,
+    files are not deleted after copying to a new folder (unless mode='move').
+    """
+
+    # Checking types of the arguments.
+    if type(current_root) != str:
+        msg = "current_root must be str, not {0}.".format(type(current_root))
+        raise ValueError(msg)
+    if type(new_root) != str:
+        msg = "new_root must be str, not {0}.".format(type(new_root))
+        raise ValueError(msg)
+    if number is not None and type(number) != int:
+        msg = "number must be int, not {0}.".format(type(number))
+        raise ValueError(msg)
+    if fraction is not None and type(fraction) not in (int, float):
+        msg = "fraction must be float, not {0}.".format(type(fraction))
+        raise ValueError(msg)
+    if seed is not None and type(seed) != int:
+        msg = "seed must be int, not {0}.".format(type(seed))
+        raise ValueError(msg)
+    if type(workers) != int:
+        msg = "workers must be int, not {0}.".format(type(workers))
+        raise ValueError(msg)
+    if type(resume) != bool:
+        msg = "resume must be bool, not {0}.".format(type(resume))
+        raise ValueError(msg)
+    if type(dry_run) != bool:
+        msg = "dry_run must be bool, not {0}.".format(type(dry_run))
+        raise ValueError(msg)
+    assert_message = "pass exactly one of number and fraction."
+    assert (number is None) != (fraction is None), assert_message
+    assert_message = "fraction must be between 0 and 1."
+    assert fraction is None or 0 <= fraction <= 1, assert_message
+    assert workers > 0, "workers must be a positive number."
+    assert mode in MODES, "mode must be one of {0}.".format(MODES)
+
+    # Creating new folder if it doesn't exist.
+    plan = Plan(new_root) if dry_run else None
+    if plan is None and not os.path.exists(new_root):
+        os.mkdir(new_root)
+
+    def files():
+        return (record for record in _iter_entries(current_root)
+                if record.is_file)
+
+    # Counting the files without keeping them in memory.
+    total = None
+    if fraction is None:
+        total = sum(1 for _ in files())
+        assert_message = "Number of files in the sample can't be greater "
+        assert_message += "than number of files in the source folder."
+        assert 0 <= number <= total, assert_message
+
+    # A random sample even without seed.
+    if seed is None:
+        seed = random.randrange(1 << 64)
+
+    # Copying.
+    journal = _open_journal(new_root, resume, plan)
+    with _Output(mode, journal=journal, plan=plan) as output:
+        def copy(record):
+            output.put(record.path, new_root)
+
+        tasks = output.pending(_sample(files(), total, number, fraction,
+                                       seed))
+        for _ in _parallel_map(copy, tasks, workers, total=number,
+                               stage='copy'):
+            pass
+    return plan
+
+
+def _digest_task(task):
+    """Hashes the file for dedupe, task is a (path, partial) pair."""
+
+    path, partial = task
+    start = _observed()
+    digest = _file_digest(path, partial)
+    _done('hash', path, start)
+    return path, digest
+
+
+def _perceptual_hash(path):
+    """
+    Returns the path and the difference hash of the image (a 64-bit int
+    built from the brightness gradients of its 9x8 grayscale thumbnail) or
+    None if it isn't an image. JPEG images are decoded at a reduced size.
+    """
+
+    start = _observed()
+    try:
+        with Image.open(path) as image:
+            image.draft('L', ((_PHASH_SIZE + 1) * 4, _PHASH_SIZE * 4))
+            thumbnail = image.convert('L').resize(
+                (_PHASH_SIZE + 1, _PHASH_SIZE), Image.Resampling.BILINEAR)
+    except (PIL.UnidentifiedImageError, PermissionError, OSError):
+        return path, None
+    pixels = list(thumbnail.getdata())
+    value = 0
+    for row in range(_PHASH_SIZE):
+        for column in range(_PHASH_SIZE):
+            left = pixels[row * (_PHASH_SIZE + 1) + column]
+            value = (value << 1) | (left > pixels[row * (_PHASH_SIZE + 1) +
+                                                  column + 1])
+    _done('hash', path, start)
+    return path, value
+
+
+class _BKTree:
+    """BK-tree of perceptual hashes for the Hamming distance queries."""
+
+    def __init__(self):
+        self._root = None
+
+    def add(self, value, item):
+        node = self._root
+        if node is None:
+            self._root = [value, item, dict()]
+            return
+        while True:
+            distance = bin(value ^ node[0]).count('1')
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, item, dict()]
+                return
+            node = child
+
+    def find(self, value, threshold):
+        """Yields the items with hashes at most threshold bits away."""
+
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = bin(value ^ node[0]).count('1')
+            if distance <= threshold:
+                yield node[1]
+            for edge, child in node[2].items():
+                if distance - threshold <= edge <= distance + threshold:
+                    stack.append(child)
+
+
+def _exact_duplicates(records, workers):
+    """
+    Groups the files with equal contents: first by size, then by the hash
+    of their first and last blocks and only then by the hash of the whole
+    contents. Hard links to the same file are counted once.
+    """
+
+    sizes = dict()
+    inodes = set()
+    for record in records:
+        inode = (record.stat.st_dev, record.stat.st_ino)
+        if inode in inodes:
+            continue
+        inodes.add(inode)
+        sizes.setdefault(record.stat.st_size, list()).append(record.path)
+
+    # Hashing only the beginning and the end of the files of equal size.
+    groups = [(size, paths) for size, paths in sizes.items()
+              if len(paths) > 1]
+    for partial in (True, False):
+        # The partial hash of a small file is the full one.
+        hashed = [paths for size, paths in groups
+                  if partial or size > 2 * _PARTIAL_BLOCK]
+        tasks = ((path, partial) for paths in hashed for path in paths)
+        total = sum(len(paths) for paths in hashed)
+        digests = dict(_parallel_map(_digest_task, tasks, workers,
+                                     total=total, stage='hash'))
+        buckets = dict()
+        for number, (size, paths) in enumerate(groups):
+            for path in paths:
+                key = (number, digests.get(path))
+                buckets.setdefault(key, (size, list()))[1].append(path)
+        groups = [(size, paths) for size, paths in buckets.values()
+                  if len(paths) > 1]
+    return [paths for size, paths in groups]
+
+
+def _near_duplicates(records, workers, processes, threshold):
+    """
+    Groups the images whose perceptual hashes differ in at most threshold
+    bits. Images similar to similar ones end up in the same group.
+    """
+
+    paths = (record.path for record in records)
+    hashes = [(path, value) for path, value in
+              _parallel_map(_perceptual_hash, paths, workers, processes,
+                            stage='hash')
+              if value is not None]
+
+    # Union-find over the pairs of close hashes.
+    parents = list(range(len(hashes)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    tree = _BKTree()
+    for i, (path, value) in enumerate(hashes):
+        for j in tree.find(value, threshold):
+            parents[find(j)] = find(i)
+        tree.add(value, i)
+
+    groups = dict()
+    for i, (path, value) in enumerate(hashes):
+        groups.setdefault(find(i), list()).append(path)
+    return [paths for paths in groups.values() if len(paths) > 1]
+
+
+def dedupe(root, action='report', workers=1, processes=False,
+           perceptual=False, threshold=0, dry_run=False):
+    """
+    Finds duplicate files in the dataset.
+
+    Args:
+
+        root (str): Source folder with the dataset.
+
+        action (str): Optional, defaults to 'report'. What to do with
+        the duplicates: 'report' - nothing, just return them; 'remove' -
+        delete all the files of each group except the first one;
+        'hardlink' - replace them with hard links to the first one, which
+        frees the space but keeps all the paths (the duplicates on other
+        file systems are left as they are, with an 'error' event).
+
+        workers (int): Optional, defaults to 1. The number of files hashed
+        at the same time.
+
+        processes (bool): Optional, defaults to False. If True, perceptual
+        hashes are computed by a pool of processes instead of threads.
+
+        perceptual (bool): Optional, defaults to False. If True, images are
+        compared by their perceptual hashes built from small grayscale
+        thumbnails, so resized or recompressed copies of an image are found
+        too. Other files are ignored in this case.
+
+        threshold (int): Optional, defaults to 0. With perceptual=True,
+        the maximum number of bits (out of 64) in which the hashes of
+        duplicate images may differ.
+
+        dry_run (bool): Optional, defaults to False. If True, the duplicates
+        are not removed or linked, the function returns a Plan of what it
+        would do with them instead of the groups.
+
+    Returns a list of the groups of duplicates, every group is a sorted list
+    of paths; the first file of a group is the one that is kept.
+
+    Exact duplicates are found cheaply: only the files of equal size are
+    compared, first by the hash of their first and last blocks and then by
+    the BLAKE2 hash of the whole contents.
+
+    With action='remove' this function irrevocably deletes files without
+    copying them anywhere in advance.
+    """
+
+    # Checking types of the arguments.
+    if type(root) != str:
+        msg = "root must be str, not {0}.".format(type(root))
+        raise ValueError(msg)
+    if type(action) != str:
+        msg = "action must be str, not {0}.".format(type(action))
+        raise ValueError(msg)
+    if type(workers) != int:
+        msg = "workers must be int, not {0}.".format(type(workers))
+        raise ValueError(msg)
+    if type(threshold) != int:
+        msg = "threshold must be int, not {0}.".format(type(threshold))
+        raise ValueError(msg)
+    if type(dry_run) != bool:
+        msg = "dry_run must be bool, not {0}.".format(type(dry_run))
+        raise ValueError(msg)
+    assert workers > 0, "workers must be a positive number."
+    assert_message = "invalid action value. Choose one of "
+    assert_message += "'report'(default), 'remove', 'hardlink'."
+    assert action in ('report', 'remove', 'hardlink'), assert_message
+    assert_message = "near-duplicate images can't be hard linked."
+    assert not (perceptual and action == 'hardlink'), assert_message
+    assert 0 <= threshold <= 64, "threshold must be between 0 and 64."
+
+    # Finding.
+    if perceptual:
+        groups = _near_duplicates(scan(root), workers, processes, threshold)
+    else:
+        groups = _exact_duplicates(scan(root, stat=True), workers)
+    groups = sorted(sorted(paths) for paths in groups)
+
+    # Removing or linking.
+    plan = Plan() if dry_run else None
+    for paths in groups:
+        original = paths[0]
+        for path in paths[1:]:
+            if plan is not None:
+                if action == 'remove':
+                    plan.add('delete', path)
+                elif action == 'hardlink':
+                    plan.add('hardlink', original, path)
+            elif action == 'remove':
+                _delete(path)
+            elif action == 'hardlink':
+                # Replacing the file atomically.
+                temporary = _temporary(path)
+                try:
+                    os.link(original, temporary)
+                except OSError as error:
+                    # Files on different file systems can't be linked.
+                    if error.errno != errno.EXDEV:
+                        raise
+                    _emit('error', 'dedupe', path,
+                          message="not linked to {0}: {1}".format(
+                              original, error.strerror))
+                    continue
+                os.replace(temporary, path)
+
+    if plan is not None:
+        return plan
+    return groups
+
+
+def _inspect(root, workers, processes, verify):
+    """Yields the ImageInfo of every image of root for inspect_images."""
+
+    tasks = ((record, verify) for record in _records(root))
+    chunksize = _PROCESS_CHUNK if processes else 1
+    for info in _parallel_map(_info_task, tasks, workers, processes,
+                              chunksize=chunksize, stage='inspect'):
+        if info is not None:
+            yield info
+
+
+def inspect_images(root, workers=1, processes=False, verify=False):
+    """
+    Reads the properties of all the images in the dataset in a single pass,
+    yielding an ImageInfo (path, format, mode, width, height, orientation,
+    corrupt) for every image. Files that are not images are skipped.
+
+    Args:
+
+        root (str): Source folder with the dataset with images.
+        It can also be a tar (possibly compressed) or zip archive; its files
+        are read as a stream without extracting them to the disk.
+
+        workers (int): Optional, defaults to 1. The number of images
+        processed at the same time.
+
+        processes (bool): Optional, defaults to False. If True, images are
+        opened by a pool of processes instead of threads; they are sent to
+        the processes in batches.
+
+        verify (bool): Optional, defaults to False. If True, every image is
+        read in full to check that it isn't corrupt. Otherwise only
+        the images with broken headers are reported as corrupt.
+
+    Only the headers of the images are read and the pixels are never
+    decoded, so several filters (by color mode, size, orientation...) can be
+    applied to the results of one run instead of opening every image for
+    each of them. The images are yielded in the order of scan. The arguments
+    are checked right away, before the iteration starts.
+    """
+
+    # Checking types of the arguments.
+    if type(root) != str:
+        msg = "root must be str, not {0}.".format(type(root))
+        raise ValueError(msg)
+    if type(workers) != int:
+        msg = "workers must be int, not {0}.".format(type(workers))
+        raise ValueError(msg)
+    if type(verify) != bool:
+        msg = "verify must be bool, not {0}.".format(type(verify))
+        raise ValueError(msg)
+    assert workers > 0, "workers must be a positive number."
+
+    return _inspect(root, workers, processes, verify)
+
+
+def _npy(column):
+    """
+    Returns the column (an array or bytes, saved as uint8) in the .npy
+    format, readable by numpy.load.
+    """
+
+    if isinstance(column, bytes):
+        descr, count, data = '|u1', len(column), column
+    else:
+        kind = next(kind for kind, typecodes in _NPY_TYPECODES.items()
+                    if column.typecode in typecodes)
+        order = '<' if sys.byteorder == 'little' else '>'
+        descr = '{0}{1}{2}'.format(order, kind, column.itemsize)
+        count, data = len(column), column.tobytes()
+    header = "{{'descr': '{0}', 'fortran_order': False, 'shape': ({1},), }}"
+    header = header.format(descr, count)
+    # The data starts at a multiple of 64 bytes, the header ends with '\n'.
+    header += ' ' * (-(len(header) + 11) % 64) + '\n'
+    return (b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') +
+            header.encode('latin1') + data)
+
+
+def _load_npy(data):
+    """Reads a one-dimensional column written by _npy (or numpy.save)."""
+
+    if data[:6] != b'\x93NUMPY':
+        raise ValueError("not a .npy file.")
+    size = 2 if data[6] == 1 else 4
+    length = int.from_bytes(data[8:8 + size], 'little')
+    start = 8 + size + length
+    header = ast.literal_eval(data[8 + size:start].decode('latin1'))
+    descr = header['descr']
+    if descr == '|u1':
+        return bytes(data[start:])
+    order, kind, itemsize = descr[0], descr[1], int(descr[2:])
+    typecode = next(typecode for typecode in _NPY_TYPECODES[kind]
+                    if array(typecode).itemsize == itemsize)
+    column = array(typecode)
+    column.frombytes(data[start:])
+    if order != '|' and (order == '<') != (sys.byteorder == 'little'):
+        column.byteswap()
+    return column
+
+
+def _pack_strings(strings):
     """
-    Extracts all files of the desired type from a hierarchy of folders of
-    indeterminate size.
+    Returns the offsets (an array of len(strings) + 1 positions) and
+    the UTF-8 data of the strings, laid out like an Arrow string column.
+    """
+
+    offsets = array('q', [0])
+    data = bytearray()
+    for string in strings:
+        data += string.encode('utf-8', 'surrogateescape')
+        offsets.append(len(data))
+    return offsets, bytes(data)
+
+
+def _unpack_strings(offsets, data):
+    """Returns the strings packed by _pack_strings."""
+
+    return [data[offsets[i]:offsets[i + 1]].decode('utf-8', 'surrogateescape')
+            for i in range(len(offsets) - 1)]
+
+
+def _inventory_task(task):
+    """
+    Detects the properties of a file for inventory in a worker, task is
+    a (record, known) pair, known holds the values found in the cache.
+    Only the files that may be images are opened with PIL.
+    """
+
+    record, known = task
+    values = dict(known)
+    if 'mime' not in values:
+        values['mime'] = _detect_record('mime', record)
+    mime = values['mime']
+    if 'image' not in values and (mime is None or
+                                  mime.startswith('image/')):
+        values['image'] = _detect_record('image', record)
+    return values
+
+
+# A file of an Inventory. mime and mode are None if they are unknown,
+# width and height are None if the file isn't an image, mtime is 0 for
+# the files of archives.
+InventoryRow = namedtuple('InventoryRow', ['path', 'size', 'mtime', 'mime',
+                                           'mode', 'width', 'height'])
+
+
+class Inventory:
+    """
+    Columnar table of the files of a dataset made by inventory in a single
+    pass: their paths, sizes, modification times, MIME types, color modes
+    and dimensions. Use select to find files by these properties instead
+    of reading the files again, for example the RGBA PNG images over 2 MB:
+
+        inventory('dataset').select('image/png', 'RGBA', min_size=2 << 20)
+
+    Every column is an array (the MIME types and the color modes are stored
+    as indexes into mimes and modes, -1 when unknown), so even an inventory
+    of millions of files takes little memory. Saved inventories are .npz
+    files that numpy.load can read as well: the paths are stored as UTF-8
+    data with offsets, like Arrow string columns.
+
+    Attributes:
+
+        root (str): The folder (or the archive) of the dataset.
+
+        size, mtime, mime, mode, width, height (array): The columns,
+        width and height are -1 for the files that are not images.
+
+        mimes, modes (list of str): The distinct MIME types and color modes.
+
+    Supports len, indexing (returning an InventoryRow) and iteration.
+    """
+
+    # Names and typecodes of the numerical columns.
+    _COLUMNS = (('size', 'q'), ('mtime', 'd'), ('mime', 'h'), ('mode', 'h'),
+                ('width', 'i'), ('height', 'i'))
+
+    def __init__(self, root):
+        self.root = root
+        for name, typecode in self._COLUMNS:
+            setattr(self, name, array(typecode))
+        self.mimes = list()
+        self.modes = list()
+        self._paths = list()
+        self._codes = ({}, {})
+        self._index = None
+
+    def _code(self, values, codes, value):
+        """Returns the index of the interned value (-1 for None)."""
+
+        if value is None:
+            return -1
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def _add(self, record, values):
+        """Adds the file with the values detected by _inventory_task."""
+
+        if isinstance(record, _Member):
+            size, mtime = len(record.data), 0.0
+        else:
+            size, mtime = record.stat.st_size, record.stat.st_mtime
+        image = values.get('image') or (None, -1, -1)
+        self._paths.append(record.path)
+        self.size.append(size)
+        self.mtime.append(mtime)
+        self.mime.append(self._code(self.mimes, self._codes[0],
+                                    values['mime']))
+        self.mode.append(self._code(self.modes, self._codes[1], image[0]))
+        self.width.append(image[1])
+        self.height.append(image[2])
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __getitem__(self, item):
+        if item < 0:
+            item += len(self)
+        mime, mode = self.mime[item], self.mode[item]
+        width, height = self.width[item], self.height[item]
+        return InventoryRow(self._paths[item], self.size[item],
+                            self.mtime[item],
+                            self.mimes[mime] if mime >= 0 else None,
+                            self.modes[mode] if mode >= 0 else None,
+                            width if width >= 0 else None,
+                            height if height >= 0 else None)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def find(self, path):
+        """Returns the index of the file or None if it isn't there."""
+
+        if self._index is None:
+            self._index = {path: i for i, path in enumerate(self._paths)}
+        return self._index.get(path)
+
+    def _values(self, record):
+        """
+        Returns the detected values of the record (see _inventory_task) if
+        the file is in the inventory and hasn't changed since then,
+        otherwise an empty dict.
+        """
+
+        i = self.find(record.path)
+        if i is None:
+            return {}
+        if isinstance(record, _Member):
+            if len(record.data) != self.size[i]:
+                return {}
+        elif record.stat is None or (
+                (record.stat.st_size, record.stat.st_mtime) !=
+                (self.size[i], self.mtime[i])):
+            return {}
+        row = self[i]
+        image = None
+        if row.mode is not None:
+            image = (row.mode, row.width, row.height)
+        return {'mime': row.mime, 'image': image}
+
+    def select(self, mime=None, mode=None, min_size=None, max_size=None,
+               min_width=None, max_width=None, min_height=None,
+               max_height=None):
+        """
+        Returns the paths of the files matching all the given conditions in
+        the order of scan.
+
+        Args:
+
+            mime (str or tuple or list): Optional, defaults to None.
+            The MIME type of the files or several types.
+
+            mode (str or tuple or list): Optional, defaults to None.
+            The color mode of the images or several modes.
+
+            min_size, max_size (int): Optional, default to None. The bounds
+            of the size of the files in bytes, inclusive.
+
+            min_width, max_width, min_height, max_height (int): Optional,
+            default to None. The bounds of the dimensions of the images,
+            inclusive.
+
+        The paths can be written to a manifest with write_manifest. To
+        split or filter the dataset by the same conditions, pass
+        the inventory to Pipeline.
+        """
+
+        # Checking types of the arguments.
+        for name, value in (('mime', mime), ('mode', mode)):
+            if value is not None and type(value) not in (str, tuple, list):
+                msg = "{0} must be str, ".format(name)
+                msg += "list or tuple, not {0}.".format(type(value))
+                raise ValueError(msg)
+
+        # Every condition is checked over a single column.
+        selected = range(len(self))
+        for column, values, codes in ((self.mime, mime, self._codes[0]),
+                                      (self.mode, mode, self._codes[1])):
+            if values is None:
+                continue
+            if type(values) == str:
+                values = (values,)
+            wanted = {codes[value] for value in values if value in codes}
+            selected = [i for i in selected if column[i] in wanted]
+        for column, low, high in ((self.size, min_size, max_size),
+                                  (self.width, min_width, max_width),
+                                  (self.height, min_height, max_height)):
+            if low is not None:
+                selected = [i for i in selected if column[i] >= low]
+            if high is not None:
+                selected = [i for i in selected
+                            if 0 <= column[i] <= high]
+        return [self._paths[i] for i in selected]
+
+    def save(self, path):
+        """
+        Saves the inventory to the .npz file (written atomically), see
+        load_inventory.
+        """
+
+        columns = dict()
+        columns['root'] = self.root.encode('utf-8', 'surrogateescape')
+        for name, strings in (('path', self._paths), ('mimes', self.mimes),
+                              ('modes', self.modes)):
+            offsets, data = _pack_strings(strings)
+            columns[name + '_offsets'], columns[name + '_data'] = (offsets,
+                                                                   data)
+        for name, _ in self._COLUMNS:
+            columns[name] = getattr(self, name)
+        temporary = _temporary(path)
+        with zipfile.ZipFile(temporary, 'w') as archive:
+            for name, column in columns.items():
+                archive.writestr(name + '.npy', _npy(column))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        """Reads an inventory saved by save."""
+
+        with zipfile.ZipFile(path) as archive:
+            columns = {name[:-4]: _load_npy(archive.read(name))
+                       for name in archive.namelist()}
+        inventory = cls(columns['root'].decode('utf-8', 'surrogateescape'))
+        inventory._paths = _unpack_strings(columns['path_offsets'],
+                                           columns['path_data'])
+        inventory.mimes = _unpack_strings(columns['mimes_offsets'],
+                                          columns['mimes_data'])
+        inventory.modes = _unpack_strings(columns['modes_offsets'],
+                                          columns['modes_data'])
+        inventory._codes = ({mime: i for i, mime in
+                             enumerate(inventory.mimes)},
+                            {mode: i for i, mode in
+                             enumerate(inventory.modes)})
+        for name, typecode in cls._COLUMNS:
+            column = columns[name]
+            if column.typecode != typecode:
+                column = array(typecode, column)
+            setattr(inventory, name, column)
+        return inventory
+
+
+def load_inventory(path):
+    """
+    Opens an inventory saved by inventory (or Inventory.save).
 
     Args:
 
-        current_root (str): The source folder from which files are extracted,
-        at the top of the hierarchy.
+        path (str): The .npz file.
 
-        new_root (str): The folder to which the extracted files will be copied.
+    Returns an Inventory.
+    """
 
-        target_type (str or tuple or list):
-        Optional, defaults to None. The type of the target files.
-        (Example: jpg, pdf, png; without a dot at the beginning);
-        if you want to extract files of the diffrent type at the same way,
-        pass their types as a tuple or a list;
-        if you don't select the type, all files will be extracted.
-        To determine the file type, I used the filetype
-        package, in particular the 'guess' function with 'mime'.
-        To select the file type you need, see how the above function denotes
-        types and pass them to the already given function as an argument.
+    return Inventory.load(path)
+
+
+def inventory(root, path=None, workers=1, processes=False, cache=False):
+    """
+    Makes an Inventory of the dataset: scans it once and detects the MIME
+    type of every file (like sorter) and the color mode and the dimensions
+    of every image (like color_type_detector), reading only their headers.
+
+    Args:
+
+        root (str): Source folder with the dataset.
+        It can also be a tar (possibly compressed) or zip archive; its files
+        are read as a stream without extracting them to the disk.
+
+        path (str): Optional, defaults to None. If given, the inventory is
+        also saved to this .npz file.
+
+        workers (int): Optional, defaults to 1. The number of files processed
+        at the same time.
+
+        processes (bool): Optional, defaults to False. If True, files are
+        detected by a pool of processes instead of threads.
+
+        cache (bool or DetectionCache): Optional, defaults to False.
+        If True, the detected properties are saved in the CACHE_NAME file in
+        root and reused by the next runs for the files that have not
+        changed since then. You can also pass your own DetectionCache.
+
+    Returns the Inventory. Pass it (or the saved file) to Pipeline to filter
+    the files without detecting their types again.
+    """
+
+    # Checking types of the arguments.
+    if type(root) != str:
+        msg = "root must be str, not {0}.".format(type(root))
+        raise ValueError(msg)
+    if path is not None and type(path) != str:
+        msg = "path must be str, not {0}.".format(type(path))
+        raise ValueError(msg)
+    if type(workers) != int:
+        msg = "workers must be int, not {0}.".format(type(workers))
+        raise ValueError(msg)
+    assert workers > 0, "workers must be a positive number."
+
+    table = Inventory(root)
+    cache, close_cache = _open_cache(cache, root)
+    sent = deque()
+
+    # The cache is only used by this thread, the workers detect the rest.
+    def tasks():
+        for record in _records(root, stat=True):
+            known = dict()
+            if cache is not None and isinstance(record, FileRecord):
+                for kind in ('mime', 'image'):
+                    found, value = cache.get(record.path, kind, record.stat)
+                    if found:
+                        known[kind] = value
+            sent.append((record, known))
+            yield record, known
+
+    try:
+        chunksize = _PROCESS_CHUNK if processes else 1
+        for values in _parallel_map(_inventory_task, tasks(), workers,
+                                    processes, chunksize=chunksize,
+                                    stage='inventory'):
+            record, known = sent.popleft()
+            if cache is not None and isinstance(record, FileRecord):
+                for kind, value in values.items():
+                    if kind not in known:
+                        cache.set(record.path, kind, value, record.stat)
+            table._add(record, values)
+    finally:
+        if close_cache:
+            cache.close()
+    if path is not None:
+        table.save(path)
+    return table
+
+
+def color_type_detector(current_root, new_root, color_type, workers=1,
+                        processes=False, cache=False, mode='copy',
+                        shard_size=None, resume=False, incremental=False,
+                        checksum=False, dry_run=False, conflict='overwrite',
+                        inventory=None):
+    """
+    Detects images of a specific color model and copies them to a new folder.
+
+    Args:
+
+        current_root (str): Source folder with the dataset with images.
+        It can also be a tar (possibly compressed) or zip archive; its files
+        are read as a stream without extracting them to the disk.
+
+        new_root (str): The target folder where the detected images
+        will appear.
+
+        color_type (str or tuple or list):
+        The type of the target images;
+        if you want to detect and copy images of the diffrent type at the
+        same way, pass their types as a tuple or a list;
         List of possible types here:
-        "https://pypi.org/project/filetype/"
-        Or here:
-        "https://github.com/t0efL/Dataset-Fixer/blob/master/file_types.txt"
+        "https://github.com/t0efL/Dataset-Fixer/blob/master/color_types.txt"
+
+        workers (int): Optional, defaults to 1. The number of images processed
+        at the same time.
+
+        processes (bool): Optional, defaults to False. If True, images are
+        opened by a pool of processes instead of threads; they are sent to
+        the processes in batches.
+
+        cache (bool or DetectionCache): Optional, defaults to False.
+        If True, the detected color modes are saved in the CACHE_NAME file in
+        current_root and reused by the next runs for the files that have not
+        changed since then. You can also pass your own DetectionCache.
+
+        mode (str): Optional, defaults to 'copy'. How the files get into
+        the new folder: 'copy' - regular copies; 'hardlink' - hard links to
+        the original files, taking no extra space; 'symlink' - symbolic links
+        to the original files; 'reflink' - copy-on-write clones on the file
+        systems supporting them (Btrfs, XFS...); 'move' - the files are moved.
+        'hardlink' and 'reflink' fall back to copying when it's impossible,
+        for example when new_root is on another file system.
+
+        shard_size (int): Optional, defaults to None. If given, the files are
+        written to new_root as tar shards (shard-000000.tar, shard-000001.tar
+        and so on) of at most about shard_size bytes instead of loose files.
+
+        resume (bool): Optional, defaults to False. While running, the
+        function keeps a journal of the processed files (JOURNAL_NAME in
+        new_root), which is deleted when it finishes. Pass True to continue
+        a run that was interrupted, skipping the files it has already
+        processed.
+
+        incremental (bool): Optional, defaults to False. If True, the state
+        of current_root is saved between runs (SNAPSHOT_NAME in new_root) and
+        only the files added or changed since the previous run are
+        processed; the copies of the files deleted or changed since then are
+        deleted from new_root. Can't be used with archives, shard_size or
+        mode='move'.
+
+        checksum (bool): Optional, defaults to False. With incremental=True,
+        files are compared by the hash of their contents instead of their
+        modification times and inodes.
+
+        dry_run (bool): Optional, defaults to False. If True, nothing is
+        copied, the function returns a Plan of what it would do instead.
+
+        conflict (str): Optional, defaults to 'overwrite'. What to do when
+        a file with the same name is already in the target folder (for
+        example, when files from different subfolders have the same name):
+        'overwrite' - replace it; 'skip' - skip the new file; 'suffix' -
+        name the new file name_1.ext, name_2.ext and so on; 'hash' - prefix
+        the name of every file with the hash of its relative path
+        (a1b2c3d4_name.ext), which also keeps the shards of a sharded run
+        apart; 'path' - keep the relative path of every file, subfolders
+        included. Files are written under temporary names and renamed when
+        they are complete, so the target folder never contains partly
+        written files.
+
+        inventory (Inventory or str): Optional, defaults to None.
+        An inventory of current_root (or the file it was saved to, see
+        inventory). The color models of the images are taken from it instead
+        of reading the files, except for the files added or changed since it
+        was made.
 
     The function does not perform any conversions to the original folder,
-    files are not deleted after copying to a new folder.
+    files are not deleted after copying to a new folder (unless mode='move').
     """
 
     # Checking types of the arguments.
@@ -47,555 +4938,987 @@ def folder_unpacker(current_root, new_root, target_type=None):
     if type(new_root) != str:
         msg = "new_root must be str, not {0}.".format(type(new_root))
         raise ValueError(msg)
-    if target_type and (type(target_type) not in (str, tuple, list)):
-        msg = "target_type must be str, "
-        msg += "list or tuple, not {0}.".format(type(target_type))
+    if type(color_type) not in (str, tuple, list):
+        msg = "color_type must be str, "
+        msg += "list or tuple, not {0}.".format(type(color_type))
+        raise ValueError(msg)
+    if type(workers) != int:
+        msg = "workers must be int, not {0}.".format(type(workers))
+        raise ValueError(msg)
+    if shard_size is not None and type(shard_size) != int:
+        msg = "shard_size must be int, not {0}.".format(type(shard_size))
+        raise ValueError(msg)
+    if type(resume) != bool:
+        msg = "resume must be bool, not {0}.".format(type(resume))
+        raise ValueError(msg)
+    if type(incremental) != bool:
+        msg = "incremental must be bool, not {0}.".format(type(incremental))
         raise ValueError(msg)
+    if type(checksum) != bool:
+        msg = "checksum must be bool, not {0}.".format(type(checksum))
+        raise ValueError(msg)
+    if type(dry_run) != bool:
+        msg = "dry_run must be bool, not {0}.".format(type(dry_run))
+        raise ValueError(msg)
+    if inventory is not None and type(inventory) not in (Inventory, str):
+        msg = "inventory must be Inventory or str, "
+        msg += "not {0}.".format(type(inventory))
+        raise ValueError(msg)
+    assert workers > 0, "workers must be a positive number."
+    assert mode in MODES, "mode must be one of {0}.".format(MODES)
+    assert_message = "conflict must be one of {0}.".format(CONFLICTS)
+    assert conflict in CONFLICTS, assert_message
+    assert_message = "shard_size must be a positive number."
+    assert shard_size is None or shard_size > 0, assert_message
+    if incremental:
+        assert_message = "incremental can't be used with archives, "
+        assert_message += "shard_size or mode='move'."
+        assert (os.path.isdir(current_root) and shard_size is None and
+                mode != 'move'), assert_message
 
-    # Creating new folder if it doesn't exist.
-    if not os.path.exists(new_root):
-        os.mkdir(new_root)
+    plan = Plan(new_root) if dry_run else None
 
-    # Extracting only certain types.
-    if target_type:
-
-        # Working with multiple file types.
-        if type(target_type) is not str:
-            def flag(x, y):
-                file_type = filetype.guess(x)
-                # Fighting with NoneType objects.
-                if file_type:
-                    file_type = file_type.mime
-                else:
-                    print("Something went frong with {0} file.".format(x))
-                # Flag.
-                for i in y:
-                    if file_type == i:
-                        return True
-                return False
-
-        # Working with a single file type.
-        else:
-            def flag(x, y):
-                file_type = filetype.guess(x)
-                # Fighting with NoneType objects.
-                if file_type:
-                    file_type = file_type.mime
-                else:
-                    print("Something went frong with {0} file.".format(x))
-                # Flag.
-                return file_type == y
+    # Working with multiple color types.
+    if type(color_type) is not str:
+        def flag(x, y):
+            for i in y:
+                if x == i:
+                    return True
+            return False
 
-    # Extracting all files that are not folders.
+    # Working with a single color type.
     else:
-        target_type = True
-
         def flag(x, y):
-            return bool(x or y)
+            return x == y
 
-    for root, dirs, files in os.walk(current_root):
-        for file in tqdm(files):
-            if flag(os.path.join(root, file), target_type):
-                # File copying.
-                shutil.copy(os.path.join(root, file), new_root)
-            else:
-                # Extracting files from detected folders.
-                if os.path.isdir(os.path.join(root, file)):
-                    folder_unpacker(os.path.join(root, file), new_root,
-                                    target_type)
+    def destination(path, image):
+        # image is a (mode, width, height) tuple or None.
+        if image and flag(image[0], color_type):
+            return new_root
+        return None
+
+    # Detecting and copying.
+    job = _copy_job(current_root, new_root, mode, shard_size, resume,
+                    incremental, checksum, cache, plan, conflict=conflict,
+                    inventory=inventory)
+    with job as (output, records, cache):
+        _detect_and_copy(records, 'image', destination, output, workers,
+                         processes, cache=cache)
+    return plan
+
+
+# File extensions of the image formats that don't match their names.
+_EXTENSIONS = {'JPEG': '.jpg', 'TIFF': '.tif', 'JPEG2000': '.jp2'}
 
 
-def sorter(current_root, new_root, target_type=None):
+def _converted_name(path, root, folder, image_format=None):
+    """
+    Returns the path of the image of root converted by converter: the same
+    relative path in the folder, with the extension of image_format if it's
+    given. root is None for archives, whose paths are relative already.
     """
-    Sorts files by their types.
 
-    This function extracts all files from the source folder and sorts them in
-    the target folder. The sorting process consists of creating several
-    new folders in the target folder with names of different file types
-    and then copying the corresponding files there.
+    relative = _relative_path(path, root, root is None)
+    name, extension = os.path.splitext(relative)
+    if image_format is not None:
+        extension = _EXTENSIONS.get(image_format,
+                                    '.' + image_format.lower())
+    return os.path.join(folder, name + extension)
+
+
+def _convert_image(path, source, root, folder, color_type, max_side,
+                   quality, image_format):
+    """
+    Converts the image of root for converter and saves it into the folder.
+    source is the path of the file or its contents. Returns a (destination,
+    error) pair: the path of the new file (None if the source isn't an
+    image or it couldn't be saved) and the message of the error saving it,
+    if any.
+    """
+
+    try:
+        if isinstance(source, str):
+            file = open(source, 'rb', buffering=_IMAGE_HEADER_SIZE)
+        else:
+            file = io.BytesIO(source)
+        with file, Image.open(file) as image:
+            new_format = image_format or image.format
+            # thumbnail makes JPEG decode the image at a reduced size (see
+            # Image.draft) and then shrinks it by whole factors with
+            # Image.reduce before resampling.
+            if max_side is not None:
+                image.thumbnail((max_side, max_side),
+                                Image.Resampling.LANCZOS,
+                                reducing_gap=3.0)
+            image.load()
+            image = ImageOps.exif_transpose(image)
+            if color_type is not None and image.mode != color_type:
+                image = image.convert(color_type)
+    except (PIL.UnidentifiedImageError, OSError):
+        return None, None
+
+    # Writing to a temporary file first, so that the new folder never
+    # contains partly written images.
+    destination = _converted_name(path, root, folder, image_format)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temporary = _temporary(destination)
+    params = dict()
+    if new_format in ('JPEG', 'WEBP'):
+        params['quality'] = quality
+    try:
+        image.save(temporary, new_format, **params)
+    except BaseException as error:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        # For example, RGBA images can't be saved as JPEG.
+        if isinstance(error, (OSError, ValueError, KeyError)):
+            return None, str(error)
+        raise
+    os.replace(temporary, destination)
+    return destination, None
 
-    The function ignores other folders with files inside the source folder.
-    If you also need to sort them, use the folder_unpacker function from
-    the same module to extract files from them in advance.
+
+def _convert_task(task):
+    """
+    Runs _convert_image in a worker, task is a tuple of the record
+    (a FileRecord or a _Member) and the rest of its arguments. Returns
+    the path of the record, the path of the new file and the error saving
+    it.
+    """
+
+    record = task[0]
+    if isinstance(record, _Member):
+        source = record.data
+    else:
+        source = record.path
+    return (record.path,) + _convert_image(record.path, source, *task[1:])
+
+
+def converter(current_root, new_root, color_type='RGB', max_side=None,
+              quality=90, image_format=None, workers=1, processes=False,
+              resume=False, dry_run=False):
+    """
+    Converts images to a single color model, size and format and saves them
+    to a new folder.
 
     Args:
 
-        current_root (str): Source folder with unsorted files.
+        current_root (str): Source folder with the dataset with images.
+        It can also be a tar (possibly compressed) or zip archive; its files
+        are read as a stream without extracting them to the disk.
 
-        new_root (str): The target folder where the sorted files will be
-        located.
+        new_root (str): The target folder where the converted images
+        will appear, under the same relative paths (subfolders included)
+        as in current_root.
 
-        target_type (str or tuple or list):
-        Optional, defaults to None. The type of the target files;
-        if you want to sort files of the diffrent type at the same way,
-        pass their types as a tuple or a list;
-        if you don't select the type, all files will be sorted.
-        To determine the file type, I used the filetype
-        package, in particular the 'guess' function with 'mime'.
-        To select the file type you need, see how the above function denotes
-        types and pass them to the already given function as an argument.
+        color_type (str): Optional, defaults to 'RGB'. The color model of
+        the converted images (for example, CMYK, P or LA images become RGB);
+        pass None to keep the color model of every image.
         List of possible types here:
-        "https://pypi.org/project/filetype/"
-        Or here:
-        "https://github.com/t0efL/Dataset-Fixer/blob/master/file_types.txt"
+        "https://github.com/t0efL/Dataset-Fixer/blob/master/color_types.txt"
+
+        max_side (int): Optional, defaults to None. If given, images whose
+        width or height is greater are scaled down (keeping the aspect
+        ratio) to fit into a square with this side.
+
+        quality (int): Optional, defaults to 90. The quality (1-95) of
+        the images saved as JPEG or WEBP.
+
+        image_format (str): Optional, defaults to None. The PIL format of
+        the converted images, for example 'JPEG' or 'PNG'; the extension of
+        the files is changed accordingly. If you don't select it, every
+        image keeps its format.
+
+        workers (int): Optional, defaults to 1. The number of images processed
+        at the same time.
+
+        processes (bool): Optional, defaults to False. If True, images are
+        converted by a pool of processes instead of threads, so that all
+        the cores are used; they are sent to the processes in batches.
+
+        resume (bool): Optional, defaults to False. While running, the
+        function keeps a journal of the processed files (JOURNAL_NAME in
+        new_root), which is deleted when it finishes. Pass True to continue
+        a run that was interrupted, skipping the files it has already
+        processed.
+
+        dry_run (bool): Optional, defaults to False. If True, nothing is
+        converted, the function returns a Plan of what it would do instead.
+        Only the headers of the images are read to make it.
+
+    The images are rotated according to their EXIF orientation. Files that
+    are not images (or can't be read) are skipped, and so are the images
+    that can't be saved in the format (for example, RGBA images as JPEG
+    with color_type=None), with an 'error' event. JPEG images are decoded
+    at a reduced size when they are scaled down, which is much faster than
+    decoding them in full.
+
+    Every image is written to a temporary file in new_root first and renamed
+    when it is complete, so an interrupted run never leaves broken images.
+
+    The function does not perform any conversions to the original folder.
+    """
+
+    # Checking types of the arguments.
+    if type(current_root) != str:
+        msg = "current_root must be str, not {0}.".format(type(current_root))
+        raise ValueError(msg)
+    if type(new_root) != str:
+        msg = "new_root must be str, not {0}.".format(type(new_root))
+        raise ValueError(msg)
+    if color_type is not None and type(color_type) != str:
+        msg = "color_type must be str, not {0}.".format(type(color_type))
+        raise ValueError(msg)
+    if max_side is not None and type(max_side) != int:
+        msg = "max_side must be int, not {0}.".format(type(max_side))
+        raise ValueError(msg)
+    if type(quality) != int:
+        msg = "quality must be int, not {0}.".format(type(quality))
+        raise ValueError(msg)
+    if image_format is not None and type(image_format) != str:
+        msg = "image_format must be str, "
+        msg += "not {0}.".format(type(image_format))
+        raise ValueError(msg)
+    if type(workers) != int:
+        msg = "workers must be int, not {0}.".format(type(workers))
+        raise ValueError(msg)
+    if type(resume) != bool:
+        msg = "resume must be bool, not {0}.".format(type(resume))
+        raise ValueError(msg)
+    if type(dry_run) != bool:
+        msg = "dry_run must be bool, not {0}.".format(type(dry_run))
+        raise ValueError(msg)
+    assert_message = "max_side must be a positive number."
+    assert max_side is None or max_side > 0, assert_message
+    assert 1 <= quality <= 95, "quality must be between 1 and 95."
+    assert workers > 0, "workers must be a positive number."
+    if image_format is not None:
+        image_format = image_format.upper()
+        Image.init()
+        assert_message = "unknown image_format: {0}.".format(image_format)
+        assert image_format in Image.SAVE, assert_message
+
+    # Creating new folder if it doesn't exist.
+    plan = Plan(new_root) if dry_run else None
+    if plan is None and not os.path.exists(new_root):
+        os.mkdir(new_root)
+
+    # Planning.
+    journal = _open_journal(new_root, resume, plan)
+    root = None if _is_archive(current_root) else current_root
+    if plan is not None:
+        def inspect(record):
+            if _detect_record('image', record) is not None:
+                plan.add('convert', _source(record),
+                         _converted_name(record.path, root, new_root,
+                                         image_format))
+
+        records = (record for record in _records(current_root)
+                   if record.path not in journal)
+        for _ in _parallel_map(inspect, records, workers, stage='inspect'):
+            pass
+        return plan
+
+    # Converting.
+    tasks = ((record, root, new_root, color_type, max_side, quality,
+              image_format)
+             for record in _records(current_root)
+             if record.path not in journal)
+    chunksize = _PROCESS_CHUNK if processes else 1
+    try:
+        for path, destination, error in _parallel_map(
+                _convert_task, tasks, workers, processes,
+                chunksize=chunksize, stage='convert'):
+            if error is not None:
+                _emit('error', 'convert', path, message=error)
+            elif destination is not None:
+                _emit('file', 'convert', path)
+            journal.add(path)
+    except BaseException:
+        journal.close()
+        raise
+    journal.close(remove=True)
+
+
+def _pipeline_task(task):
+    """
+    Applies the filters of a Pipeline to a record in a worker, task is
+    a (record, filters, dedupe, known) tuple, known holds the values taken
+    from the inventory. Returns a (passed, digest) pair, digest is the hash
+    of the contents of the file that passed if dedupe is True, otherwise
+    None.
+    """
+
+    record, filters, dedupe, known = task
+    for kind, values, keep in filters:
+        if kind in known:
+            value = known[kind]
+        else:
+            value = _detect_record(kind, record)
+        # Images are filtered by their color mode.
+        if kind == 'image' and value is not None:
+            value = value[0]
+        if (value in values) != keep:
+            return False, None
+    if not dedupe:
+        return True, None
+    if isinstance(record, _Member):
+        return True, hashlib.blake2b(record.data).digest()
+    return True, _file_digest(record.path)
+
+
+class Pipeline:
+    """
+    A chain of operations on a dataset that runs in a single pass.
+
+    Every method except write returns a new Pipeline with one more stage, and
+    nothing is read until write is called. Then the dataset is traversed
+    once, every file passes all the filters in the same worker, and only
+    the files that pass them are put into the new folder, without any
+    intermediate folders:
+
+        pipeline = (Pipeline('raw').filter_mime('image/jpeg')
+                    .filter_mode('RGB').dedupe().shuffle(seed=0)
+                    .split((0.8, 0.2), 'percentage'))
+        pipeline.write('dataset')
+
+    The stages mean the same as the corresponding functions of this module.
+
+    Args:
+
+        root (str): Source folder with the dataset. It can also be a tar
+        (possibly compressed) or zip archive; its files are read as a stream
+        without extracting them to the disk.
+
+        workers (int): Optional, defaults to 1. The number of files processed
+        at the same time.
+
+        processes (bool): Optional, defaults to False. If True, files are
+        filtered by a pool of processes instead of threads.
+
+        inventory (Inventory or str): Optional, defaults to None.
+        An inventory of root (or the file it was saved to, see inventory).
+        The filters use the types and the color modes from it instead of
+        reading the files, except for the files added or changed since it
+        was made.
+    """
+
+    def __init__(self, root, workers=1, processes=False, inventory=None):
+        # Checking types of the arguments.
+        if type(root) != str:
+            msg = "root must be str, not {0}.".format(type(root))
+            raise ValueError(msg)
+        if type(workers) != int:
+            msg = "workers must be int, not {0}.".format(type(workers))
+            raise ValueError(msg)
+        if inventory is not None and type(inventory) not in (Inventory,
+                                                             str):
+            msg = "inventory must be Inventory or str, "
+            msg += "not {0}.".format(type(inventory))
+            raise ValueError(msg)
+        assert workers > 0, "workers must be a positive number."
+
+        self.root = root
+        self.workers = workers
+        self.processes = processes
+        if type(inventory) == str:
+            inventory = load_inventory(inventory)
+        self.inventory = inventory
+        # (kind, values, keep) tuples: the files whose detected value is
+        # (keep=True) or isn't (keep=False) one of values pass.
+        self._filters = ()
+        self._dedupe = False
+        self._shuffle = False
+        self._seed = None
+        # (relation, relation_type, stratify) or None.
+        self._split = None
+
+    def _then(self, **stages):
+        """Returns a copy of the pipeline with the stages changed."""
+
+        pipeline = object.__new__(Pipeline)
+        pipeline.__dict__ = dict(self.__dict__, **stages)
+        return pipeline
 
+    def _filter(self, kind, values, keep, name):
+        if type(values) not in (str, tuple, list):
+            msg = "{0} must be str, ".format(name)
+            msg += "list or tuple, not {0}.".format(type(values))
+            raise ValueError(msg)
+        if type(values) == str:
+            values = (values,)
+        return self._then(_filters=self._filters + ((kind, tuple(values),
+                                                     keep),))
 
-    The function does not perform any conversions to the original folder,
-    files are not deleted after copying to a new folder.
-    """
+    def filter_mime(self, target_type):
+        """
+        Keeps only the files of the type (or one of the types if it's
+        a tuple or a list), like folder_unpacker.
+        """
 
-    # Checking types of the arguments.
-    if type(current_root) != str:
-        msg = "current_root must be str, not {0}.".format(type(current_root))
-        raise ValueError(msg)
-    if type(new_root) != str:
-        msg = "new_root must be str, not {0}.".format(type(new_root))
-        raise ValueError(msg)
-    if target_type and (type(target_type) not in (str, tuple, list)):
-        msg = "target_type must be str, "
-        msg += "list or tuple, not {0}.".format(type(target_type))
-        raise ValueError(msg)
+        return self._filter('mime', target_type, True, 'target_type')
 
-    # Creating new folder if it doesn't exist.
-    if not os.path.exists(new_root):
-        os.mkdir(new_root)
+    def exclude_mime(self, target_type):
+        """
+        Drops the files of the type (or one of the types if it's a tuple or
+        a list), like cleaner.
+        """
 
-    # Sorting only certain types.
-    if target_type:
+        return self._filter('mime', target_type, False, 'target_type')
 
-        # Working with multiple file types.
-        if type(target_type) is not str:
-            def flag(x, y):
-                return x in y
+    def filter_mode(self, color_type):
+        """
+        Keeps only the images of the color model (or one of the color models
+        if it's a tuple or a list), like color_type_detector.
+        """
 
-        # Working with a single file type.
-        else:
-            def flag(x, y):
-                return x == y
+        return self._filter('image', color_type, True, 'color_type')
 
-    # Sorting all files that are not folders.
-    else:
-        target_type = True
+    def dedupe(self):
+        """
+        Keeps only the first (in the order of scan) of the files with equal
+        contents. Every file that passes the filters is hashed.
+        """
 
-        def flag(x, y):
-            return bool(x or y)
-
-    for root, dirs, files in os.walk(current_root):
-        for file in tqdm(files):
-            # This flag checks that our file is not a folder,
-            # which would give an error.
-            if os.path.isfile(os.path.join(root, file)):
-                # Find out the file type.
-                file_type = filetype.guess(os.path.join(root, file)).mime
-                # This flag checks that the file_type variable is not
-                # 'NoneType', which helps avoid TypeError. It sometimes
-                # happens that filetype defines the type of a normal file
-                # (for example, a jpg image) as None.
-                if file_type and flag(file_type, target_type):
-                    # Create a folder with a name containing the type of
-                    # files inside it, if this folder has not been
-                    # created yet.
-                    # Next, I use a little formatting, replacing the
-                    # '\'characters with '_'characters to avoid a path error.
-                    if not os.path.exists(
-                            os.path.join(new_root,
-                                         file_type.replace('/', '_'))):
-                        os.mkdir(os.path.join(new_root,
-                                              file_type.replace('/', '_')))
-                    # Copying file.
-                    shutil.copy(os.path.join(root, file),
-                                os.path.join(new_root,
-                                             file_type.replace('/', '_')))
-
-
-def splitter_numerical(current_root, new_root, relation):
-    """Splitter function with relation_type='numerical'."""
+        return self._then(_dedupe=True)
 
-    # Checking the validity of the split.
-    files = os.listdir(path=current_root)
-    assert_message = "The number of files in the separated parts of the "
-    assert_message += "dataset does not match the original number of files:"
-    assert_message += " {0} != {1}.".format(sum(relation), len(files))
-    assert sum(relation) == len(files), assert_message
+    def shuffle(self, seed=None):
+        """Shuffles the files, like shuffler."""
 
-    # Checking for the absence of fractional values.
-    for number in relation:
-        assert_message = "the relation argument "
-        assert_message += "can only contain integer values."
-        assert type(number) == int, assert_message
+        if seed is not None and type(seed) != int:
+            msg = "seed must be int, not {0}.".format(type(seed))
+            raise ValueError(msg)
+        if seed is None:
+            seed = random.randrange(1 << 64)
+        return self._then(_shuffle=True, _seed=seed)
 
-    # Creating a new folder for each part of the dataset.
-    for i in range(len(relation)):
-        os.mkdir(os.path.join(new_root, (str(i+1) + "_part")))
+    def split(self, relation, relation_type='numerical', stratify=False):
+        """
+        Splits the files into parts, like splitter. With
+        relation_type='numerical' the numbers must add up to the number of
+        files that pass the filters.
+        """
 
-    # Splitting.
-    part_number = 0
-    iter_point = 0
-    for part in relation:
-        part_number += 1
-        for root, dirs, files in os.walk(current_root):
-            for file in tqdm(files[iter_point:(iter_point + part)]):
-                shutil.copy(os.path.join(current_root, file),
-                            os.path.join(new_root,
-                                         (str(part_number) + "_part")))
-        iter_point += part
+        if type(relation) not in (tuple, list):
+            msg = "relation must be "
+            msg += "list or tuple, not {0}.".format(type(relation))
+            raise ValueError(msg)
+        if type(stratify) != bool:
+            msg = "stratify must be bool, not {0}.".format(type(stratify))
+            raise ValueError(msg)
+        for number in relation:
+            assert_message = "the relation argument "
+            assert_message += "can only contain positive values."
+            assert number > 0, assert_message
+        assert_message = "invalid relation_type value. Choose one of "
+        assert_message += "'numerical'(default), 'mutual', 'percentage'."
+        assert relation_type in ('numerical', 'mutual', 'percentage'), \
+            assert_message
+        return self._then(_split=(tuple(relation), relation_type, stratify))
 
+    def _selected(self):
+        """
+        Yields the records that pass the filters and the deduplication in
+        the order of scan.
+        """
 
-def splitter_percentage(current_root, new_root, relation):
-    """Splitter function with relation_type='percentage'."""
+        sent = deque()
 
-    assert_message = "The sum of the parts as a percentage must be equal to 1:"
-    assert_message += " {0} != 1.".format(sum(relation))
-    assert sum(relation) == 1, assert_message
+        def tasks():
+            stat = self.inventory is not None
+            for record in _records(self.root, stat=stat):
+                sent.append(record)
+                known = {}
+                if stat and self._filters:
+                    known = self.inventory._values(record)
+                yield record, self._filters, self._dedupe, known
 
-    # Reducing the ratio to a numerical form
-    # and pass it to the corresponding function.
-    files = os.listdir(path=current_root)
-    numerical = list()
-    for item in relation:
-        item *= len(files)
-        item = int(item)
-        numerical.append(item)
+        digests = set()
+        for passed, digest in _parallel_map(_pipeline_task, tasks(),
+                                            self.workers, self.processes,
+                                            stage='filter'):
+            record = sent.popleft()
+            if not passed:
+                continue
+            if digest is not None:
+                if digest in digests:
+                    continue
+                digests.add(digest)
+            yield record
 
-    splitter_numerical(current_root, new_root, numerical)
+    def _parts(self, files, labels):
+        """Returns the numbers of files in the parts of the split."""
 
+        relation, relation_type, stratify = self._split
+        if relation_type == 'numerical':
+            assert_message = "The number of files in the separated parts "
+            assert_message += "of the dataset does not match the number of "
+            assert_message += "files: {0} != {1}.".format(
+                sum(relation), len(files))
+            assert sum(relation) == len(files), assert_message
+            return relation
+        if relation_type == 'percentage':
+            assert_message = "The sum of the parts as a percentage must be "
+            assert_message += "equal to 1: {0} != 1.".format(sum(relation))
+            assert abs(sum(relation) - 1) < 1e-9, assert_message
+        return _largest_remainder(relation, len(files))
 
-def splitter_mutual(current_root, new_root, relation):
-    """Splitter function with relation_type='mutual'."""
+    def write(self, new_root, mode='copy', shard_size=None, manifest=False,
+              resume=False, dry_run=False):
+        """
+        Runs the pipeline and puts the files into new_root (into its
+        N_part folders if the files are split).
 
-    # Reducing the ratio to a percentage form
-    # and pass it to the corresponding function.
-    percentage = list()
-    for item in relation:
-        item = item/sum(relation)
-        percentage.append(item)
+        Args:
 
-    splitter_percentage(current_root, new_root, percentage)
+            new_root (str): The target folder where the dataset will appear.
 
+            mode (str): Optional, defaults to 'copy'. How the files get into
+            the new folder, one of MODES (see folder_unpacker).
 
-def splitter(current_root, new_root, relation, relation_type='numerical'):
-    """
-    Splits the existing dataset into several parts in the ratio specified
-    by the user.
+            shard_size (int): Optional, defaults to None. If given, the files
+            are written as tar shards of at most about shard_size bytes
+            instead of loose files.
 
-    Args:
+            manifest (bool): Optional, defaults to False. If True, no files
+            are copied, the list of files is written to new_root as
+            a manifest instead: files.txt (shuffled.txt if the files are
+            shuffled) or 1_part.txt, 2_part.txt and so on if they are split.
 
-        current_root (str): Source folder with the dataset.
+            resume (bool): Optional, defaults to False. Pass True to continue
+            a run that was interrupted, skipping the files it has already
+            put into new_root. Shuffle with a seed to resume a shuffled or
+            split run.
 
-        new_root (str): The target folder where the split dataset will appear.
+            dry_run (bool): Optional, defaults to False. If True, nothing is
+            copied, a Plan of what the pipeline would do is returned instead.
 
-        relation (tuple or list): The ratio of parts that the
-        dataset is divided into. The split ratio can be passed in different ways
-        (in all cases, it is a tuple or list containing all the values inside):
-        1) Numerical (int) -  A list or tuple containing the number of files
-        in each part of the split dataset. For example, (1000, 2000, 3000) if
-        there are 6000 files in total in current_root.
-        If the sum of files in different parts of the dataset does not match the
-        number of files in the source folder, you will get an error.
-        2) Mutual relation (float) - A list or tuple containing the ratio of the
-        number of files in different parts of a divided dataset to each other.
-        For example, (1, 1.5, 2) means 1 : 1.5 : 2. In this case, if the source
-        dataset has 4500 files, they will be distributed as 1000, 1500, 2000
-        files respectively.
-        3) Percentage ratio (float) - A list or tuple containing the percentage
-        of the number of files in different parts of the split dataset.
-        Instead of percentages, parts of the whole are used here.
-        For example, (0.5, 0.25, 0.25) means 50%, 25%, 25%.
-        In this case, if the source dataset has 1000 files, they will be
-        distributed as 500, 250, 250 respectively. Make sure that the sum of all
-        the numbers in the list or tuple is equal to 1,
-        otherwise you will get an error.
-        To select one of these types, pass the corresponding value of the
-        relation_type argument to the function (read more about this below).
+        The files are put into new_root while the dataset is being traversed,
+        unless they are shuffled or split: then all the files that pass
+        the filters are listed first (only their paths are kept in memory).
+        """
 
-        relation_type (str): The type of ratio that the dataset
-        will be divided by. This parameter is directly related to the relation
-        parameter. Read the description of the latter to understand what this
-        parameter is for. Each type of relationship corresponds to the following
-        value of the relation_type parameter:
-        1) Numerical - relation_type='numerical'
-        2) Mutual relation - relation_type='mutual'
-        3) Percentage ratio - relation_type='percentage'
+        # Checking types of the arguments.
+        if type(new_root) != str:
+            msg = "new_root must be str, not {0}.".format(type(new_root))
+            raise ValueError(msg)
+        if shard_size is not None and type(shard_size) != int:
+            msg = "shard_size must be int, not {0}.".format(type(shard_size))
+            raise ValueError(msg)
+        if type(manifest) != bool:
+            msg = "manifest must be bool, not {0}.".format(type(manifest))
+            raise ValueError(msg)
+        if type(resume) != bool:
+            msg = "resume must be bool, not {0}.".format(type(resume))
+            raise ValueError(msg)
+        if type(dry_run) != bool:
+            msg = "dry_run must be bool, not {0}.".format(type(dry_run))
+            raise ValueError(msg)
+        assert mode in MODES, "mode must be one of {0}.".format(MODES)
+        assert_message = "shard_size must be a positive number."
+        assert shard_size is None or shard_size > 0, assert_message
 
-    The function does not perform any conversions to the original folder,
-    files are not deleted after copying to a new folder.
-    """
+        # Creating new folder if it doesn't exist.
+        plan = Plan(new_root) if dry_run else None
+        if plan is None and not os.path.exists(new_root):
+            os.mkdir(new_root)
 
-    # Checking the types of the arguments.
-    if type(current_root) != str:
-        msg = "current_root must be str, not {0}.".format(type(current_root))
-        raise ValueError(msg)
-    if type(new_root) != str:
-        msg = "new_root must be str, not {0}.".format(type(new_root))
-        raise ValueError(msg)
-    if type(relation) not in (tuple, list):
-        msg = "relation must be "
-        msg += "list or tuple, not {0}.".format(type(relation))
-    if type(relation_type) != str:
-        msg = "relation_type must be str, not {0}.".format(type(relation_type))
-        raise ValueError(msg)
+        # Streaming the files straight into the new folder.
+        if not self._shuffle and self._split is None:
+            if manifest:
+                path = os.path.join(new_root, "files.txt")
+                files = (record.path for record in self._selected())
+                if plan is None:
+                    write_manifest(path, files)
+                    return None
+                for file in files:
+                    plan.add('manifest', file, path)
+                return plan
+            copies = ((_source(record), new_root)
+                      for record in self._selected())
+            self._put(copies, new_root, mode, shard_size, resume, plan)
+            return plan
 
-    # Creating new folder if it doesn't exist.
-    if not os.path.exists(new_root):
-        os.mkdir(new_root)
+        # Listing the files and assigning them to the parts.
+        files = list()
+        labels = list() if self._split and self._split[2] else None
+        for record in self._selected():
+            files.append(record.path)
+            if labels is not None:
+                labels.append(_label(self.root, record.path))
+        if self._split is None:
+            relation = [len(files)]
+            names = ["shuffled"]
+        else:
+            relation = self._parts(files, labels)
+            names = [str(i+1) + "_part" for i in range(len(relation))]
+        seed = self._seed if self._shuffle else None
+        parts = _assign_parts(relation, labels, seed)
 
-    # Check out the type of relation argument.
-    assert_message = "the relation argument must be a list or tuple."
-    assert type(relation) in (tuple, list), assert_message
+        # Writing a manifest for each part instead of copying.
+        if manifest:
+            for name, part in zip(names, parts):
+                path = os.path.join(new_root, name + ".txt")
+                if plan is None:
+                    write_manifest(path, (files[idx] for idx in part))
+                    continue
+                for idx in part:
+                    plan.add('manifest', files[idx], path)
+            return plan
 
-    # Making sure that the lenght of relation argument less than the number
-    # files in the source dataset.
-    files = os.listdir(path=current_root)
-    assert_message = "the length of the relation argument cannot be greater "
-    assert_message += "than the number of files in the source folder."
-    assert len(relation) < len(files), assert_message
+        # The folder of every file.
+        folders = dict()
+        for name, part in zip(names, parts):
+            folder = new_root
+            if self._split is not None:
+                folder = os.path.join(new_root, name)
+            for idx in part:
+                if labels:
+                    folders[files[idx]] = os.path.join(folder, labels[idx])
+                else:
+                    folders[files[idx]] = folder
+        for folder in set(folders.values() if plan is None else ()):
+            os.makedirs(folder, exist_ok=True)
 
-    # Checking for the absence of negative values and zeros.
-    for number in relation:
-        assert_message = "the relation argument "
-        assert_message += "can only contain positive values."
-        assert number > 0, assert_message
+        # Archives are read once more, as a stream.
+        if _is_archive(self.root):
+            copies = ((member, folders[member.path]) for member in
+                      _archive_members(self.root) if member.path in folders)
+        else:
+            copies = ((files[idx], folders[files[idx]]) for part in parts
+                      for idx in part)
+        self._put(copies, new_root, mode, shard_size, resume, plan)
+        return plan
 
-    # Select the type of relationship interpretations.
-    if relation_type == 'numerical':
-        splitter_numerical(current_root, new_root, relation)
-    elif relation_type == 'mutual':
-        splitter_mutual(current_root, new_root, relation)
-    elif relation_type == 'percentage':
-        splitter_percentage(current_root, new_root, relation)
-    else:
-        assert_message = "invalid relation_type value. Choose one of "
-        assert_message += "'numerical'(default), 'mutual', 'percentage'."
-        assert False, assert_message
+    def _put(self, copies, new_root, mode, shard_size, resume, plan=None):
+        """Puts the (source, folder) pairs with _Output."""
 
+        journal = _open_journal(new_root, resume, plan)
+        with _Output(mode, shard_size, journal, plan=plan) as output:
+            def copy(task):
+                output.put(*task)
 
-def shuffler(current_root, new_root, seed=None):
-    """
-    Shuffles files in the dataset.
+            def path(source):
+                if isinstance(source, _Member):
+                    return source.path
+                return source
 
-    Args:
+            copies = (task for task in copies
+                      if path(task[0]) not in journal)
+            for _ in _parallel_map(copy, copies, self.workers,
+                                   progress=False):
+                pass
 
-        current_root (str): Source folder with the dataset.
 
-        new_root (str): The target folder where the shuffled dataset
-        will appear.
+# The functions available as commands of the command line interface, see
+# main. The rest of the public functions work with Python objects.
+COMMANDS = ('folder_unpacker', 'sorter', 'splitter', 'shuffler', 'cleaner',
+            'cutter', 'restore_trash', 'purge_trash', 'sampler', 'dedupe',
+            'color_type_detector', 'inspect_images', 'converter',
+            'inventory', 'scan', 'write_manifest', 'load_manifest',
+            'load_inventory')
 
-        seed (int): random-seed for shuffling.
+# The stage of the files printed by the commands that return nothing
+# (unless they are dry runs); the other commands print what they return.
+_PRINTED_STAGES = {'folder_unpacker': 'copy', 'sorter': 'copy',
+                   'splitter': 'copy', 'shuffler': 'copy', 'sampler': 'copy',
+                   'color_type_detector': 'copy', 'cleaner': 'delete',
+                   'cutter': 'delete', 'purge_trash': 'delete',
+                   'converter': 'convert'}
 
-    After shuffling all the files and placing them in a new folder, the new
-    folder will most likely be sorted by name by default. Since most files in
-    datasets have similar names, the order may remain the same. In order for
-    the shuffle to take effect, sort the files in the folder by date.
+# The commands that can work on a list of files read from stdin: those
+# listing the folder with scan. The others pick files from the folder
+# itself (cutter, sampler, shuffler, splitter) or don't list it.
+_LISTED_COMMANDS = ('folder_unpacker', 'sorter', 'cleaner', 'dedupe',
+                    'color_type_detector', 'inspect_images', 'converter',
+                    'inventory', 'scan')
 
-    The function does not perform any conversions to the original folder,
-    files are not deleted after copying to a new folder.
+# Arguments holding paths, which are never parsed as numbers or lists.
+_PATH_ARGUMENTS = ('current_root', 'new_root', 'root', 'path', 'run',
+                   'inventory')
+
+# Arguments holding names (or lists of them), which are never parsed as
+# numbers: the PIL mode '1' is a string, for one.
+_NAME_ARGUMENTS = ('target_type', 'color_type', 'mode', 'conflict',
+                   'action', 'relation_type', 'image_format')
+
+
+def _cli_value(text):
+    """
+    Parses a value of an argument given on the command line: a number,
+    a comma-separated list of values or a string.
     """
 
-    # Checking types of the arguments.
-    if type(current_root) != str:
-        msg = "current_root must be str, not {0}.".format(type(current_root))
-        raise ValueError(msg)
-    if type(new_root) != str:
-        msg = "new_root must be str, not {0}.".format(type(new_root))
-        raise ValueError(msg)
-    if seed and (type(seed) != int):
-        msg = "seed must be int, not {0}.".format(type(seed))
-        raise ValueError(msg)
+    if ',' in text:
+        return [_cli_value(part) for part in text.split(',') if part]
+    for parse in (int, float):
+        try:
+            return parse(text)
+        except ValueError:
+            pass
+    return text
 
-    # Creating new folder if it doesn't exist.
-    if not os.path.exists(new_root):
-        os.mkdir(new_root)
 
-    # Set up the seed.
-    if seed:
-        random.seed(seed)
+def _cli_names(text):
+    """Parses a name or a comma-separated list of names."""
 
-    # Shuffling and copying.
-    files = os.listdir(path=current_root)
-    indexes = [i for i in range(len(files))]
-    random.shuffle(indexes)
-    for idx in tqdm(indexes):
-        file = files[idx]
-        shutil.copy(os.path.join(current_root, file), new_root)
+    if ',' in text:
+        return [part for part in text.split(',') if part]
+    return text
+
+
+def _read_paths(stream, separator):
+    """
+    Yields the paths read from the binary stream as they come: one per line
+    (or separated by NUL bytes if separator is b'\\0'). Lines holding JSON
+    objects (the output of the commands with --json) give their "path", or
+    the duplicates of a group printed by dedupe.
+    """
 
-    print("The shuffle is complete. "
-          "Make sure that the files in the new folder are sorted by date.")
+    rest = b''
+    while True:
+        chunk = stream.read1(65536)
+        items = (rest + chunk).split(separator)
+        rest = items.pop() if chunk else b''
+        for item in items:
+            if separator == b'\n':
+                item = item.rstrip(b'\r')
+            if item.startswith(b'{'):
+                row = json.loads(item)
+                yield from [row['path']] if 'path' in row else row['paths'][1:]
+            elif item:
+                yield os.fsdecode(item)
+        if not chunk:
+            break
 
 
-def cleaner(root, target_type):
+def _cli_row(item):
+    """
+    Returns the paths and the JSON object printed for an item of the value
+    returned by a command. For a group of duplicates, the paths are those
+    of all the files except the first one (the one dedupe keeps).
     """
-    Deletes files of a certain type from the dataset.
 
-    Args:
+    if isinstance(item, str):
+        return (item,), {'path': item}
+    if isinstance(item, FileRecord):
+        row = {'path': item.path, 'is_dir': item.is_dir}
+        if item.stat is not None:
+            row.update(size=item.stat.st_size, mtime=item.stat.st_mtime)
+        return (item.path,), row
+    if isinstance(item, list):
+        return item[1:], {'paths': item}
+    return (item.path,), item._asdict()
 
-        root (str): Source folder with the dataset.
 
-        target_type (str or tuple or list):
-        The type of the target files;
-        if you want to delete files of the diffrent type at the same way,
-        pass their types as a tuple or a list;
-        To determine the file type, I used the filetype
-        package, in particular the 'guess' function with 'mime'.
-        To select the file type you need, see how the above function denotes
-        types and pass them to the already given function as an argument.
-        List of possible types here:
-        "https://pypi.org/project/filetype/"
-        Or here:
-        "https://github.com/t0efL/Dataset-Fixer/blob/master/file_types.txt"
+def _cli_rows(result):
+    """Yields the (paths, JSON object) pairs printed for a returned value."""
 
-    This function irrevocably deletes files without copying them anywhere in
-    advance. If you still want to save these files to another folder before
-    deleting them from this one, use the folder_unpacker function from the
-    same module.
+    if result is None or isinstance(result, int):
+        return
+    if isinstance(result, Plan):
+        for action, source, destination in result.actions:
+            path = source.path if isinstance(source, _Member) else source
+            yield (path,), {'action': action, 'path': path,
+                            'destination': destination}
+        return
+    for item in result:
+        yield _cli_row(item)
+
+
+class _Printer:
+    """
+    Sink writing the paths (or JSON lines with --json) of the files that
+    went through the stage to the binary stream as they are processed.
     """
 
-    if type(root) != str:
-        msg = "root must be str, not {0}.".format(type(root))
-        raise ValueError(msg)
-    if type(target_type) not in (str, tuple, list):
-        msg = "target_type must be str, "
-        msg += "list or tuple, not {0}.".format(type(target_type))
-        raise ValueError(msg)
+    events = ('file',)
 
-    # Working with multiple file types.
-    if type(target_type) is not str:
-        def flag(x, y):
-            file_type = filetype.guess(x)
-            # Fighting with NoneType objects.
-            if file_type:
-                file_type = file_type.mime
-            else:
-                print("Something went frong with {0} file.".format(x))
-            # Flag.
-            for i in y:
-                if file_type == i:
-                    return True
-            return False
+    def __init__(self, stream, separator, as_json, stage=None):
+        self.stream = stream
+        self.separator = separator
+        self.as_json = as_json
+        self.stage = stage
+        self._lock = threading.Lock()
 
-    # Working with a single file type.
-    else:
-        def flag(x, y):
-            file_type = filetype.guess(x)
-            # Fighting with NoneType objects.
-            if file_type:
-                file_type = file_type.mime
-            else:
-                print("Something went frong with {0} file.".format(x))
-            # Flag.
-            return file_type == y
+    def __call__(self, event):
+        if event.stage != self.stage:
+            return
+        row = dict(event._asdict())
+        del row['kind']
+        self.write((event.path,), row)
 
-    # Deleting.
-    for root, dirs, files in os.walk(root):
-        for file in tqdm(files):
-            if flag(os.path.join(root, file), target_type):
-                # Deleting folders.
-                if os.path.isdir(os.path.join(root, file)):
-                    shutil.rmtree(os.path.join(root, file))
-                # Deleting files.
-                else:
-                    os.remove(os.path.join(root, file))
+    def write(self, paths, row):
+        if self.as_json:
+            line = json.dumps(row).encode() + b'\n'
+        else:
+            line = b''.join(os.fsencode(path) + self.separator
+                            for path in paths)
+        with self._lock:
+            self.stream.write(line)
 
 
-def cutter(root, number):
-    """
-    Reduces the dataset by deleting unnecessary files.
+class _ErrorCounter:
+    """Sink counting the errors (and writing them to stderr with quiet)."""
 
-    Args:
+    events = ('error',)
 
-        root (str): Source folder with the dataset.
+    def __init__(self, report):
+        self.report = report
+        self.errors = 0
 
-        number (int): Number of files to delete.
+    def __call__(self, event):
+        self.errors += 1
+        if self.report:
+            sys.stderr.write("{0} failed for {1}: {2}\n".format(
+                event.stage, event.path, event.message))
 
-    This function irrevocably deletes files without copying them anywhere in
-    advance. If you still want to save these files to another folder before
-    deleting them from this one, use the folder_unpacker function from the
-    same module.
-    """
 
-    if type(root) != str:
-        msg = "root must be str, not {0}.".format(type(root))
-        raise ValueError(msg)
-    if type(number) != int:
-        msg = "number must be int, not {0}.".format(type(number))
-        raise ValueError(msg)
+def _cli_parser():
+    """Returns the argparse parser of main with a subcommand per function."""
 
-    # Checking the validity of the number-argument.
-    files = os.listdir(path=root)
-    assert_message = "Number of files to delete can't be greater than "
-    assert_message += "number of files in the source folder."
-    assert number <= len(files), assert_message
+    import argparse
 
-    # Deleting.
-    for root, dirs, files in os.walk(root):
-        for i in tqdm(range(number)):
-            file = files[i]
-            # Deleting folders.
-            if os.path.isdir(os.path.join(root, file)):
-                shutil.rmtree(os.path.join(root, file))
-            # Deleting files.
+    parser = argparse.ArgumentParser(
+        prog='dataset_fixer',
+        description="Dataset Fixer is a utility for sorting, filtering, and "
+                    "transformation of datasets.")
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+    for name in COMMANDS:
+        function = globals()[name]
+        code = function.__code__
+        arguments = code.co_varnames[:code.co_argcount]
+        defaults = dict(zip(arguments[len(arguments) -
+                                      len(function.__defaults__ or ()):],
+                            function.__defaults__ or ()))
+        command = commands.add_parser(
+            name.replace('_', '-'), help=function.__doc__.split("\n\n")[0],
+            description=function.__doc__.split("\n\n")[0])
+        command.set_defaults(function=name)
+        for argument in arguments:
+            option = argument.replace('_', '-')
+            value = _cli_value
+            if argument in _PATH_ARGUMENTS:
+                value = str
+            elif argument in _NAME_ARGUMENTS:
+                value = _cli_names
+            # The files of write_manifest are always read from stdin.
+            if argument == 'files':
+                continue
+            if argument not in defaults:
+                command.add_argument(argument, metavar=option, type=value)
+            elif defaults[argument] is True:
+                command.add_argument('--no-' + option, dest=argument,
+                                     action='store_false')
+            elif defaults[argument] is False:
+                command.add_argument('--' + option, dest=argument,
+                                     action='store_true')
             else:
-                os.remove(os.path.join(root, file))
+                command.add_argument('--' + option, dest=argument, type=value,
+                                     default=defaults[argument],
+                                     metavar=argument.upper())
+        if name in _LISTED_COMMANDS:
+            command.add_argument(
+                '--stdin', action='store_true',
+                help="work on the files listed on standard input (one per "
+                     "line, NUL-separated with --null or JSON lines) "
+                     "instead of listing the whole folder")
+        command.add_argument(
+            '-0', '--null', action='store_true',
+            help="separate the paths read and printed with NUL bytes")
+        command.add_argument(
+            '--json', action='store_true',
+            help="print a JSON object per line instead of paths")
+        command.add_argument(
+            '--progress', action='store_true',
+            help="show the progress bars on stderr")
+    return parser
 
 
-def color_type_detector(current_root, new_root, color_type):
+def main(argv=None):
     """
-    Detects images of a specific color model and copies them to a new folder.
+    The command line interface: every function in COMMANDS is a command
+    (with dashes instead of underscores) taking its arguments as options.
 
-    Args:
+        python dataset_fixer_cli.py cleaner data image/png,image/gif --trash
+        find data -name '*.jpg' -newer last_run |
+            python dataset_fixer_cli.py color-type-detector data out L --stdin
 
-        current_root (str): Source folder with the dataset with images.
+    The commands print the paths of the files they copy, delete or convert
+    (or, with --dry-run, would), one per line, and the commands returning
+    files (scan, inspect-images, dedupe, inventory and the loaders) print
+    them. With --json every line is a JSON object with all the details
+    instead, and with --null the paths are separated with NUL bytes as in
+    find -print0 and xargs -0. --stdin makes the command work on the files
+    listed on standard input in any of these formats (which must be in
+    the folder of the command) instead of listing the folder, so commands
+    can be chained. Only the commands in _LISTED_COMMANDS take it (and
+    write-manifest always reads its files from standard input). Only
+    the libraries the command needs are imported, and dataset_fixer_cli.py
+    (or python -m dataset_fixer) imports this module instead of running it
+    as a script, so its compiled bytecode is reused. The progress bars are
+    turned back on or off as they were before.
 
-        new_root (str): The target folder where the detected images
-        will appear.
+    Args:
 
-        color_type (str or tuple or list):
-        The type of the target images;
-        if you want to detect and copy images of the diffrent type at the
-        same way, pass their types as a tuple or a list;
-        List of possible types here:
-        "https://github.com/t0efL/Dataset-Fixer/blob/master/color_types.txt"
+        argv (list): Optional, defaults to None. The arguments, without
+        the name of the program; by default they are taken from sys.argv.
 
-    The function does not perform any conversions to the original folder,
-    files are not deleted after copying to a new folder.
+    Returns the exit status: 0 on success, 1 if some files failed (or were
+    left in the trash by restore-trash), 2 if the arguments are wrong, 130
+    if interrupted.
     """
 
-    # Checking types of the arguments.
-    if type(current_root) != str:
-        msg = "current_root must be str, not {0}.".format(type(current_root))
-        raise ValueError(msg)
-    if type(new_root) != str:
-        msg = "new_root must be str, not {0}.".format(type(new_root))
-        raise ValueError(msg)
-    if type(color_type) not in (str, tuple, list):
-        msg = "color_type must be str, "
-        msg += "list or tuple, not {0}.".format(type(color_type))
-        raise ValueError(msg)
-
-    # Creating new folder if it doesn't exist.
-    if not os.path.exists(new_root):
-        os.mkdir(new_root)
+    arguments = vars(_cli_parser().parse_args(argv))
+    name = arguments.pop('function')
+    del arguments['command']
+    stdin = arguments.pop('stdin', False)
+    separator = b'\0' if arguments.pop('null') else b'\n'
+    as_json = arguments.pop('json')
+    progress = arguments.pop('progress')
 
-    # Working with multiple color types.
-    if type(color_type) is not str:
-        def flag(x, y):
-            for i in y:
-                if x == i:
-                    return True
-            return False
+    function = globals()[name]
+    stage = None
+    if name in _PRINTED_STAGES and not arguments.get('dry_run'):
+        stage = _PRINTED_STAGES[name]
+    printer = _Printer(sys.stdout.buffer, separator, as_json, stage)
+    errors = _ErrorCounter(report=not progress)
+    was_quiet = _progress_bar is None
+    quiet(not progress)
+    add_sink(printer)
+    add_sink(errors)
+    if name == 'write_manifest':
+        arguments['files'] = _read_paths(sys.stdin.buffer, separator)
+    elif stdin:
+        root = arguments.get('root', arguments.get('current_root'))
+        _listings[root] = _read_paths(sys.stdin.buffer, separator)
+    try:
+        result = function(**arguments)
+        for paths, row in _cli_rows(result):
+            printer.write(paths, row)
+        if isinstance(result, Plan):
+            sys.stderr.write("{0}\n".format(result))
+        sys.stdout.flush()
+    except (ValueError, AssertionError) as error:
+        sys.stderr.write("dataset_fixer {0}: error: {1}\n".format(
+            name.replace('_', '-'), error))
+        return 2
+    except KeyboardInterrupt:
+        return 130
+    except BrokenPipeError:
+        # The reader (like head) has gone, which is not an error.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    finally:
+        _listings.clear()
+        remove_sink(printer)
+        remove_sink(errors)
+        quiet(was_quiet)
+    if errors.errors or (name == 'restore_trash' and result):
+        return 1
+    return 0
 
-    # Working with a single color type.
-    else:
-        def flag(x, y):
-            return x == y
 
-    # Detecting and copying.
-    for root, dirs, files in os.walk(current_root):
-        for file in tqdm(files):
-            try:
-                mode = Image.open(os.path.join(root, file)).mode
-            except (PIL.UnidentifiedImageError, PermissionError):
-                pass
-            else:
-                if flag(mode, color_type):
-                    shutil.copy(os.path.join(root, file), new_root)
-                    
+if __name__ == "__main__":
+    sys.exit(main())
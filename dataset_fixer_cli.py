@@ -0,0 +1,16 @@
+"""
+The command line interface of Dataset Fixer (see dataset_fixer.main):
+
+    python dataset_fixer_cli.py --help
+
+This script only imports dataset_fixer, so Python reuses its compiled
+bytecode and the commands start faster than with
+python dataset_fixer.py, which is compiled again on every run.
+"""
+
+import sys
+
+from dataset_fixer import main
+
+if __name__ == "__main__":
+    sys.exit(main())
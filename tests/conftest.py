@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dataset_fixer  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    """Turns off the progress bars, which would only clutter the output."""
+
+    dataset_fixer.quiet()
+    yield
+    dataset_fixer.quiet(False)
+
+
+def write(path, data=b''):
+    """Writes the file, creating its folders."""
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as file:
+        file.write(data)
+    return path
+
+
+def files(root):
+    """Returns the sorted relative paths of the files in root."""
+
+    return sorted(os.path.relpath(os.path.join(folder, name), root)
+                  for folder, _, names in os.walk(root) for name in names)
@@ -0,0 +1,72 @@
+import os
+import tarfile
+import zipfile
+
+import dataset_fixer
+from conftest import files, write
+
+
+def make_tar(path, members):
+    with tarfile.open(path, 'w:gz') as archive:
+        for name, data in members.items():
+            source = write(path + '.d/' + name, data)
+            archive.add(source, name)
+    return path
+
+
+def shard_members(root):
+    members = dict()
+    for name in files(root):
+        assert name.endswith('.tar')
+        with tarfile.open(os.path.join(root, name)) as archive:
+            for member in archive.getmembers():
+                members[member.name] = archive.extractfile(member).read()
+    return members
+
+
+def test_unpacking_a_tar(tmp_path):
+    archive = make_tar(str(tmp_path / 'data.tar.gz'),
+                       {'a/x.txt': b'x', 'b/y.txt': b'y'})
+    new_root = str(tmp_path / 'new')
+
+    dataset_fixer.folder_unpacker(archive, new_root)
+
+    assert files(new_root) == ['x.txt', 'y.txt']
+    with open(os.path.join(new_root, 'y.txt'), 'rb') as file:
+        assert file.read() == b'y'
+
+
+def test_unpacking_a_zip(tmp_path):
+    archive = str(tmp_path / 'data.zip')
+    with zipfile.ZipFile(archive, 'w') as file:
+        file.writestr('a/x.txt', b'x')
+        file.writestr('y.txt', b'y')
+    new_root = str(tmp_path / 'new')
+
+    dataset_fixer.folder_unpacker(archive, new_root)
+
+    assert files(new_root) == ['x.txt', 'y.txt']
+
+
+def test_shards_hold_every_file(tmp_path):
+    root = str(tmp_path / 'root')
+    data = {'f{0}.bin'.format(i): os.urandom(1000) for i in range(10)}
+    for name, contents in data.items():
+        write(os.path.join(root, name), contents)
+    new_root = str(tmp_path / 'new')
+
+    dataset_fixer.folder_unpacker(root, new_root, shard_size=2500)
+
+    assert len(files(new_root)) > 1
+    assert shard_members(new_root) == data
+
+
+def test_shards_of_a_tar(tmp_path):
+    data = {'a/x.txt': b'x' * 100, 'b/y.txt': b'y' * 100}
+    archive = make_tar(str(tmp_path / 'data.tar.gz'), data)
+    new_root = str(tmp_path / 'new')
+
+    dataset_fixer.folder_unpacker(archive, new_root, shard_size=1 << 20)
+
+    assert shard_members(new_root) == {'x.txt': b'x' * 100,
+                                       'y.txt': b'y' * 100}
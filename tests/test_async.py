@@ -0,0 +1,66 @@
+import asyncio
+import os
+
+import pytest
+from PIL import Image
+
+import dataset_fixer
+from conftest import files, write
+
+
+def collect(iterator):
+    async def run():
+        return [result async for result in iterator]
+    return asyncio.run(run())
+
+
+def test_async_folder_unpacker(tmp_path):
+    root = str(tmp_path / 'root')
+    for i in range(20):
+        write(os.path.join(root, str(i % 3), '{0}.txt'.format(i)), b'x')
+    new_root = str(tmp_path / 'new')
+
+    results = collect(dataset_fixer.async_folder_unpacker(root, new_root,
+                                                          workers=4))
+
+    assert len(results) == 20
+    assert {result.folder for result in results} == {new_root}
+    assert len(files(new_root)) == 20
+
+
+def test_async_sorter(tmp_path):
+    root = str(tmp_path / 'root')
+    os.makedirs(root)
+    Image.new('RGB', (2, 2)).save(os.path.join(root, 'a.png'))
+    Image.new('RGB', (2, 2)).save(os.path.join(root, 'b.gif'))
+
+    new_root = str(tmp_path / 'new')
+    results = collect(dataset_fixer.async_sorter(root, new_root, workers=2))
+
+    types = sorted(result.type for result in results)
+    assert types == ['image/gif', 'image/png']
+    assert files(new_root) == ['image_gif/b.gif', 'image_png/a.png']
+
+
+def test_arguments_are_checked_right_away(tmp_path):
+    with pytest.raises(ValueError):
+        dataset_fixer.async_folder_unpacker(1, str(tmp_path))
+
+
+def test_leaving_early_keeps_the_journal(tmp_path):
+    root = str(tmp_path / 'root')
+    for i in range(50):
+        write(os.path.join(root, '{0}.txt'.format(i)), b'x')
+    new_root = str(tmp_path / 'new')
+
+    async def first():
+        iterator = dataset_fixer.async_folder_unpacker(root, new_root)
+        async for result in iterator:
+            break
+        await iterator.aclose()
+
+    asyncio.run(first())
+    assert dataset_fixer.JOURNAL_NAME in os.listdir(new_root)
+
+    dataset_fixer.folder_unpacker(root, new_root, resume=True)
+    assert len(files(new_root)) == 50
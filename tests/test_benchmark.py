@@ -0,0 +1,34 @@
+import os
+
+import benchmark
+from conftest import files
+
+
+def test_generate_is_reproducible(tmp_path):
+    first, second = str(tmp_path / 'first'), str(tmp_path / 'second')
+
+    number, size = benchmark.generate(first, files=30, depth=1, seed=1)
+    benchmark.generate(second, files=30, depth=1, seed=1)
+
+    assert number == 30
+    assert len(files(first)) == 30
+    assert files(first) == files(second)
+    assert size == sum(os.path.getsize(os.path.join(first, name))
+                       for name in files(first))
+
+
+def test_tiny_run(tmp_path):
+    root = str(tmp_path)
+
+    results = benchmark.run(root, ['cutter', 'dedupe_perceptual'],
+                            workers=2, files=20, depth=1)
+
+    assert [(result['function'], result['execution'])
+            for result in results] == [
+        ('cutter', 'sequential'), ('cutter', 'threads'),
+        ('dedupe_perceptual', 'sequential'),
+        ('dedupe_perceptual', 'threads'),
+        ('dedupe_perceptual', 'processes')]
+    assert not any(result['failed'] for result in results)
+    assert all(result['seconds'] > 0 for result in results)
+    assert sorted(os.listdir(root)) == ['flat', 'tree']
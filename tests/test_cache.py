@@ -0,0 +1,81 @@
+import os
+
+import pytest
+from PIL import Image
+
+import dataset_fixer
+from conftest import write
+
+
+@pytest.fixture
+def detections(monkeypatch):
+    """Records the paths of the files whose types are detected."""
+
+    calls = list()
+    detector = dataset_fixer._DETECTORS['mime']
+
+    def detect(path):
+        calls.append(path)
+        return detector(path)
+
+    monkeypatch.setitem(dataset_fixer._DETECTORS, 'mime', detect)
+    return calls
+
+
+def make_images(root, number=6):
+    os.makedirs(root)
+    for index in range(number):
+        Image.new('RGB', (2, 2)).save(os.path.join(root,
+                                                   '{0}.png'.format(index)))
+
+
+def test_repeated_runs_use_the_cache(tmp_path, detections):
+    source = str(tmp_path / 'source')
+    make_images(source)
+
+    dataset_fixer.sorter(source, str(tmp_path / 'a'), cache=True, workers=2)
+    assert len(detections) == 6
+    assert os.path.exists(os.path.join(source, dataset_fixer.CACHE_NAME))
+
+    dataset_fixer.sorter(source, str(tmp_path / 'b'), cache=True)
+    assert len(detections) == 6
+
+
+def test_changed_files_are_detected_again(tmp_path, detections):
+    source = str(tmp_path / 'source')
+    make_images(source)
+    dataset_fixer.folder_unpacker(source, str(tmp_path / 'a'), 'image/png',
+                                  cache=True)
+    changed = os.path.join(source, '3.png')
+    Image.new('RGB', (3, 3)).save(changed)
+    os.utime(changed, ns=(1, 1))
+    del detections[:]
+
+    dataset_fixer.folder_unpacker(source, str(tmp_path / 'b'), 'image/png',
+                                  cache=True)
+
+    assert detections == [changed]
+
+
+def test_the_cache_is_not_a_part_of_the_dataset(tmp_path):
+    source = str(tmp_path / 'source')
+    make_images(source)
+    dataset_fixer.sorter(source, str(tmp_path / 'a'), cache=True)
+
+    assert not [record for record in dataset_fixer.scan(source)
+                if dataset_fixer.CACHE_NAME in record.path]
+
+
+def test_entries_persist(tmp_path):
+    root = str(tmp_path)
+    path = write(os.path.join(root, 'a.bin'), b'abc')
+
+    with dataset_fixer.DetectionCache(root) as cache:
+        assert cache.get(path, 'mime') == (False, None)
+        cache.set(path, 'mime', 'application/x-test')
+
+    with dataset_fixer.DetectionCache(root) as cache:
+        assert cache.get(path, 'mime') == (True, 'application/x-test')
+        with open(path, 'ab') as file:
+            file.write(b'more')
+        assert cache.get(path, 'mime') == (False, None)
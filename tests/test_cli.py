@@ -0,0 +1,143 @@
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import dataset_fixer
+from conftest import files, write
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'dataset_fixer_cli.py')
+
+
+def run(*arguments, stdin=b''):
+    """Runs the command line interface, returns the process."""
+
+    return subprocess.run([sys.executable, SCRIPT] + list(arguments),
+                          input=stdin, stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE)
+
+
+def test_scan_prints_paths(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, 'a', 'x.bin'), b'x')
+    write(os.path.join(root, 'y.bin'), b'y')
+
+    lines = run('scan', root).stdout.decode().splitlines()
+
+    assert sorted(lines) == [os.path.join(root, 'a', 'x.bin'),
+                             os.path.join(root, 'y.bin')]
+
+
+def test_json_output_and_null_separators(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, 'x.bin'), b'xyz')
+
+    rows = run('scan', root, '--stat', '--json').stdout.splitlines()
+    assert json.loads(rows[0])['size'] == 3
+    assert run('scan', root, '-0').stdout == os.fsencode(
+        os.path.join(root, 'x.bin')) + b'\0'
+
+
+def test_stdin_limits_the_files(tmp_path):
+    root = str(tmp_path)
+    for name in ('a.bin', 'b.bin', 'c.bin'):
+        write(os.path.join(root, name), b'same')
+
+    listed = '\n'.join(os.path.join(root, name) for name in ('a.bin', 'b.bin'))
+    process = run('dedupe', root, '--action', 'remove', '--stdin',
+                  stdin=listed.encode())
+
+    assert process.returncode == 0
+    assert files(root) == ['a.bin', 'c.bin']
+
+
+def test_stdin_rejects_files_outside_the_folder(tmp_path):
+    root = str(tmp_path / 'root')
+    write(os.path.join(root, 'a.bin'), b'a')
+    outside = write(str(tmp_path / 'outside.bin'), b'a')
+
+    process = run('scan', root, '--stdin', stdin=outside.encode())
+
+    assert process.returncode == 1
+    assert process.stdout == b''
+
+
+@pytest.mark.parametrize('command', [
+    ['cutter', '--number', '1'], ['sampler', 'out', '--number', '1'],
+    ['shuffler', 'out'], ['splitter', 'out', '1,1'], ['restore-trash']])
+def test_stdin_is_refused_where_it_would_be_ignored(tmp_path, command):
+    root = str(tmp_path / 'root')
+    write(os.path.join(root, 'a.bin'), b'a')
+    write(os.path.join(root, 'b.bin'), b'b')
+    arguments = [command[0], root] + [str(tmp_path / argument)
+                                      if argument == 'out' else argument
+                                      for argument in command[1:]]
+
+    process = run(*arguments, '--stdin',
+                  stdin=os.path.join(root, 'a.bin').encode())
+
+    assert process.returncode == 2
+    assert b'unrecognized arguments: --stdin' in process.stderr
+    assert files(root) == ['a.bin', 'b.bin']
+
+
+def test_read_paths_formats():
+    stream = io.BytesIO(b'a\nb\r\n{"path": "c"}\n'
+                        b'{"paths": ["x", "y", "z"]}\nlast')
+    assert list(dataset_fixer._read_paths(stream, b'\n')) == [
+        'a', 'b', 'c', 'y', 'z', 'last']
+    stream = io.BytesIO(b'a\nb\0c\0')
+    assert list(dataset_fixer._read_paths(stream, b'\0')) == ['a\nb', 'c']
+
+
+def test_names_are_not_parsed_as_numbers(tmp_path):
+    from PIL import Image
+
+    source = str(tmp_path / 'source')
+    os.makedirs(source)
+    Image.new('1', (4, 4)).save(os.path.join(source, 'bw.png'))
+    Image.new('RGB', (4, 4)).save(os.path.join(source, 'rgb.png'))
+
+    process = run('color-type-detector', source, str(tmp_path / 'bw'), '1')
+    assert process.returncode == 0, process.stderr
+    assert files(str(tmp_path / 'bw')) == ['bw.png']
+
+    process = run('converter', source, str(tmp_path / 'converted'),
+                  '--color-type', '1')
+    assert process.returncode == 0, process.stderr
+    assert files(str(tmp_path / 'converted')) == ['bw.png', 'rgb.png']
+
+
+def test_names_and_numbers_lists():
+    assert dataset_fixer._cli_names('image/png,image/gif') == [
+        'image/png', 'image/gif']
+    assert dataset_fixer._cli_names('1') == '1'
+    assert dataset_fixer._cli_value('0.8,0.2') == [0.8, 0.2]
+    assert dataset_fixer._cli_value('7') == 7
+
+
+def test_main_keeps_the_progress_bars_as_they_were(tmp_path, capsys):
+    root = str(tmp_path)
+    write(os.path.join(root, 'x.bin'), b'x')
+
+    assert dataset_fixer.main(['scan', root, '--progress']) == 0
+    assert dataset_fixer._progress_bar is None
+    dataset_fixer.quiet(False)
+    assert dataset_fixer.main(['scan', root]) == 0
+    assert dataset_fixer._progress_bar is not None
+
+
+def test_module_runs_as_a_script(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, 'x.bin'), b'x')
+
+    process = subprocess.run([sys.executable, '-m', 'dataset_fixer', 'scan',
+                              root], stdout=subprocess.PIPE,
+                             cwd=os.path.dirname(SCRIPT))
+
+    assert process.stdout.decode().splitlines() == [
+        os.path.join(root, 'x.bin')]
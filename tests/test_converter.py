@@ -0,0 +1,84 @@
+import os
+import zipfile
+
+import pytest
+from PIL import Image
+
+import dataset_fixer
+from conftest import files
+
+
+def make_images(root, folders=20):
+    for number in range(folders):
+        folder = os.path.join(root, 'd{0:02d}'.format(number))
+        os.makedirs(folder)
+        Image.new('RGB', (8, 8), (number, 0, 0)).save(
+            os.path.join(folder, 'img.png'))
+
+
+@pytest.mark.parametrize('workers, processes', [(1, False), (8, False),
+                                                (2, True)])
+def test_same_names_in_subfolders_are_kept(tmp_path, workers, processes):
+    source = str(tmp_path / 'source')
+    target = str(tmp_path / 'target')
+    make_images(source)
+
+    dataset_fixer.converter(source, target, color_type='L', workers=workers,
+                            processes=processes, image_format='jpeg')
+
+    assert files(target) == [os.path.join('d{0:02d}'.format(number),
+                                          'img.jpg') for number in range(20)]
+    with Image.open(os.path.join(target, 'd03', 'img.jpg')) as image:
+        assert image.mode == 'L'
+
+
+def test_plan_has_the_relative_paths(tmp_path):
+    source = str(tmp_path / 'source')
+    make_images(source, 2)
+
+    plan = dataset_fixer.converter(source, str(tmp_path / 'target'),
+                                   dry_run=True)
+
+    assert sorted(destination for _, _, destination in plan.actions) == [
+        str(tmp_path / 'target' / 'd00' / 'img.png'),
+        str(tmp_path / 'target' / 'd01' / 'img.png')]
+
+
+def test_archive_members_keep_their_folders(tmp_path):
+    source = str(tmp_path / 'source')
+    make_images(source, 2)
+    archive = str(tmp_path / 'images.zip')
+    with zipfile.ZipFile(archive, 'w') as file:
+        for number in range(2):
+            name = os.path.join('d{0:02d}'.format(number), 'img.png')
+            file.write(os.path.join(source, name), name)
+
+    dataset_fixer.converter(archive, str(tmp_path / 'target'))
+
+    assert files(str(tmp_path / 'target')) == [
+        os.path.join('d00', 'img.png'), os.path.join('d01', 'img.png')]
+
+
+def test_images_that_cant_be_saved_are_skipped(tmp_path):
+    source = str(tmp_path / 'source')
+    target = str(tmp_path / 'target')
+    os.makedirs(source)
+    Image.new('RGBA', (4, 4)).save(os.path.join(source, 'alpha.png'))
+    Image.new('RGB', (4, 4)).save(os.path.join(source, 'rgb.png'))
+    errors = list()
+
+    def sink(event):
+        if event.kind == 'error':
+            errors.append(event)
+
+    dataset_fixer.add_sink(sink)
+    try:
+        dataset_fixer.converter(source, target, color_type=None,
+                                image_format='JPEG')
+    finally:
+        dataset_fixer.remove_sink(sink)
+
+    assert files(target) == ['rgb.jpg']
+    assert [os.path.basename(error.path) for error in errors] == [
+        'alpha.png']
+    assert errors[0].stage == 'convert'
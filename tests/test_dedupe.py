@@ -0,0 +1,125 @@
+import errno
+import os
+
+import dataset_fixer
+from conftest import files, write
+
+
+def test_exact_duplicates_are_grouped(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, 'a', 'x.bin'), b'same')
+    write(os.path.join(root, 'b', 'y.bin'), b'same')
+    write(os.path.join(root, 'c.bin'), b'other')
+
+    groups = dataset_fixer.dedupe(root)
+
+    assert groups == [[os.path.join(root, 'a', 'x.bin'),
+                       os.path.join(root, 'b', 'y.bin')]]
+
+
+def test_files_with_a_common_prefix_are_not_duplicates(tmp_path):
+    # Larger than one partial block but smaller than two, so the partial
+    # hash must cover the whole file.
+    root = str(tmp_path)
+    prefix = b'p' * dataset_fixer._PARTIAL_BLOCK
+    write(os.path.join(root, 'a.bin'), prefix + b'a' * 1000)
+    write(os.path.join(root, 'b.bin'), prefix + b'b' * 1000)
+
+    assert dataset_fixer.dedupe(root, action='remove') == []
+    assert files(root) == ['a.bin', 'b.bin']
+
+
+def test_large_files_differing_in_the_middle(tmp_path):
+    root = str(tmp_path)
+    block = dataset_fixer._PARTIAL_BLOCK
+    write(os.path.join(root, 'a.bin'), b'x' * block * 3)
+    write(os.path.join(root, 'b.bin'),
+          b'x' * block + b'y' * block + b'x' * block)
+
+    assert dataset_fixer.dedupe(root) == []
+
+
+def test_remove_keeps_the_first_file(tmp_path):
+    root = str(tmp_path)
+    for name in ('a.bin', 'b.bin', 'c.bin'):
+        write(os.path.join(root, name), b'data')
+
+    dataset_fixer.dedupe(root, action='remove', workers=2)
+
+    assert files(root) == ['a.bin']
+
+
+def test_hardlink_keeps_all_the_paths(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, 'a.bin'), b'data')
+    write(os.path.join(root, 'b.bin'), b'data')
+
+    dataset_fixer.dedupe(root, action='hardlink')
+
+    assert files(root) == ['a.bin', 'b.bin']
+    assert (os.stat(os.path.join(root, 'a.bin')).st_ino ==
+            os.stat(os.path.join(root, 'b.bin')).st_ino)
+
+
+def test_dry_run_removes_nothing(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, 'a.bin'), b'data')
+    write(os.path.join(root, 'b.bin'), b'data')
+
+    plan = dataset_fixer.dedupe(root, action='remove', dry_run=True)
+
+    assert [action for action, _, _ in plan.actions] == ['delete']
+    assert files(root) == ['a.bin', 'b.bin']
+
+
+def test_hash_totals_count_the_hashed_files(tmp_path):
+    root = str(tmp_path)
+    block = dataset_fixer._PARTIAL_BLOCK
+    write(os.path.join(root, 'a.bin'), b'small')
+    write(os.path.join(root, 'b.bin'), b'small')
+    write(os.path.join(root, 'c.bin'), b'x' * block * 3)
+    write(os.path.join(root, 'd.bin'), b'x' * block * 3)
+    events = list()
+    dataset_fixer.add_sink(events.append)
+    try:
+        dataset_fixer.dedupe(root)
+    finally:
+        dataset_fixer.remove_sink(events.append)
+
+    totals = [event.size for event in events
+              if event.kind == 'begin' and event.stage == 'hash']
+    hashed = [event for event in events
+              if event.kind == 'file' and event.stage == 'hash']
+    assert totals == [4, 2]
+    assert len(hashed) == 6
+
+
+def test_hardlink_skips_other_file_systems(tmp_path, monkeypatch):
+    root = str(tmp_path)
+    for name in ('a.bin', 'b.bin', 'c.bin'):
+        write(os.path.join(root, name), b'data')
+    link = os.link
+
+    def cross_device_link(source, destination):
+        if destination.endswith('b.bin'):
+            raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+        link(source, destination)
+
+    monkeypatch.setattr(os, 'link', cross_device_link)
+    errors = list()
+
+    def sink(event):
+        if event.kind == 'error':
+            errors.append(event.path)
+
+    dataset_fixer.add_sink(sink)
+    try:
+        dataset_fixer.dedupe(root, action='hardlink')
+    finally:
+        dataset_fixer.remove_sink(sink)
+
+    assert errors == [os.path.join(root, 'b.bin')]
+    first = os.stat(os.path.join(root, 'a.bin'))
+    assert os.stat(os.path.join(root, 'c.bin')).st_ino == first.st_ino
+    assert os.stat(os.path.join(root, 'b.bin')).st_ino != first.st_ino
+    assert files(root) == ['a.bin', 'b.bin', 'c.bin']
@@ -0,0 +1,241 @@
+import os
+import time
+
+import pytest
+from PIL import Image
+
+import dataset_fixer
+from conftest import files, write
+
+
+def make_images(root, folders=3, per_folder=10):
+    """Writes PNG and GIF images into the subfolders of root."""
+
+    for folder in range(folders):
+        for number in range(per_folder):
+            path = os.path.join(root, 'd{0}'.format(folder),
+                                'i{0:02d}'.format(number))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if number % 2:
+                Image.new('RGB', (4, 4)).save(path + '.png')
+            else:
+                Image.new('P', (4, 4)).save(path + '.gif')
+
+
+def names(root, extension):
+    return [name for name in files(root) if name.endswith(extension)]
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_cleaner_deletes_only_the_target_type(tmp_path, workers):
+    root = str(tmp_path)
+    make_images(root)
+
+    dataset_fixer.cleaner(root, 'image/png', workers=workers)
+
+    assert names(root, '.png') == []
+    assert len(names(root, '.gif')) == 15
+
+
+def test_cleaner_with_several_types(tmp_path):
+    root = str(tmp_path)
+    make_images(root)
+    write(os.path.join(root, 'notes.txt'), b'not an image')
+
+    dataset_fixer.cleaner(root, ['image/png', 'image/gif'])
+
+    assert files(root) == ['notes.txt']
+
+
+def test_cleaner_dry_run_deletes_nothing(tmp_path):
+    root = str(tmp_path)
+    make_images(root)
+
+    plan = dataset_fixer.cleaner(root, 'image/png', dry_run=True)
+
+    assert plan.files == 15
+    assert len(files(root)) == 30
+
+
+def test_cleaner_uses_the_inventory(tmp_path):
+    root = str(tmp_path)
+    make_images(root, folders=1)
+    table = dataset_fixer.inventory(root)
+    calls = list()
+    detector = dataset_fixer._DETECTORS['mime']
+    dataset_fixer._DETECTORS['mime'] = lambda path: (calls.append(path) or
+                                                     detector(path))
+    try:
+        dataset_fixer.cleaner(root, 'image/png', inventory=table)
+    finally:
+        dataset_fixer._DETECTORS['mime'] = detector
+
+    assert calls == []
+    assert names(root, '.png') == []
+
+
+def test_cleaner_resumes_after_an_interruption(tmp_path):
+    root = str(tmp_path)
+    make_images(root)
+
+    class Interrupt(Exception):
+        pass
+
+    deleted = list()
+
+    def sink(event):
+        if event.stage == 'delete':
+            deleted.append(event.path)
+            if len(deleted) == 5:
+                raise Interrupt()
+
+    sink.events = ('file',)
+    dataset_fixer.add_sink(sink)
+    try:
+        with pytest.raises(Interrupt):
+            dataset_fixer.cleaner(root, 'image/png')
+    finally:
+        dataset_fixer.remove_sink(sink)
+    assert os.path.exists(os.path.join(root, dataset_fixer.JOURNAL_NAME))
+
+    dataset_fixer.cleaner(root, 'image/png', resume=True)
+
+    assert names(root, '.png') == []
+    assert len(names(root, '.gif')) == 15
+    assert not os.path.exists(os.path.join(root, dataset_fixer.JOURNAL_NAME))
+
+
+def test_trash_and_restore(tmp_path):
+    root = str(tmp_path)
+    make_images(root)
+    before = files(root)
+
+    dataset_fixer.cleaner(root, 'image/png', trash=True, workers=3)
+
+    trash = os.path.join(root, dataset_fixer.TRASH_NAME)
+    assert [name for name in names(root, '.png')
+            if not name.startswith(dataset_fixer.TRASH_NAME)] == []
+    assert len(names(trash, '.png')) == 15
+    # The trash is not a part of the dataset.
+    assert not [record for record in dataset_fixer.scan(root)
+                if record.path.endswith('.png')]
+
+    assert dataset_fixer.restore_trash(root) == 0
+    assert files(root) == before
+
+
+def test_restore_leaves_files_whose_paths_are_taken(tmp_path):
+    root = str(tmp_path)
+    make_images(root, folders=1)
+    dataset_fixer.cleaner(root, 'image/png', trash=True)
+    taken = write(os.path.join(root, 'd0', 'i01.png'), b'new file')
+
+    assert dataset_fixer.restore_trash(root) == 1
+
+    with open(taken, 'rb') as file:
+        assert file.read() == b'new file'
+    assert len(names(root, '.png')) == 6
+    assert dataset_fixer.TRASH_NAME in os.listdir(root)
+
+
+def test_purge_trash(tmp_path):
+    root = str(tmp_path)
+    make_images(root)
+    dataset_fixer.cleaner(root, 'image/png', trash=True)
+
+    plan = dataset_fixer.purge_trash(root, dry_run=True)
+    assert plan.files == 15
+    dataset_fixer.purge_trash(root, older_than=3600)
+    assert dataset_fixer.TRASH_NAME in os.listdir(root)
+
+    dataset_fixer.purge_trash(root, workers=2)
+
+    assert dataset_fixer.TRASH_NAME not in os.listdir(root)
+    assert dataset_fixer.restore_trash(root) == 0
+    assert names(root, '.png') == []
+
+
+def test_purge_trash_older_than(tmp_path):
+    root = str(tmp_path)
+    make_images(root, folders=1)
+    dataset_fixer.cleaner(root, 'image/png', trash=True)
+    trash = os.path.join(root, dataset_fixer.TRASH_NAME)
+    old = os.path.join(trash, os.listdir(trash)[0])
+    hour_ago = time.time() - 3600
+    os.utime(old, (hour_ago, hour_ago))
+    dataset_fixer.cleaner(root, 'image/gif', trash=True)
+
+    dataset_fixer.purge_trash(root, older_than=60)
+
+    assert len(os.listdir(trash)) == 1
+    dataset_fixer.restore_trash(root)
+    assert len(names(root, '.gif')) == 5
+    assert names(root, '.png') == []
+
+
+def test_deleter_batches(tmp_path):
+    root = str(tmp_path)
+    paths = [write(os.path.join(root, 'd{0}'.format(number % 3),
+                                'f{0}'.format(number)))
+             for number in range(dataset_fixer._DELETE_BATCH * 2 + 10)]
+
+    with dataset_fixer._Deleter(root, workers=4) as deleter:
+        for path in paths:
+            deleter.add(path)
+
+    assert files(root) == []
+
+
+@pytest.mark.parametrize('workers', [1, 3])
+def test_cutter_number(tmp_path, workers):
+    root = str(tmp_path)
+    for number in range(20):
+        write(os.path.join(root, 'f{0:02d}'.format(number)))
+
+    dataset_fixer.cutter(root, number=5, workers=workers)
+
+    assert len(files(root)) == 15
+
+
+def test_cutter_keep_with_a_seed_is_reproducible(tmp_path):
+    kept = list()
+    for attempt in range(2):
+        root = str(tmp_path / str(attempt))
+        for number in range(30):
+            write(os.path.join(root, 'f{0:02d}'.format(number)))
+        dataset_fixer.cutter(root, keep=10, seed=7)
+        kept.append(files(root))
+
+    assert len(kept[0]) == 10
+    assert kept[0] == kept[1]
+    assert kept[0] != ['f{0:02d}'.format(number) for number in range(10)]
+
+
+def test_cutter_deletes_folders(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, 'a', 'x'))
+    write(os.path.join(root, 'b', 'y'))
+    write(os.path.join(root, 'c'))
+
+    dataset_fixer.cutter(root, number=3)
+
+    assert os.listdir(root) == []
+
+
+def test_cutter_trash_and_dry_run(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, 'a', 'x'))
+    for number in range(5):
+        write(os.path.join(root, 'f{0}'.format(number)))
+    before = files(root)
+
+    plan = dataset_fixer.cutter(root, number=3, dry_run=True)
+    assert [action for action, _, _ in plan.actions] == ['delete'] * 3
+    assert files(root) == before
+
+    dataset_fixer.cutter(root, number=3, trash=True)
+    assert len(os.listdir(root)) == 4
+    assert dataset_fixer.TRASH_NAME in os.listdir(root)
+    assert len(files(os.path.join(root, dataset_fixer.TRASH_NAME))) in (3, 4)
+    dataset_fixer.restore_trash(root)
+    assert files(root) == before
@@ -0,0 +1,39 @@
+import io
+import os
+
+from PIL import Image
+
+import dataset_fixer
+from conftest import write
+
+
+def png_bytes(mode='RGB', size=(3, 2)):
+    buffer = io.BytesIO()
+    Image.new(mode, size).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def test_mime_from_the_header_only(tmp_path):
+    # A valid header followed by a lot of garbage.
+    path = write(str(tmp_path / 'big.png'), png_bytes() + bytes(1 << 20))
+
+    header = dataset_fixer._read_header(path)
+
+    assert len(header) == dataset_fixer._MIME_HEADER_SIZE
+    assert dataset_fixer._guess_mime(path) == 'image/png'
+
+
+def test_mime_of_contents_and_of_unknown_files(tmp_path):
+    assert dataset_fixer._guess_mime(png_bytes()) == 'image/png'
+    assert dataset_fixer._guess_mime(
+        write(str(tmp_path / 'text.txt'), b'plain text')) is None
+    assert dataset_fixer._guess_mime(write(str(tmp_path / 'empty'))) is None
+
+
+def test_image_properties(tmp_path):
+    path = write(str(tmp_path / 'image.png'), png_bytes('LA', (5, 7)))
+
+    assert dataset_fixer._inspect_image(path) == ('LA', 5, 7)
+    assert dataset_fixer._inspect_image(png_bytes('P')) == ('P', 3, 2)
+    assert dataset_fixer._inspect_image(
+        write(str(tmp_path / 'text.txt'), b'plain text')) is None
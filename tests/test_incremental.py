@@ -0,0 +1,99 @@
+import os
+
+import pytest
+
+import dataset_fixer
+from conftest import files, write
+
+
+def unpack(root, new_root, **kwargs):
+    events = list()
+
+    def sink(event):
+        if event.kind == 'file' and event.stage == 'copy':
+            events.append(os.path.basename(event.path))
+
+    dataset_fixer.add_sink(sink)
+    try:
+        dataset_fixer.folder_unpacker(root, new_root, incremental=True,
+                                      **kwargs)
+    finally:
+        dataset_fixer.remove_sink(sink)
+    return sorted(events)
+
+
+def test_only_new_and_changed_files_are_copied(tmp_path):
+    root = str(tmp_path / 'root')
+    new_root = str(tmp_path / 'new')
+    write(os.path.join(root, 'a.txt'), b'a')
+    write(os.path.join(root, 'b.txt'), b'b')
+
+    assert unpack(root, new_root) == ['a.txt', 'b.txt']
+    assert unpack(root, new_root) == []
+
+    write(os.path.join(root, 'c.txt'), b'c')
+    write(os.path.join(root, 'a.txt'), b'changed')
+    assert unpack(root, new_root) == ['a.txt', 'c.txt']
+    with open(os.path.join(new_root, 'a.txt'), 'rb') as file:
+        assert file.read() == b'changed'
+
+
+def test_copies_of_deleted_files_are_removed(tmp_path):
+    root = str(tmp_path / 'root')
+    new_root = str(tmp_path / 'new')
+    write(os.path.join(root, 'a.txt'), b'a')
+    write(os.path.join(root, 'b.txt'), b'b')
+    unpack(root, new_root)
+
+    os.remove(os.path.join(root, 'b.txt'))
+    unpack(root, new_root)
+
+    assert files(new_root) == [dataset_fixer.SNAPSHOT_NAME, 'a.txt']
+
+
+def test_checksum_ignores_touched_files(tmp_path):
+    root = str(tmp_path / 'root')
+    new_root = str(tmp_path / 'new')
+    path = write(os.path.join(root, 'a.txt'), b'a')
+    unpack(root, new_root, checksum=True)
+
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert unpack(root, new_root, checksum=True) == []
+
+
+def test_dry_run_reports_the_changes(tmp_path):
+    root = str(tmp_path / 'root')
+    new_root = str(tmp_path / 'new')
+    write(os.path.join(root, 'a.txt'), b'a')
+    unpack(root, new_root)
+    write(os.path.join(root, 'b.txt'), b'b')
+
+    plan = dataset_fixer.folder_unpacker(root, new_root, incremental=True,
+                                         dry_run=True)
+
+    assert [os.path.basename(action[1]) for action in plan.actions] == [
+        'b.txt']
+    assert files(new_root) == [dataset_fixer.SNAPSHOT_NAME, 'a.txt']
+
+
+@pytest.mark.parametrize('conflict', ['skip', 'suffix'])
+def test_changed_files_keep_their_names(tmp_path, conflict):
+    root = str(tmp_path / 'root')
+    new_root = str(tmp_path / 'new')
+    for i in range(100):
+        write(os.path.join(root, 'f{0:02}.txt'.format(i)), b'old')
+    unpack(root, new_root, conflict=conflict)
+
+    for i in range(10):
+        write(os.path.join(root, 'f{0:02}.txt'.format(i)), b'new data')
+    unpack(root, new_root, conflict=conflict)
+
+    names = files(new_root)
+    assert len(names) == 101
+    assert names[1:] == ['f{0:02}.txt'.format(i) for i in range(100)]
+    for i in range(10):
+        path = os.path.join(new_root, 'f{0:02}.txt'.format(i))
+        with open(path, 'rb') as file:
+            assert file.read() == b'new data'
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+from PIL import Image
+
+import dataset_fixer
+from conftest import write
+
+
+@pytest.fixture
+def images(tmp_path):
+    root = str(tmp_path)
+    Image.new('RGB', (4, 3)).save(os.path.join(root, 'rgb.jpg'))
+    Image.effect_noise((200, 100), 50).save(os.path.join(root, 'gray.png'))
+    rotated = Image.new('RGB', (6, 2))
+    exif = rotated.getexif()
+    exif[0x0112] = 6
+    rotated.save(os.path.join(root, 'rotated.jpg'), exif=exif)
+    with open(os.path.join(root, 'gray.png'), 'rb') as file:
+        data = file.read()
+    write(os.path.join(root, 'broken.png'), data[:len(data) // 2])
+    write(os.path.join(root, 'notes.txt'), b'not an image')
+    return root
+
+
+@pytest.mark.parametrize('workers, processes', [(1, False), (3, False),
+                                                (2, True)])
+def test_inspect_images(images, workers, processes):
+    infos = {os.path.basename(info.path): info
+             for info in dataset_fixer.inspect_images(
+                 images, workers=workers, processes=processes, verify=True)}
+
+    assert sorted(infos) == ['broken.png', 'gray.png', 'rgb.jpg',
+                             'rotated.jpg']
+    assert infos['rgb.jpg'][1:] == ('JPEG', 'RGB', 4, 3, 1, False)
+    assert infos['gray.png'][1:] == ('PNG', 'L', 200, 100, 1, False)
+    assert infos['rotated.jpg'].orientation == 6
+    assert infos['broken.png'].corrupt
+
+
+def test_only_headers_are_read_without_verify(images):
+    infos = {os.path.basename(info.path): info
+             for info in dataset_fixer.inspect_images(images)}
+
+    # The header of the truncated image is intact.
+    assert not infos['broken.png'].corrupt
+    assert infos['broken.png'].width == 200
+
+
+@pytest.mark.parametrize('arguments', [{'root': 1}, {'workers': '2'},
+                                       {'workers': 0}, {'verify': 1}])
+def test_arguments_are_checked_right_away(images, arguments):
+    arguments = dict({'root': images}, **arguments)
+
+    with pytest.raises((ValueError, AssertionError)):
+        dataset_fixer.inspect_images(**arguments)
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+from PIL import Image
+
+import dataset_fixer
+from conftest import files, write
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = str(tmp_path / 'root')
+    os.makedirs(root)
+    Image.new('RGB', (40, 30)).save(os.path.join(root, 'small.png'))
+    Image.new('RGBA', (400, 300)).save(os.path.join(root, 'large.png'))
+    Image.new('L', (10, 10)).save(os.path.join(root, 'gray.jpg'))
+    write(os.path.join(root, 'notes.txt'), b'text')
+    return root
+
+
+def names(paths):
+    return sorted(os.path.basename(path) for path in paths)
+
+
+def test_columns(root):
+    table = dataset_fixer.inventory(root, workers=2)
+
+    assert len(table) == 4
+    rows = {os.path.basename(row.path): row for row in table}
+    assert rows['large.png'][3:] == ('image/png', 'RGBA', 400, 300)
+    assert rows['notes.txt'].mode is None
+    assert rows['notes.txt'].width is None
+    assert rows['notes.txt'].size == 4
+
+
+def test_select(root):
+    table = dataset_fixer.inventory(root)
+
+    assert names(table.select('image/png')) == ['large.png', 'small.png']
+    gray_or_rgb = table.select(mode=('L', 'RGB'))
+    assert names(gray_or_rgb) == ['gray.jpg', 'small.png']
+    assert names(table.select(min_width=100)) == ['large.png']
+    assert names(table.select(max_height=30)) == ['gray.jpg', 'small.png']
+    assert table.select('image/gif') == []
+
+
+def test_save_and_load(root, tmp_path):
+    path = str(tmp_path / 'inventory.npz')
+    table = dataset_fixer.inventory(root, path=path)
+
+    loaded = dataset_fixer.load_inventory(path)
+
+    assert loaded.root == root
+    assert list(loaded) == list(table)
+    assert loaded.select('image/png', 'RGBA') == table.select('image/png',
+                                                              'RGBA')
+
+
+def test_pipeline_uses_the_inventory(root, tmp_path, monkeypatch):
+    path = str(tmp_path / 'inventory.npz')
+    dataset_fixer.inventory(root, path=path)
+
+    def detect(path):
+        raise AssertionError("the file was read: " + path)
+
+    monkeypatch.setitem(dataset_fixer._DETECTORS, 'mime', detect)
+    new_root = str(tmp_path / 'new')
+    dataset_fixer.Pipeline(root, inventory=path).filter_mime(
+        'image/png').write(new_root)
+
+    assert sorted(os.listdir(new_root)) == ['large.png', 'small.png']
+
+
+@pytest.mark.parametrize('function, argument, expected', [
+    ('folder_unpacker', 'image/png', ['large.png', 'small.png']),
+    ('sorter', 'image/png', ['image_png/large.png', 'image_png/small.png']),
+    ('color_type_detector', 'RGBA', ['large.png'])])
+def test_copies_use_the_inventory(root, tmp_path, monkeypatch, function,
+                                  argument, expected):
+    path = str(tmp_path / 'inventory.npz')
+    dataset_fixer.inventory(root, path=path)
+
+    def detect(path):
+        raise AssertionError("the file was read: " + path)
+
+    monkeypatch.setitem(dataset_fixer._DETECTORS, 'mime', detect)
+    monkeypatch.setitem(dataset_fixer._DETECTORS, 'image', detect)
+    new_root = str(tmp_path / 'new')
+    getattr(dataset_fixer, function)(root, new_root, argument, workers=2,
+                                     inventory=path)
+
+    assert files(new_root) == expected
+
+
+def test_files_changed_since_the_inventory_are_detected(root, tmp_path):
+    table = dataset_fixer.inventory(root)
+    os.remove(os.path.join(root, 'small.png'))
+    Image.new('RGBA', (4, 4)).save(os.path.join(root, 'small.png'))
+    new_root = str(tmp_path / 'new')
+
+    dataset_fixer.color_type_detector(root, new_root, 'RGBA',
+                                      inventory=table)
+
+    assert files(new_root) == ['large.png', 'small.png']
+
+
+def test_inventory_type_is_checked(root, tmp_path):
+    with pytest.raises(ValueError):
+        dataset_fixer.folder_unpacker(root, str(tmp_path / 'new'),
+                                      inventory=1)
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+import dataset_fixer
+from conftest import write
+
+
+def make_files(root, number=10):
+    return [write(os.path.join(root, 'f{0:02d}.bin'.format(index)), b'x')
+            for index in range(number)]
+
+
+def test_write_and_load(tmp_path):
+    path = str(tmp_path / 'list.txt')
+    paths = ['a', os.path.join('b', 'c'), 'd e']
+
+    dataset_fixer.write_manifest(path, paths)
+    manifest = dataset_fixer.load_manifest(path)
+
+    assert len(manifest) == 3
+    assert manifest[1] == os.path.join('b', 'c')
+    assert manifest[-1] == 'd e'
+    assert list(manifest) == paths
+
+
+def test_line_breaks_are_refused(tmp_path):
+    with pytest.raises(ValueError):
+        dataset_fixer.write_manifest(str(tmp_path / 'list.txt'), ['a\nb'])
+
+
+def test_splitter_writes_a_manifest_per_part(tmp_path):
+    source = str(tmp_path / 'source')
+    target = str(tmp_path / 'target')
+    paths = make_files(source)
+
+    dataset_fixer.splitter(source, target, [7, 3], manifest=True)
+
+    parts = [list(dataset_fixer.load_manifest(os.path.join(target, name)))
+             for name in ('1_part.txt', '2_part.txt')]
+    assert [len(part) for part in parts] == [7, 3]
+    assert sorted(parts[0] + parts[1]) == paths
+    assert sorted(os.listdir(target)) == ['1_part.txt', '1_part.txt.idx',
+                                          '2_part.txt', '2_part.txt.idx']
+
+
+def test_shuffler_manifest_is_a_seeded_permutation(tmp_path):
+    source = str(tmp_path / 'source')
+    paths = make_files(source, 30)
+
+    orders = list()
+    for attempt in range(2):
+        target = str(tmp_path / str(attempt))
+        dataset_fixer.shuffler(source, target, seed=3, manifest=True)
+        orders.append(list(dataset_fixer.load_manifest(
+            os.path.join(target, 'shuffled.txt'))))
+
+    assert orders[0] == orders[1]
+    assert sorted(orders[0]) == paths
+    assert orders[0] != paths
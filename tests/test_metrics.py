@@ -0,0 +1,77 @@
+import json
+import os
+
+import dataset_fixer
+from conftest import write
+
+
+def test_metrics_count_the_files(tmp_path):
+    root = str(tmp_path / 'root')
+    write(os.path.join(root, 'a.txt'), b'aaa')
+    write(os.path.join(root, 'sub', 'b.txt'), b'bb')
+    metrics = dataset_fixer.Metrics()
+
+    dataset_fixer.add_sink(metrics)
+    try:
+        dataset_fixer.folder_unpacker(root, str(tmp_path / 'new'),
+                                      workers=2)
+    finally:
+        dataset_fixer.remove_sink(metrics)
+
+    assert metrics.files['copy'] == 2
+    assert metrics.bytes['copy'] == 5
+    assert metrics.errors == {}
+    assert metrics.seconds['copy'] >= 0
+
+
+def test_prometheus(tmp_path):
+    metrics = dataset_fixer.Metrics()
+    metrics(dataset_fixer.Event('file', 'copy', 'a', 10, 0.5, None))
+    metrics(dataset_fixer.Event('error', 'copy', 'b', None, None, 'failed'))
+    path = str(tmp_path / 'metrics.prom')
+
+    metrics.write_prometheus(path)
+
+    with open(path) as file:
+        text = file.read()
+    assert 'dataset_fixer_files_total{stage="copy"} 1\n' in text
+    assert 'dataset_fixer_bytes_total{stage="copy"} 10\n' in text
+    assert 'dataset_fixer_errors_total{stage="copy"} 1\n' in text
+    assert os.listdir(str(tmp_path)) == ['metrics.prom']
+
+
+def test_json_lines(tmp_path):
+    root = str(tmp_path / 'root')
+    write(os.path.join(root, 'a.txt'), b'a')
+    path = str(tmp_path / 'events.jsonl')
+    sink = dataset_fixer.JsonLines(path)
+
+    dataset_fixer.add_sink(sink)
+    try:
+        dataset_fixer.folder_unpacker(root, str(tmp_path / 'new'))
+    finally:
+        dataset_fixer.remove_sink(sink)
+        sink.close()
+
+    with open(path) as file:
+        events = [json.loads(line) for line in file]
+    kinds = [event['kind'] for event in events]
+    assert 'progress' not in kinds
+    assert kinds[0] == 'begin'
+    assert kinds[-1] == 'end'
+    copied = [event for event in events
+              if event['kind'] == 'file' and event['stage'] == 'copy']
+    assert copied[0]['path'] == os.path.join(root, 'a.txt')
+    assert 'time' in copied[0]
+
+
+def test_removed_sinks_get_nothing(tmp_path):
+    root = str(tmp_path / 'root')
+    write(os.path.join(root, 'a.txt'), b'a')
+    events = list()
+    dataset_fixer.add_sink(events.append)
+    dataset_fixer.remove_sink(events.append)
+
+    dataset_fixer.folder_unpacker(root, str(tmp_path / 'new'))
+
+    assert events == []
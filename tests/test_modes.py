@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+import dataset_fixer
+from conftest import files, write
+
+
+@pytest.fixture
+def source(tmp_path):
+    root = str(tmp_path / 'source')
+    for name in ('a.bin', os.path.join('d', 'b.bin')):
+        write(os.path.join(root, name), name.encode())
+    return root
+
+
+def read(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def test_copy(tmp_path, source):
+    target = str(tmp_path / 'target')
+
+    dataset_fixer.folder_unpacker(source, target)
+
+    assert files(target) == ['a.bin', 'b.bin']
+    assert not os.path.islink(os.path.join(target, 'a.bin'))
+    assert (os.stat(os.path.join(target, 'a.bin')).st_ino !=
+            os.stat(os.path.join(source, 'a.bin')).st_ino)
+
+
+def test_hardlink(tmp_path, source):
+    target = str(tmp_path / 'target')
+
+    dataset_fixer.folder_unpacker(source, target, mode='hardlink')
+
+    assert (os.stat(os.path.join(target, 'a.bin')).st_ino ==
+            os.stat(os.path.join(source, 'a.bin')).st_ino)
+
+
+def test_symlink(tmp_path, source):
+    target = str(tmp_path / 'target')
+
+    dataset_fixer.folder_unpacker(source, target, mode='symlink')
+
+    link = os.path.join(target, 'b.bin')
+    assert os.path.islink(link)
+    assert os.readlink(link) == os.path.abspath(
+        os.path.join(source, 'd', 'b.bin'))
+
+
+def test_reflink_falls_back_to_a_copy(tmp_path, source):
+    target = str(tmp_path / 'target')
+
+    dataset_fixer.folder_unpacker(source, target, mode='reflink')
+
+    assert read(os.path.join(target, 'b.bin')) == os.path.join(
+        'd', 'b.bin').encode()
+
+
+def test_move(tmp_path, source):
+    target = str(tmp_path / 'target')
+
+    dataset_fixer.folder_unpacker(source, target, mode='move')
+
+    assert files(target) == ['a.bin', 'b.bin']
+    assert files(source) == []
+
+
+def test_unknown_mode(tmp_path, source):
+    with pytest.raises(AssertionError):
+        dataset_fixer.folder_unpacker(source, str(tmp_path / 'target'),
+                                      mode='teleport')
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+import dataset_fixer
+from conftest import files, write
+
+
+def make_tree(root, folders=20, name='same.txt'):
+    """Writes a file with the same name and different contents per folder."""
+
+    for number in range(folders):
+        write(os.path.join(root, 'd{0:02d}'.format(number), name),
+              'file {0}'.format(number).encode() * 1000)
+
+
+@pytest.mark.parametrize('mode', ['copy', 'hardlink', 'symlink'])
+def test_overwriting_the_same_name_from_several_workers(tmp_path, mode):
+    source = str(tmp_path / 'source')
+    target = str(tmp_path / 'target')
+    make_tree(source)
+
+    dataset_fixer.folder_unpacker(source, target, workers=8, mode=mode)
+
+    assert files(target) == ['same.txt']
+    with open(os.path.join(target, 'same.txt'), 'rb') as file:
+        data = file.read()
+    # One whole file of the sources, not a mix of several.
+    assert data in {'file {0}'.format(number).encode() * 1000
+                    for number in range(20)}
+
+
+@pytest.mark.parametrize('conflict, expected', [
+    ('skip', ['same.txt']),
+    ('suffix', ['same.txt'] + ['same_{0}.txt'.format(number)
+                               for number in range(1, 20)]),
+    ('path', [os.path.join('d{0:02d}'.format(number), 'same.txt')
+              for number in range(20)]),
+])
+def test_conflicts(tmp_path, conflict, expected):
+    source = str(tmp_path / 'source')
+    target = str(tmp_path / 'target')
+    make_tree(source)
+
+    dataset_fixer.folder_unpacker(source, target, workers=4,
+                                  conflict=conflict)
+
+    assert files(target) == sorted(expected)
+
+
+def test_hash_conflict_keeps_every_file(tmp_path):
+    source = str(tmp_path / 'source')
+    target = str(tmp_path / 'target')
+    make_tree(source)
+
+    dataset_fixer.folder_unpacker(source, target, workers=4, conflict='hash')
+
+    names = files(target)
+    assert len(names) == 20
+    assert all(name.endswith('_same.txt') for name in names)
+
+
+def test_no_temporary_files_are_left(tmp_path):
+    source = str(tmp_path / 'source')
+    target = str(tmp_path / 'target')
+    make_tree(source)
+
+    dataset_fixer.folder_unpacker(source, target, workers=4, conflict='suffix')
+
+    assert not [name for name in files(target)
+                if name.startswith(dataset_fixer._TEMP_PREFIX)]
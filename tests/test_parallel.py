@@ -0,0 +1,83 @@
+import os
+import threading
+import time
+
+import pytest
+
+import dataset_fixer
+from conftest import files, write
+
+
+def square(number):
+    return number * number
+
+
+@pytest.mark.parametrize('workers, processes', [(1, False), (4, False),
+                                                (3, True)])
+def test_results_keep_the_order(workers, processes):
+    results = dataset_fixer._parallel_map(square, range(100), workers,
+                                          processes, progress=False)
+
+    assert list(results) == [number * number for number in range(100)]
+
+
+def test_tasks_in_flight_are_bounded():
+    taken = list()
+
+    def items():
+        for number in range(1000):
+            taken.append(number)
+            yield number
+
+    results = dataset_fixer._parallel_map(lambda number: number, items(), 2,
+                                          progress=False)
+    next(results)
+    time.sleep(0.05)
+
+    assert len(taken) <= 2 * dataset_fixer._PENDING_PER_WORKER + 2
+    assert list(results) == list(range(1, 1000))
+
+
+def test_errors_are_raised():
+    def fail(number):
+        if number == 5:
+            raise RuntimeError('broken')
+        return number
+
+    with pytest.raises(RuntimeError):
+        list(dataset_fixer._parallel_map(fail, range(10), 3, progress=False))
+
+
+def test_several_threads_are_used():
+    names = set()
+
+    def work(number):
+        names.add(threading.current_thread().name)
+        time.sleep(0.01)
+        return number
+
+    list(dataset_fixer._parallel_map(work, range(20), 4, progress=False))
+
+    assert len(names) > 1
+
+
+@pytest.mark.parametrize('workers, processes', [(4, False), (2, True)])
+def test_sorter_with_workers_matches_the_sequential_run(tmp_path, workers,
+                                                        processes):
+    from PIL import Image
+
+    source = str(tmp_path / 'source')
+    for number in range(12):
+        path = os.path.join(source, 'd{0}'.format(number % 3),
+                            'i{0}.png'.format(number))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        Image.new('RGB', (2, 2)).save(path)
+        write(os.path.join(source, 'f{0}.gif'.format(number)),
+              b'GIF89a' + bytes(20))
+
+    dataset_fixer.sorter(source, str(tmp_path / 'one'))
+    dataset_fixer.sorter(source, str(tmp_path / 'many'), workers=workers,
+                         processes=processes)
+
+    assert files(str(tmp_path / 'one')) == files(str(tmp_path / 'many'))
+    assert len(files(str(tmp_path / 'one'))) == 24
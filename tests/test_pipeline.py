@@ -0,0 +1,84 @@
+import os
+
+import pytest
+from PIL import Image
+
+import dataset_fixer
+from conftest import files, write
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = str(tmp_path / 'root')
+    os.makedirs(os.path.join(root, 'sub'))
+    Image.new('RGB', (4, 4), 'red').save(os.path.join(root, 'red.png'))
+    Image.new('RGB', (4, 4), 'red').save(os.path.join(root, 'sub',
+                                                      'copy.png'))
+    Image.new('L', (4, 4)).save(os.path.join(root, 'gray.png'))
+    for i in range(6):
+        Image.new('RGB', (4, 4), (i, 0, 0)).save(
+            os.path.join(root, 'sub', 'rgb{0}.png'.format(i)))
+    write(os.path.join(root, 'notes.txt'), b'notes')
+    return root
+
+
+def test_stages_are_lazy(root, tmp_path):
+    new_root = str(tmp_path / 'new')
+    pipeline = dataset_fixer.Pipeline(root)
+
+    filtered = pipeline.filter_mime('image/png').dedupe()
+
+    assert filtered is not pipeline
+    assert not os.path.exists(new_root)
+
+
+def test_filter_and_dedupe(root, tmp_path):
+    new_root = str(tmp_path / 'new')
+
+    (dataset_fixer.Pipeline(root, workers=3).filter_mime('image/png')
+     .filter_mode('RGB').dedupe().write(new_root))
+
+    names = files(new_root)
+    assert len(names) == 7
+    assert 'gray.png' not in names
+    assert len({'red.png', 'copy.png'} & set(names)) == 1
+
+
+def test_exclude_mime(root, tmp_path):
+    new_root = str(tmp_path / 'new')
+
+    dataset_fixer.Pipeline(root).exclude_mime('image/png').write(new_root)
+
+    assert files(new_root) == ['notes.txt']
+
+
+def test_shuffle_and_split(root, tmp_path):
+    new_root = str(tmp_path / 'new')
+
+    (dataset_fixer.Pipeline(root).filter_mime('image/png').dedupe()
+     .shuffle(seed=0).split((0.5, 0.5), 'percentage').write(new_root))
+
+    assert len(os.listdir(os.path.join(new_root, '1_part'))) == 4
+    assert len(os.listdir(os.path.join(new_root, '2_part'))) == 4
+
+
+def test_split_manifest(root, tmp_path):
+    new_root = str(tmp_path / 'new')
+
+    (dataset_fixer.Pipeline(root).filter_mime('image/png')
+     .split((6, 3)).write(new_root, manifest=True))
+
+    first = dataset_fixer.load_manifest(os.path.join(new_root,
+                                                     '1_part.txt'))
+    second = dataset_fixer.load_manifest(os.path.join(new_root,
+                                                      '2_part.txt'))
+    assert len(first) == 6
+    assert len(second) == 3
+    assert not set(first) & set(second)
+
+
+def test_numerical_split_must_add_up(root, tmp_path):
+    pipeline = dataset_fixer.Pipeline(root).split((1, 1))
+
+    with pytest.raises(AssertionError):
+        pipeline.write(str(tmp_path / 'new'))
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+from PIL import Image
+
+import dataset_fixer
+from conftest import files, write
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = str(tmp_path / 'root')
+    write(os.path.join(root, 'a', 'x.txt'), b'x' * 10)
+    write(os.path.join(root, 'b', 'y.txt'), b'y' * 20)
+    write(os.path.join(root, 'z.bin'), b'z' * 30)
+    return root
+
+
+def test_copy_plan_changes_nothing(root, tmp_path):
+    new_root = str(tmp_path / 'new')
+
+    plan = dataset_fixer.folder_unpacker(root, new_root, dry_run=True)
+
+    assert not os.path.exists(new_root)
+    assert plan.files == 3
+    assert plan.bytes == 60
+    assert plan.required == 60
+    assert plan.counts == {'.txt': 2, '.bin': 1}
+    assert plan.fits
+    assert sorted(action[0] for action in plan.actions) == ['copy'] * 3
+
+
+def test_links_require_no_space(root, tmp_path):
+    plan = dataset_fixer.folder_unpacker(root, str(tmp_path / 'new'),
+                                         mode='hardlink', dry_run=True)
+
+    assert plan.bytes == 60
+    assert plan.required == 0
+
+
+def test_cutter_plan_deletes_nothing(root):
+    before = files(root)
+
+    plan = dataset_fixer.cutter(root, number=2, dry_run=True)
+
+    assert files(root) == before
+    assert plan.files == 2
+    assert {action[0] for action in plan.actions} == {'delete'}
+
+
+def test_cleaner_plan_deletes_nothing(root):
+    Image.new('RGB', (2, 2)).save(os.path.join(root, 'a', 'image.png'))
+    before = files(root)
+
+    plan = dataset_fixer.cleaner(root, 'image/png', dry_run=True)
+
+    assert files(root) == before
+    assert [os.path.basename(action[1])
+            for action in plan.actions] == ['image.png']
+
+
+def test_splitter_plan(tmp_path):
+    root = str(tmp_path / 'root')
+    for name in ('a.txt', 'b.txt', 'c.txt'):
+        write(os.path.join(root, name), b'data')
+    new_root = str(tmp_path / 'new')
+
+    plan = dataset_fixer.splitter(root, new_root, (2, 1), dry_run=True)
+
+    assert not os.path.exists(new_root)
+    assert plan.files == 3
+    destinations = sorted(os.path.basename(os.path.dirname(action[2]))
+                          for action in plan.actions)
+    assert destinations == ['1_part', '1_part', '2_part']
@@ -0,0 +1,115 @@
+import os
+import tarfile
+
+import pytest
+
+import dataset_fixer
+from conftest import files, write
+
+
+class Interrupt(Exception):
+    pass
+
+
+def interrupt_after(number, stage='copy'):
+    """Returns a sink raising Interrupt after the stage processed number
+    files, which stops the operation like a crash would."""
+
+    done = list()
+
+    def sink(event):
+        if event.stage == stage:
+            done.append(event.path)
+            if len(done) == number:
+                raise Interrupt()
+
+    sink.events = ('file',)
+    return sink
+
+
+@pytest.fixture
+def interrupted():
+    sinks = list()
+
+    def add(number, stage='copy'):
+        sink = interrupt_after(number, stage)
+        sinks.append(sink)
+        dataset_fixer.add_sink(sink)
+        return sink
+
+    yield add
+    for sink in sinks:
+        if sink in dataset_fixer._sinks:
+            dataset_fixer.remove_sink(sink)
+
+
+def make_tree(root, number=50):
+    for index in range(number):
+        write(os.path.join(root, 'd{0}'.format(index % 5),
+                           'f{0:02d}.bin'.format(index)), b'x' * 3000)
+
+
+def test_resume_copies_the_rest(tmp_path, interrupted):
+    source = str(tmp_path / 'source')
+    target = str(tmp_path / 'target')
+    make_tree(source)
+
+    sink = interrupted(20)
+    with pytest.raises(Interrupt):
+        dataset_fixer.folder_unpacker(source, target)
+    dataset_fixer.remove_sink(sink)
+    assert os.path.exists(os.path.join(target, dataset_fixer.JOURNAL_NAME))
+
+    dataset_fixer.folder_unpacker(source, target, resume=True)
+
+    assert len(files(target)) == 50
+    assert not os.path.exists(os.path.join(target,
+                                           dataset_fixer.JOURNAL_NAME))
+
+
+@pytest.mark.parametrize('relative', [False, True])
+def test_resume_keeps_finished_shards(tmp_path, monkeypatch, interrupted,
+                                      relative):
+    monkeypatch.chdir(tmp_path)
+    make_tree('source')
+    target = 'target' if relative else str(tmp_path / 'target')
+
+    sink = interrupted(26)
+    with pytest.raises(Interrupt):
+        dataset_fixer.folder_unpacker('source', target, shard_size=10000)
+    dataset_fixer.remove_sink(sink)
+
+    dataset_fixer.folder_unpacker('source', target, shard_size=10000,
+                                  resume=True)
+
+    names = list()
+    for shard in os.listdir(target):
+        with tarfile.open(os.path.join(target, shard)) as archive:
+            names.extend(archive.getnames())
+    assert sorted(names) == ['f{0:02d}.bin'.format(index)
+                             for index in range(50)]
+
+
+@pytest.mark.parametrize('relation, relation_type', [
+    ((10, 20), 'numerical'), ((0.3, 0.7), 'percentage')])
+def test_resumed_move_splits_like_a_whole_run(tmp_path, interrupted,
+                                              relation, relation_type):
+    source, whole = str(tmp_path / 'source'), str(tmp_path / 'whole')
+    for index in range(30):
+        write(os.path.join(source, 'f{0:02d}.bin'.format(index)), b'x')
+        write(os.path.join(whole, 'f{0:02d}.bin'.format(index)), b'x')
+    target = str(tmp_path / 'target')
+    expected = str(tmp_path / 'expected')
+    dataset_fixer.splitter(whole, expected, relation, relation_type,
+                           mode='move', seed=0)
+
+    sink = interrupted(12)
+    with pytest.raises(Interrupt):
+        dataset_fixer.splitter(source, target, relation, relation_type,
+                               mode='move', seed=0)
+    dataset_fixer.remove_sink(sink)
+    dataset_fixer.splitter(source, target, relation, relation_type,
+                           mode='move', resume=True, seed=0)
+
+    assert files(target) == files(expected)
+    assert files(source) == []
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+import dataset_fixer
+from conftest import files, write
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = str(tmp_path / 'root')
+    for i in range(50):
+        write(os.path.join(root, 'f{0:02}.txt'.format(i)), str(i).encode())
+    write(os.path.join(root, 'sub', 'nested.txt'))
+    return root
+
+
+def test_sample_of_a_number_of_files(root, tmp_path):
+    new_root = str(tmp_path / 'new')
+
+    dataset_fixer.sampler(root, new_root, number=10, seed=1, workers=4)
+
+    sample = files(new_root)
+    assert len(sample) == 10
+    assert set(sample) <= set(files(root)) - {'sub/nested.txt'}
+    assert len(files(root)) == 51
+
+
+def test_same_seed_same_sample(root, tmp_path):
+    first, second = str(tmp_path / 'first'), str(tmp_path / 'second')
+
+    dataset_fixer.sampler(root, first, number=10, seed=3)
+    dataset_fixer.sampler(root, second, number=10, seed=3)
+
+    assert files(first) == files(second)
+
+
+def test_sample_of_a_fraction(root, tmp_path):
+    new_root = str(tmp_path / 'new')
+
+    dataset_fixer.sampler(root, new_root, fraction=0.5, seed=0)
+
+    assert 0 < len(files(new_root)) < 50
+
+
+def test_selection_sampling_is_exact():
+    for seed in range(100):
+        sample = list(dataset_fixer._sample(range(20), 20, 7, seed=seed))
+        assert len(sample) == 7
+        assert sample == sorted(set(sample))
+
+
+def test_too_large_a_sample(root, tmp_path):
+    with pytest.raises(AssertionError):
+        dataset_fixer.sampler(root, str(tmp_path / 'new'), number=51)
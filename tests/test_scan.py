@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+import dataset_fixer
+from conftest import write
+
+
+def make_tree(root):
+    paths = [write(os.path.join(root, *parts)) for parts in (
+        ('a.bin',), ('d', 'b.bin'), ('d', 'e', 'c.bin'), ('f', 'g.bin'))]
+    write(os.path.join(root, dataset_fixer.JOURNAL_NAME))
+    write(os.path.join(root, 'd', dataset_fixer.CACHE_NAME))
+    return sorted(paths)
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_scan_yields_every_file_once(tmp_path, workers):
+    root = str(tmp_path)
+    paths = make_tree(root)
+
+    records = list(dataset_fixer.scan(root, workers=workers))
+
+    assert sorted(record.path for record in records) == paths
+    assert all(record.is_file and not record.is_dir for record in records)
+    assert all(record.stat is None for record in records)
+
+
+def test_scan_walks_in_the_os_walk_order(tmp_path):
+    root = str(tmp_path)
+    make_tree(root)
+    expected = [os.path.join(folder, name)
+                for folder, _, names in os.walk(root) for name in names
+                if not name.startswith(dataset_fixer._SERVICE_NAMES)]
+
+    # os.walk lists the files of a folder before its subfolders, scan
+    # yields them in the same folder order.
+    paths = [record.path for record in dataset_fixer.scan(root)]
+
+    assert [os.path.dirname(path) for path in paths] == [
+        os.path.dirname(path) for path in expected]
+
+
+def test_scan_with_stat(tmp_path):
+    root = str(tmp_path)
+    write(os.path.join(root, 'a.bin'), b'abc')
+
+    record, = dataset_fixer.scan(root, stat=True)
+
+    assert record.stat.st_size == 3
+
+
+def test_scan_of_the_root_folder_only(tmp_path):
+    root = str(tmp_path)
+    make_tree(root)
+
+    records = list(dataset_fixer.scan(root, recursive=False))
+
+    assert sorted((os.path.basename(record.path), record.is_dir)
+                  for record in records) == [('a.bin', False), ('d', True),
+                                             ('f', True)]
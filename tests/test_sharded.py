@@ -0,0 +1,84 @@
+import os
+
+import pytest
+from PIL import Image
+
+import dataset_fixer
+from conftest import files, write
+
+
+@pytest.fixture
+def root(tmp_path):
+    root = str(tmp_path / 'root')
+    for i in range(30):
+        write(os.path.join(root, str(i % 4), '{0}.txt'.format(i)),
+              str(i).encode())
+    return root
+
+
+def test_shards_are_disjoint(root):
+    records = list(dataset_fixer._records(root))
+    shards = [list(dataset_fixer._shard_records(records, root, (3, i)))
+              for i in range(3)]
+
+    paths = [record.path for shard in shards for record in shard]
+    assert sorted(paths) == sorted(record.path for record in records)
+
+
+def test_sharded_run_equals_a_single_run(root, tmp_path):
+    single, sharded = str(tmp_path / 'single'), str(tmp_path / 'sharded')
+
+    dataset_fixer.folder_unpacker(root, single, conflict='hash')
+    dataset_fixer.run_sharded(dataset_fixer.folder_unpacker, 3, root,
+                              sharded)
+
+    assert files(sharded) == files(single)
+
+
+def test_shards_keep_files_with_the_same_name(tmp_path):
+    root = str(tmp_path / 'root')
+    for i in range(400):
+        write(os.path.join(root, str(i), 'image.txt'), str(i).encode())
+    new_root = str(tmp_path / 'new')
+
+    dataset_fixer.run_sharded(dataset_fixer.folder_unpacker, 4, root,
+                              new_root)
+
+    contents = set()
+    for name in files(new_root):
+        with open(os.path.join(new_root, name), 'rb') as file:
+            contents.add(file.read())
+    assert contents == {str(i).encode() for i in range(400)}
+
+
+@pytest.mark.parametrize('conflict', ['skip', 'suffix'])
+def test_name_checking_policies_are_refused(root, tmp_path, conflict):
+    with pytest.raises(ValueError):
+        dataset_fixer.run_sharded(dataset_fixer.folder_unpacker, 2, root,
+                                  str(tmp_path / 'new'), conflict=conflict)
+
+
+def test_sharded_plans(root, tmp_path):
+    plans = dataset_fixer.run_sharded(dataset_fixer.folder_unpacker, 2, root,
+                                      str(tmp_path / 'new'), dry_run=True)
+
+    assert sum(plan.files for plan in plans) == 30
+
+
+def test_sharded_cleaner(tmp_path):
+    root = str(tmp_path / 'root')
+    for i in range(8):
+        folder = os.path.join(root, str(i))
+        os.makedirs(folder)
+        Image.new('RGB', (2, 2)).save(os.path.join(folder, 'a.png'))
+        write(os.path.join(folder, 'b.txt'), b'text')
+
+    dataset_fixer.run_sharded(dataset_fixer.cleaner, 2, root, 'image/png')
+
+    assert files(root) == [os.path.join(str(i), 'b.txt') for i in range(8)]
+
+
+def test_shard_index_is_checked(root, tmp_path):
+    with pytest.raises(AssertionError):
+        dataset_fixer.folder_unpacker(root, str(tmp_path / 'new'),
+                                      num_shards=2, shard_index=2)
@@ -0,0 +1,45 @@
+import os
+import random
+
+import pytest
+
+import dataset_fixer
+from conftest import files, write
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_stratified_parts_are_exact_and_labels_within_a_file(seed):
+    generator = random.Random(seed)
+    relation = [generator.randint(0, 40)
+                for _ in range(generator.randint(2, 5))]
+    total = sum(relation)
+    labels = [generator.randint(0, generator.randint(0, 9))
+              for _ in range(total)]
+
+    parts = dataset_fixer._assign_parts(relation, labels, seed=seed)
+
+    assert [len(part) for part in parts] == relation
+    assert sorted(idx for part in parts for idx in part) == list(range(total))
+    for label in set(labels):
+        size = labels.count(label)
+        for share, part in zip(relation, parts):
+            count = sum(1 for idx in part if labels[idx] == label)
+            assert abs(count - share * size / total) < 1
+
+
+def test_stratified_split_keeps_the_labels(tmp_path):
+    source = str(tmp_path / 'source')
+    target = str(tmp_path / 'target')
+    for label, number in (('cats', 10), ('dogs', 5)):
+        for index in range(number):
+            write(os.path.join(source, label, '{0}.bin'.format(index)), b'x')
+
+    dataset_fixer.splitter(source, target, [0.8, 0.2],
+                           relation_type='percentage', stratify=True, seed=1)
+
+    names = files(target)
+    assert len(names) == 15
+    assert sum(1 for name in names if name.startswith(
+        os.path.join('2_part', 'cats'))) == 2
+    assert sum(1 for name in names if name.startswith(
+        os.path.join('2_part', 'dogs'))) == 1